@@ -12,12 +12,15 @@ Key standardization points:
 - Word limits and token limits are standardized
 - Temperature and other parameters are fixed for consistency
 """
-from groq import Groq
 from django.conf import settings
 from typing import Optional
 import logging
 import re
 
+from .services.llm_gateway import LLMRateLimitExceeded, llm_gateway
+from .services.llm_response_cache import llm_response_cache
+from .services.token_budget import allocate_budget, estimate_messages_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -54,7 +57,6 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
     TEMPERATURE = 0.5  # Lower temperature for more consistent format compliance
     
     def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
         self.model = "openai/gpt-oss-20b"  # Updated to use active model
     
     def generate_explanation(
@@ -109,7 +111,7 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
                 max_tokens = int(base_max_tokens * 1.5) if increase_tokens else base_max_tokens
                 
                 # Generate explanation with consistent parameters
-                response = self.client.chat.completions.create(
+                response = llm_gateway.chat_completion(
                     model=self.model,
                     messages=[
                         {
@@ -205,6 +207,9 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
                 
                 return explanation_text, prompt, structured_data
                 
+            except LLMRateLimitExceeded:
+                # The quota wait already ran its course; other parameters would not help
+                raise
             except Exception as e:
                 last_exception = e
                 # If this is not the last attempt, continue to next retry
@@ -268,39 +273,39 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
         """
         import json
         
-        # Build prompt for structured generation
+        # Build prompt for structured generation (book context already fits the budget)
         prompt = self._build_structured_prompt(shloka, book_context)
         
-        # Retry logic
+        # Retry logic: the prompt is fixed, only the completion allowance grows
         retry_attempts = [
-            {"book_context": book_context, "reduce_context": False, "increase_tokens": False},
-            {"book_context": None, "reduce_context": False, "increase_tokens": True},
-            {"book_context": None, "reduce_context": True, "increase_tokens": True},
+            {"increase_tokens": False},
+            {"increase_tokens": True},
         ]
         
         last_exception = None
         
         for attempt_num, retry_config in enumerate(retry_attempts, 1):
             try:
-                current_context = retry_config["book_context"]
-                reduce_context = retry_config["reduce_context"]
                 increase_tokens = retry_config["increase_tokens"]
                 
-                prompt = self._build_structured_prompt(shloka, current_context, reduce_context=reduce_context)
                 max_tokens = int(self.DETAILED_MAX_TOKENS * 1.5) if increase_tokens else self.DETAILED_MAX_TOKENS
                 
-                # Generate explanation
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self._get_structured_system_message()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=self.TEMPERATURE,
-                    max_tokens=max_tokens,
-                )
+                messages = [
+                    {"role": "system", "content": self._get_structured_system_message()},
+                    {"role": "user", "content": prompt}
+                ]
+                cache_key = llm_response_cache.make_key(self.model, messages, self.TEMPERATURE, max_tokens)
+                response_content = llm_response_cache.get(cache_key)
                 
-                response_content = response.choices[0].message.content.strip()
+                if response_content is None:
+                    # Generate explanation
+                    response = llm_gateway.chat_completion(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.TEMPERATURE,
+                        max_tokens=max_tokens,
+                    )
+                    response_content = response.choices[0].message.content.strip()
                 
                 if not response_content:
                     if attempt_num < len(retry_attempts):
@@ -315,6 +320,7 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
                     structured_data = self._parse_structured_text_response(response_content)
                 
                 if structured_data:
+                    llm_response_cache.set(cache_key, self.model, response_content)
                     structured_data['generation_prompt'] = prompt
                     logger.info(
                         f"Generated structured explanation for {shloka.get('book_name')} "
@@ -324,6 +330,9 @@ FORMAT REQUIREMENT: Use ONLY list format with bullet points (-). NEVER use table
                 else:
                     raise Exception("Failed to parse structured data from response")
                     
+            except LLMRateLimitExceeded:
+                # The quota wait already ran its course; other parameters would not help
+                raise
             except Exception as e:
                 last_exception = e
                 if attempt_num < len(retry_attempts):
@@ -828,10 +837,14 @@ Be accurate, respectful to traditional interpretations, and use modern, accessib
     def _build_structured_prompt(
         self, 
         shloka: dict, 
-        book_context: Optional[dict] = None,
-        reduce_context: bool = False
+        book_context: Optional[dict] = None
     ) -> str:
-        """Build prompt for structured explanation generation."""
+        """
+        Build prompt for structured explanation generation.
+        
+        The shloka text and instructions are always included; book context
+        gets whatever remains of ``GENERATION_PROMPT_TOKEN_BUDGET``.
+        """
         if not shloka.get('sanskrit_text'):
             raise ValueError("sanskrit_text is required for generating explanations")
         
@@ -867,32 +880,7 @@ Be accurate, respectful to traditional interpretations, and use modern, accessib
                 "",
             ])
         
-        # Add book context if available
-        if book_context:
-            if book_context.get('english_context'):
-                context_text = book_context['english_context']
-                if reduce_context:
-                    context_text = context_text[:500] + "..." if len(context_text) > 500 else context_text
-                prompt_parts.extend([
-                    "Reference Context (English Translation):",
-                    context_text,
-                    "",
-                ])
-            
-            if book_context.get('hindi_context'):
-                context_text = book_context['hindi_context']
-                if reduce_context:
-                    context_text = context_text[:500] + "..." if len(context_text) > 500 else context_text
-                prompt_parts.extend([
-                    "Reference Context (Hindi Translation):",
-                    context_text,
-                    "",
-                ])
-            
-            prompt_parts.append("Use the above reference context to inform your explanation, ensuring accuracy.")
-            prompt_parts.append("")
-        
-        prompt_parts.extend([
+        instruction_parts = [
             "Provide a structured explanation in JSON format with these fields:",
             "",
             "1. summary: Brief overview (2-3 sentences) that captures the essence",
@@ -906,7 +894,49 @@ Be accurate, respectful to traditional interpretations, and use modern, accessib
             "8. reflection_prompt: A thoughtful question for contemplation",
             "",
             "Respond ONLY with valid JSON. Do not include any text before or after the JSON.",
-        ])
+        ]
+        
+        # Add book context if available, trimmed to what is left of the prompt budget
+        # (Hindi context is cut before English)
+        if book_context and (book_context.get('english_context') or book_context.get('hindi_context')):
+            context_headers = [
+                "Reference Context (English Translation):",
+                "Reference Context (Hindi Translation):",
+                "Use the above reference context to inform your explanation, ensuring accuracy.",
+            ]
+            fixed_tokens = estimate_messages_tokens([
+                {"role": "system", "content": self._get_structured_system_message()},
+                {"role": "user", "content": "\n".join(prompt_parts + context_headers + instruction_parts)},
+            ])
+            english_context, hindi_context = allocate_budget(
+                [book_context.get('english_context') or '', book_context.get('hindi_context') or ''],
+                settings.GENERATION_PROMPT_TOKEN_BUDGET - fixed_tokens
+            )
+            if english_context != (book_context.get('english_context') or '') or hindi_context != (book_context.get('hindi_context') or ''):
+                logger.info(
+                    f"Trimmed book context for {book_name} Chapter {chapter_number}, Verse {verse_number} "
+                    f"to fit the {settings.GENERATION_PROMPT_TOKEN_BUDGET}-token prompt budget"
+                )
+            
+            if english_context:
+                prompt_parts.extend([
+                    context_headers[0],
+                    english_context,
+                    "",
+                ])
+            
+            if hindi_context:
+                prompt_parts.extend([
+                    context_headers[1],
+                    hindi_context,
+                    "",
+                ])
+            
+            if english_context or hindi_context:
+                prompt_parts.append(context_headers[2])
+                prompt_parts.append("")
+        
+        prompt_parts.extend(instruction_parts)
         
         return "\n".join(prompt_parts)
     
@@ -0,0 +1,282 @@
+"""
+Django management command to benchmark book text parsing on a full chapter.
+
+Compares the legacy multi-pass marker searches (one regex or substring loop per
+marker pattern) against the single-pass marker scanner for the verse search
+fallback, verse section splitting and chapter page checks, and the legacy
+per-character PDF text cleaning against the table-driven one.
+
+Uses the chapter's text from the page text store when the English PDF is
+available, otherwise a synthetic chapter of the same shape.
+
+Run: python manage.py benchmark_book_text --chapter 2 --iterations 20
+"""
+from django.core.management.base import BaseCommand
+from apps.sanatan_app.services.book_context_service import get_book_context_service
+from apps.sanatan_app.services.book_text_store import slice_verse, verse_offsets
+from apps.sanatan_app.services.marker_scanner import REFERENCE, first_chapter_mentioned, scan_markers
+from apps.sanatan_app.services.shloka_service import ShlokaService
+import random
+import re
+import statistics
+import time
+import unicodedata
+
+# Legacy verse heading regex used by the two-pass verse search
+_LEGACY_VERSE_MARKER_RE = re.compile(
+    r'^[ \t]*(?:verses?|texts?|श्लोक)[ \t]+(?:(\d{1,2})\.)?(\d{1,3})(?:[ \t]*[-–][ \t]*(\d{1,3}))?\b',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def legacy_clean_pdf_text(text):
+    """Legacy ShlokaService._clean_pdf_text, walking every character in Python."""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFC', text)
+    text = re.sub(r'\x00', '', text)
+    cleaned_chars = []
+    for char in text:
+        code = ord(char)
+        if 0x20 <= code <= 0x7E:
+            cleaned_chars.append(char)
+        elif code in [0x09, 0x0A, 0x0D]:
+            cleaned_chars.append(char)
+        elif 0x0900 <= code <= 0x097F:
+            cleaned_chars.append(char)
+        elif 0x00A0 <= code < 0xE000 and code not in range(0x2000, 0x200B):
+            if unicodedata.category(char)[0] != 'C':
+                cleaned_chars.append(char)
+    text = ''.join(cleaned_chars)
+    text = re.sub(r'([a-zA-Z])-\s+([a-zA-Z])', r'\1\2', text)
+    text = re.sub(r'([a-zA-Z])\s+-\s+([a-zA-Z])', r'\1-\2', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    lines = text.split('\n')
+    cleaned_lines = [line.strip() for line in lines if line.strip()]
+    return '\n'.join(cleaned_lines).strip()
+
+
+def add_pdf_noise(text, seed=0):
+    """Sprinkle the artifacts pypdf leaves in extracted text (null bytes, private use glyphs, odd spacing)."""
+    rng = random.Random(seed)
+    noise = ['\x00', '\ue001', '\x85', '\u200b', '\u2003', '\ufeff', '\U0001f600', '\x07', '\t  ', ' \n\n\n', 'ex- \n']
+    return ''.join(char + rng.choice(noise) if rng.random() < 0.02 else char for char in text)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chapter/verse marker parsing: legacy multi-pass searches vs the single-pass scanner'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chapter',
+            type=int,
+            default=2,
+            help='Chapter to benchmark on (default: 2)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Number of times each operation is run (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        """Run the book text benchmark."""
+        chapter = options['chapter']
+        iterations = max(options['iterations'], 1)
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("Book Text Marker Scanning Benchmark"))
+        self.stdout.write("=" * 70)
+
+        text = self._load_chapter_text(chapter)
+        # The verse search is the fallback for verses without a heading, so look up those
+        indexed = verse_offsets(scan_markers(text), chapter)
+        verses = [verse for verse in range(1, 100) if verse not in indexed][:10]
+        self.stdout.write(f"Chapter {chapter}: {len(text):,} chars, {text.count(chr(10)) + 1:,} lines")
+        self.stdout.write(f"Iterations: {iterations}\n")
+
+        raw_text = add_pdf_noise(text)
+        shloka_service = ShlokaService.__new__(ShlokaService)
+        operations = [
+            (
+                'verse search',
+                lambda: [self._legacy_verse_passage(text, chapter, verse) for verse in verses],
+                lambda: [self._scanner_verse_passage(text, chapter, verse) for verse in verses],
+            ),
+            (
+                'split sections',
+                lambda: self._legacy_split(text, chapter),
+                lambda: shloka_service._split_into_verse_sections(text, chapter),
+            ),
+            (
+                'clean text',
+                lambda: legacy_clean_pdf_text(raw_text),
+                lambda: ShlokaService._clean_pdf_text(raw_text),
+            ),
+            (
+                'chapter check',
+                lambda: self._legacy_chapter_check(text, chapter),
+                lambda: self._scanner_chapter_check(text, chapter),
+            ),
+        ]
+
+        self.stdout.write(f"{'operation':<16} {'legacy ms':>10} {'scanner ms':>11} {'speedup':>8} {'same':>5}")
+        for name, legacy, scanner in operations:
+            legacy_ms, legacy_result = self._time(legacy, iterations)
+            scanner_ms, scanner_result = self._time(scanner, iterations)
+            same = 'yes' if legacy_result == scanner_result else 'no'
+            speedup = legacy_ms / scanner_ms if scanner_ms else 0
+            self.stdout.write(
+                f"{name:<16} {legacy_ms:>10.3f} {scanner_ms:>11.3f} {speedup:>7.1f}x {same:>5}"
+            )
+
+        self.stdout.write(
+            "\nsame = identical results. The legacy splitter ignores \"TEXT n\" headings, "
+            "so split sections differ on chapters that use them."
+        )
+
+    def _time(self, func, iterations):
+        """Mean milliseconds per call, and the last result."""
+        timings = []
+        result = None
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.mean(timings), result
+
+    def _load_chapter_text(self, chapter):
+        """The chapter's text from the page text store, or a synthetic chapter."""
+        service = get_book_context_service()
+        if service.english_book_path.exists():
+            store = service.get_store(service.english_book_path, build=True)
+            text = store.chapter_text(chapter) if store else ''
+            if text:
+                return text
+            self.stdout.write(self.style.WARNING("Chapter not found in the page text store - using synthetic text"))
+        else:
+            self.stdout.write(self.style.WARNING("English PDF not found - using synthetic chapter text"))
+        return self._synthetic_chapter(chapter)
+
+    @staticmethod
+    def _synthetic_chapter(chapter, verse_count=72):
+        """A chapter shaped like the extracted books: headings, Sanskrit, translation and commentary."""
+        parts = [f"Chapter {chapter}\nContents of the Gita Summarized\n"]
+        for verse in range(1, verse_count + 1):
+            parts.append(
+                f"TEXT {verse}\n"
+                f"सञ्जय उवाच तं तथा कृपयाविष्टमश्रुपूर्णाकुलेक्षणम् ।\n"
+                f"sañjaya uvāca taṁ tathā kṛpayāviṣṭam aśru-pūrṇākulekṣaṇam\n"
+                f"TRANSLATION\n"
+                f"Seeing Arjuna full of compassion, his mind depressed, Madhusūdana spoke.\n"
+                f"PURPORT\n"
+                + "Kṛṣṇa explains that material compassion, lamentation and tears are signs of ignorance. " * 12 + "\n"
+                f"This is explained further in {chapter}.{verse + 1} and in Chapter {chapter % 18 + 1}.\n"
+            )
+        return '\n'.join(parts)
+
+    def _legacy_verse_passage(self, text, chapter, verse):
+        """Legacy two-pass verse search: verse heading regex, then a reference regex fallback."""
+        offsets = {}
+        last_verse = 0
+        for match in _LEGACY_VERSE_MARKER_RE.finditer(text):
+            marker_chapter, first, last = match.groups()
+            if marker_chapter and int(marker_chapter) != chapter:
+                continue
+            first = int(first)
+            last = int(last) if last else first
+            if first <= last_verse or last < first:
+                continue
+            for number in range(first, last + 1):
+                offsets[number] = match.start()
+            last_verse = last
+        passage = slice_verse(text, offsets, verse)
+        if not passage:
+            match = re.search(rf'(?<![\d.]){chapter}\.{verse}(?!\d)', text)
+            if match:
+                passage = text[max(0, match.start() - 500):match.start() + 1000].strip()
+        return passage
+
+    def _scanner_verse_passage(self, text, chapter, verse):
+        """Single-scan verse search, as in BookContextService._search_for_chapter_verse."""
+        markers = list(scan_markers(text))
+        passage = slice_verse(text, verse_offsets(markers, chapter), verse)
+        if not passage:
+            for marker in markers:
+                if marker.kind == REFERENCE and (marker.chapter, marker.verse) == (chapter, verse):
+                    passage = text[max(0, marker.start - 500):marker.start + 1000].strip()
+                    break
+        return passage
+
+    def _legacy_split(self, chapter_text, chapter_num):
+        """Legacy line-by-line verse splitting, trying 4 regexes per line."""
+        def context_before(lines, index, num_lines=5):
+            return '\n'.join(lines[max(0, index - num_lines):index]).strip()
+
+        def context_after(lines, index, num_lines=5):
+            return '\n'.join(lines[index:min(len(lines), index + num_lines)]).strip()
+
+        verse_sections = []
+        verse_patterns = [
+            r'VERSE\s+(\d+)',
+            r'Verse\s+(\d+)',
+            r'^\s*(\d+)\.\s+',
+            rf'^\s*{chapter_num}\.(\d+)\s+',
+        ]
+        lines = chapter_text.split('\n')
+        current_verse = None
+        current_text = []
+        verse_start = 0
+        for i, line in enumerate(lines):
+            verse_found = None
+            for pattern in verse_patterns:
+                match = re.search(pattern, line, re.IGNORECASE)
+                if match:
+                    verse_found = int(match.group(1))
+                    break
+            if verse_found is not None:
+                if current_verse is not None and current_text:
+                    verse_text = '\n'.join(current_text).strip()
+                    if verse_text:
+                        verse_sections.append({
+                            'verse_number': current_verse,
+                            'text': verse_text,
+                            'context_before': context_before(lines, verse_start),
+                            'context_after': context_after(lines, i),
+                        })
+                current_verse = verse_found
+                current_text = [line]
+                verse_start = i
+            elif current_verse is not None:
+                current_text.append(line)
+        if current_verse is not None and current_text:
+            verse_text = '\n'.join(current_text).strip()
+            if verse_text:
+                verse_sections.append({
+                    'verse_number': current_verse,
+                    'text': verse_text,
+                    'context_before': context_before(lines, verse_start),
+                    'context_after': '',
+                })
+        return verse_sections
+
+    def _legacy_chapter_check(self, text, chapter_num):
+        """Legacy page check: one substring search per chapter number and spelling."""
+        has_correct_chapter = f'Chapter {chapter_num}' in text or f'CHAPTER {chapter_num}' in text
+        first_chapter_found = None
+        first_chapter_pos = len(text)
+        for check_chapter in range(1, 19):
+            for pattern in [f'Chapter {check_chapter}', f'CHAPTER {check_chapter}']:
+                pos = text.find(pattern)
+                if pos != -1 and pos < first_chapter_pos:
+                    first_chapter_pos = pos
+                    first_chapter_found = check_chapter
+        return has_correct_chapter, first_chapter_found
+
+    def _scanner_chapter_check(self, text, chapter_num):
+        """Page check from one marker scan, as in save_shlokas_from_books."""
+        chapter_markers = [marker for marker in scan_markers(text) if marker.is_chapter]
+        has_correct_chapter = any(marker.chapter == chapter_num for marker in chapter_markers)
+        return has_correct_chapter, first_chapter_mentioned(chapter_markers)
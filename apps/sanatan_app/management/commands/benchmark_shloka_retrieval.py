@@ -0,0 +1,118 @@
+"""
+Django management command to benchmark chatbot shloka retrieval.
+
+Compares the legacy ORM keyword query against the in-memory BM25 index and the
+TF-IDF matrix engine on the same set of questions.
+
+Run: python manage.py benchmark_shloka_retrieval --iterations 50
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from apps.sanatan_app.models import Shloka
+from apps.sanatan_app.services.shloka_search_index import ShlokaSearchIndex, tokenize
+from apps.sanatan_app.services.tfidf_retrieval import TfidfShlokaRetriever
+import statistics
+import time
+
+
+DEFAULT_QUERIES = [
+    "How do I deal with stress at work?",
+    "How can I be successful and achieve my goals?",
+    "What is my duty when I feel confused?",
+    "How do I control my restless mind?",
+    "Why should I act without attachment to results?",
+    "How can I overcome fear of failure?",
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chatbot shloka retrieval: ORM keyword query vs BM25 index vs TF-IDF matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Number of times each query is run per engine (default: 20)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=3,
+            help='Number of shlokas to retrieve per query (default: 3)',
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            default=None,
+            help='Query to benchmark (repeatable). Defaults to a built-in question set.',
+        )
+
+    def handle(self, *args, **options):
+        """Run the retrieval benchmark."""
+        iterations = options['iterations']
+        limit = options['limit']
+        queries = options['query'] or DEFAULT_QUERIES
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("Shloka Retrieval Benchmark"))
+        self.stdout.write("=" * 70)
+        self.stdout.write(f"Catalog size: {Shloka.objects.count()} shlokas")
+        self.stdout.write(f"Queries: {len(queries)}, iterations per query: {iterations}\n")
+
+        engines = [('orm', lambda query: self._orm_search(query, limit))]
+
+        start = time.perf_counter()
+        bm25_index = ShlokaSearchIndex()
+        bm25_index.build()
+        self.stdout.write(f"BM25 index build: {(time.perf_counter() - start) * 1000:.1f} ms")
+        engines.append(('bm25', lambda query: bm25_index.search(query, limit, "Bhagavad Gita")))
+
+        if TfidfShlokaRetriever.is_available():
+            start = time.perf_counter()
+            tfidf = TfidfShlokaRetriever()
+            tfidf.build()
+            self.stdout.write(f"TF-IDF matrix build: {(time.perf_counter() - start) * 1000:.1f} ms")
+            engines.append(('tfidf', lambda query: tfidf.search(query, limit, "Bhagavad Gita")))
+        else:
+            self.stdout.write(self.style.WARNING("numpy/scipy not installed - skipping TF-IDF engine"))
+
+        self.stdout.write("")
+        self.stdout.write(f"{'engine':<8} {'mean ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for name, search in engines:
+            timings = []
+            for query in queries:
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    search(query)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{name:<8} {statistics.mean(timings):>10.3f} {p95:>10.3f} {timings[-1]:>10.3f}"
+            )
+
+        self.stdout.write("\nTop hits per query:")
+        for query in queries:
+            self.stdout.write(f"  {query}")
+            for name, search in engines:
+                hits = ', '.join(f"{s['chapter']}.{s['verse']}" for s in search(query)) or '-'
+                self.stdout.write(f"    {name:<6} {hits}")
+
+    def _orm_search(self, query, limit):
+        """Legacy keyword OR-query retrieval, kept here as the benchmark baseline."""
+        keywords = [w for w in tokenize(query) if len(w) > 3]
+        keyword_query = Q()
+        for keyword in keywords[:5]:
+            keyword_query |= (
+                Q(explanations__themes__icontains=keyword) |
+                Q(explanations__summary__icontains=keyword) |
+                Q(explanations__detailed_meaning__icontains=keyword) |
+                Q(explanations__detailed_explanation__icontains=keyword) |
+                Q(transliteration__icontains=keyword)
+            )
+        shlokas = Shloka.objects.filter(Q(book_name="Bhagavad Gita") & keyword_query)
+        return [
+            {'chapter': s.chapter_number, 'verse': s.verse_number}
+            for s in shlokas.prefetch_related('explanations').distinct()[:limit]
+        ]
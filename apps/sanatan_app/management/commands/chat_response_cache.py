@@ -0,0 +1,29 @@
+"""
+Django management command to inspect or purge the chatbot response cache.
+
+Run: python manage.py chat_response_cache          (show hit/miss stats)
+     python manage.py chat_response_cache --purge  (invalidate all cached answers)
+"""
+from django.core.management.base import BaseCommand
+from apps.sanatan_app.services.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = 'Show chatbot response cache stats or purge cached answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--purge',
+            action='store_true',
+            help='Invalidate every cached answer and reset the counters',
+        )
+
+    def handle(self, *args, **options):
+        """Show stats or purge the cache."""
+        stats = response_cache.stats()
+        self.stdout.write(f"Enabled: {stats['enabled']}")
+        self.stdout.write(f"Hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']:.1%}")
+
+        if options['purge']:
+            response_cache.purge()
+            self.stdout.write(self.style.SUCCESS("✓ Chat response cache purged"))
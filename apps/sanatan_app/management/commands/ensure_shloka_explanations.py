@@ -3,9 +3,11 @@ Django management command to ensure all shlokas have both summary and detailed e
 with consistent formatting (including Meaning, Explanation, Examples sections).
 Run: python manage.py ensure_shloka_explanations
 """
+from contextlib import nullcontext
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from apps.sanatan_app.models import Shloka, ShlokaExplanation, ReadingType
+from apps.sanatan_app.services.llm_response_cache import llm_response_cache
 from apps.sanatan_app.services.shloka_service import ShlokaService
 import time
 import re
@@ -146,9 +148,18 @@ class Command(BaseCommand):
             action='store_true',
             help='Regenerate all explanations regardless of whether they exist (forces format consistency)',
         )
+        parser.add_argument(
+            '--no-llm-cache',
+            action='store_true',
+            help='Call the LLM even for prompts with a cached response (e.g. to get fresh output with --regenerate-all)',
+        )
 
     def handle(self, *args, **options):
         """Ensure all shlokas have both summary and detailed explanations with consistent formatting."""
+        with llm_response_cache.bypass() if options['no_llm_cache'] else nullcontext():
+            self._ensure_explanations(**options)
+
+    def _ensure_explanations(self, **options):
         dry_run = options['dry_run']
         batch_size = options['batch_size']
         delay = options['delay']
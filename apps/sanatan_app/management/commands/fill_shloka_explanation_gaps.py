@@ -7,8 +7,10 @@ This command:
 
 Run: python manage.py fill_shloka_explanation_gaps
 """
+from contextlib import nullcontext
 from django.core.management.base import BaseCommand
 from apps.sanatan_app.models import Shloka, ShlokaExplanation
+from apps.sanatan_app.services.llm_response_cache import llm_response_cache
 from apps.sanatan_app.services.shloka_service import ShlokaService
 from apps.sanatan_app.tasks import qa_and_improve_shloka, batch_qa_existing_shlokas
 import logging
@@ -60,9 +62,19 @@ class Command(BaseCommand):
             action='store_true',
             help='Only create missing explanations, skip quality checking',
         )
+        parser.add_argument(
+            '--no-llm-cache',
+            action='store_true',
+            help='Call the LLM even for prompts with a cached response '
+                 '(work done in this process; Celery workers follow LLM_RESPONSE_CACHE_ENABLED)',
+        )
 
     def handle(self, *args, **options):
         """Ensure shlokas have explanations and check/improve quality."""
+        with llm_response_cache.bypass() if options['no_llm_cache'] else nullcontext():
+            self._fill_gaps(**options)
+
+    def _fill_gaps(self, **options):
         dry_run = options['dry_run']
         delay = options['delay']
         verbose = options['verbose']
@@ -0,0 +1,33 @@
+"""
+Django management command to inspect or purge the persistent LLM response cache.
+
+Run: python manage.py llm_response_cache          (show size and hit/miss stats)
+     python manage.py llm_response_cache --purge  (delete all cached responses)
+"""
+from django.core.management.base import BaseCommand
+from apps.sanatan_app.services.llm_response_cache import llm_response_cache
+
+
+class Command(BaseCommand):
+    help = 'Show LLM response cache stats or purge cached responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--purge',
+            action='store_true',
+            help='Delete every cached response and reset the counters',
+        )
+
+    def handle(self, *args, **options):
+        """Show stats or purge the cache."""
+        stats = llm_response_cache.stats()
+        self.stdout.write(f"Enabled: {stats['enabled']}")
+        self.stdout.write(
+            f"Entries: {stats['entries']}, size: {stats['bytes'] / 1024:.1f} KiB "
+            f"of {stats['max_bytes'] / 1024:.1f} KiB"
+        )
+        self.stdout.write(f"Hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']:.1%}")
+
+        if options['purge']:
+            llm_response_cache.purge()
+            self.stdout.write(self.style.SUCCESS("✓ LLM response cache purged"))
@@ -0,0 +1,154 @@
+"""
+Django management command to pre-extract the source PDFs into the page text store.
+
+Pages are extracted and cleaned in parallel: both books are split into page
+ranges that run in a process pool, and the results are written to the store
+in page order. Run it after adding or replacing a PDF so no request has to
+wait for pypdf.
+
+Run: python manage.py preprocess_books                 (all cores)
+     python manage.py preprocess_books --workers 4 --chunk-size 20
+     python manage.py preprocess_books --force         (re-extract existing stores)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.sanatan_app.services.book_context_service import BookContextService
+from apps.sanatan_app.services.book_text_store import BookTextStore
+
+# PdfReader per book, kept for the lifetime of a worker process
+_worker_readers = {}
+
+
+def _init_worker():
+    """Set up Django in pool processes that were spawned rather than forked."""
+    import django
+    django.setup()
+
+
+def extract_page_range(book_path: str, start_page: int, end_page: int):
+    """
+    Extract and clean pages ``start_page`` up to ``end_page`` of a PDF.
+
+    Runs in a pool process; the PDF is opened once per process and book.
+
+    Returns:
+        List of page texts, in page order
+    """
+    service = BookContextService()
+    if book_path not in _worker_readers:
+        _worker_readers[book_path] = service._load_pdf(Path(book_path))
+    pdf_reader = _worker_readers[book_path]
+    if pdf_reader is None:
+        return [''] * (end_page - start_page)
+    return [service.extract_page_text(pdf_reader, page_num) for page_num in range(start_page, end_page)]
+
+
+class Command(BaseCommand):
+    help = 'Extract and clean both source PDFs into the page text store using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: all cores; 1 extracts in this process)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=25,
+            help='Pages per work unit (default: 25)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-extract books that already have a page text store',
+        )
+
+    def handle(self, *args, **options):
+        """Pre-extract both books."""
+        workers = max(options['workers'], 1)
+        chunk_size = max(options['chunk_size'], 1)
+        service = BookContextService()
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("Pre-extracting PDF Books"))
+        self.stdout.write("=" * 70)
+        self.stdout.write(f"Workers: {workers}, chunk size: {chunk_size} pages\n")
+
+        # (book path, store, page ranges) for every book that needs extracting
+        jobs = []
+        for book_path in (service.english_book_path, service.hindi_book_path):
+            if not book_path.exists():
+                self.stdout.write(self.style.WARNING(f"⚠ PDF not found, skipping: {book_path}"))
+                continue
+
+            store = BookTextStore(book_path)
+            if store.exists() and not options['force']:
+                self.stdout.write(f"✓ {book_path.name}: already extracted ({store.page_count} pages)")
+                continue
+
+            pdf_reader = service._load_pdf(book_path)
+            if pdf_reader is None:
+                self.stdout.write(self.style.ERROR(f"✗ Failed to load PDF: {book_path}"))
+                continue
+
+            total_pages = len(pdf_reader.pages)
+            page_ranges = [
+                (start, min(start + chunk_size, total_pages))
+                for start in range(0, total_pages, chunk_size)
+            ]
+            jobs.append((book_path, store, page_ranges))
+
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS("\nNothing to extract"))
+            return
+
+        started = time.perf_counter()
+        total_pages = 0
+        if workers == 1:
+            for book_path, store, page_ranges in jobs:
+                pages = (
+                    text
+                    for start, end in page_ranges
+                    for text in extract_page_range(str(book_path), start, end)
+                )
+                total_pages += self._build_store(store, pages, started)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                # Submit both books up front so the pool never idles between them
+                submitted = []
+                for book_path, store, page_ranges in jobs:
+                    futures = [
+                        executor.submit(extract_page_range, str(book_path), start, end)
+                        for start, end in page_ranges
+                    ]
+                    submitted.append((store, futures))
+
+                # Futures are consumed in submission order, so pages are written in page order
+                for store, futures in submitted:
+                    pages = (text for future in futures for text in future.result())
+                    total_pages += self._build_store(store, pages, started)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write("\n" + "=" * 70)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Extracted {total_pages} pages in {elapsed:.1f}s "
+            f"({total_pages / elapsed if elapsed else 0:.1f} pages/sec)"
+        ))
+        self.stdout.write("=" * 70)
+
+    def _build_store(self, store, pages, started):
+        """Write one book's pages to its store and report progress."""
+        page_count = store.build(pages)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"✓ {store.pdf_path.name}: {page_count} pages, "
+            f"{len(store.chapter_index())} chapters located ({elapsed:.1f}s elapsed)"
+        )
+        return page_count
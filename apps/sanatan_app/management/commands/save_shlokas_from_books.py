@@ -6,13 +6,14 @@ validates the data, and saves them to the database in a consistent pattern.
 
 Run: python manage.py save_shlokas_from_books --chapters 1-18 --book-name "Bhagavad Gita"
 """
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from apps.sanatan_app.models import Shloka
+from apps.sanatan_app.models import Shloka, ShlokaExplanation
 from apps.sanatan_app.services.shloka_service import ShlokaService
-from apps.sanatan_app.services.book_context_service import BookContextService
+from apps.sanatan_app.services.book_context_service import get_book_context_service
+from apps.sanatan_app.services.marker_scanner import first_chapter_mentioned, scan_markers
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,13 @@ class Command(BaseCommand):
             action='store_true',
             help='Create explanations for existing shlokas that don\'t have them',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.EXPLANATION_GENERATION_CONCURRENCY,
+            help='Explanations generated at once per chapter '
+                 f'(default: EXPLANATION_GENERATION_CONCURRENCY, {settings.EXPLANATION_GENERATION_CONCURRENCY})',
+        )
 
     def handle(self, *args, **options):
         """Extract and save shlokas from PDF books."""
@@ -75,6 +83,7 @@ class Command(BaseCommand):
         verbose = options['verbose']
         skip_explanations = options['skip_explanations']
         create_explanations_for_existing = options.get('create_explanations_for_existing', False)
+        concurrency = options['concurrency']
 
         self.stdout.write("=" * 70)
         self.stdout.write(self.style.SUCCESS("Extracting Shlokas from PDF Books"))
@@ -85,11 +94,12 @@ class Command(BaseCommand):
         self.stdout.write(f"Skip existing: {skip_existing}")
         self.stdout.write(f"Dry run: {dry_run}")
         self.stdout.write(f"Generate explanations: {not skip_explanations}")
+        self.stdout.write(f"Concurrent explanations: {concurrency}")
         self.stdout.write("")
 
         # Initialize services
         shloka_service = ShlokaService()
-        book_context_service = BookContextService()
+        book_context_service = get_book_context_service()
 
         # Check if PDFs exist and show paths
         self.stdout.write(f"\nChecking PDF files...")
@@ -152,6 +162,7 @@ class Command(BaseCommand):
                     verbose=verbose,
                     skip_explanations=skip_explanations,
                     create_explanations_for_existing=create_explanations_for_existing,
+                    concurrency=concurrency,
                 )
 
                 chapter_stats[chapter_num] = {
@@ -250,35 +261,37 @@ class Command(BaseCommand):
         verbose=False,
         skip_explanations=False,
         create_explanations_for_existing=False,
+        concurrency=None,
     ):
         """Process a single chapter and extract shlokas."""
         added = 0
         skipped = 0
         errors = 0
+        # Shlokas needing an explanation; generated together, concurrently, once the chapter is saved
+        pending_explanations = []
 
         # Load PDF
         self.stdout.write(f"  Loading PDF: {book_context_service.english_book_path.name}")
-        pdf_reader = book_context_service._load_pdf(
-            book_context_service.english_book_path
+        page_store = book_context_service.get_store(
+            book_context_service.english_book_path, build=True
         )
-        if not pdf_reader:
+        if not page_store:
             self.stdout.write(
                 self.style.ERROR("  ✗ Failed to load PDF")
             )
             return added, skipped, errors + 1
 
-        total_pages = len(pdf_reader.pages)
+        total_pages = page_store.page_count
         self.stdout.write(f"  ✓ PDF loaded successfully ({total_pages} total pages)")
 
         # Find chapter start page
         self.stdout.write(f"  Searching for Chapter {chapter_num}...")
-        chapter_start_page = self._find_chapter_start_page(
-            pdf_reader, chapter_num
-        )
+        chapter_pages = self._find_chapter_pages(page_store, chapter_num)
 
-        if chapter_start_page is None:
+        if chapter_pages is None:
             # Fallback to estimated page
             chapter_start_page = (chapter_num - 1) * 15
+            chapter_end_page = min(chapter_start_page + 25, total_pages)
             self.stdout.write(
                 self.style.WARNING(
                     f"  ⚠ Could not find Chapter {chapter_num} start page, "
@@ -286,6 +299,7 @@ class Command(BaseCommand):
                 )
             )
         else:
+            chapter_start_page, chapter_end_page = chapter_pages
             self.stdout.write(
                 self.style.SUCCESS(
                     f"  ✓ Found Chapter {chapter_num} starting at page {chapter_start_page}"
@@ -294,15 +308,13 @@ class Command(BaseCommand):
 
         # Extract chapter text
         start_page = chapter_start_page
-        end_page = min(chapter_start_page + 25, total_pages)
+        end_page = chapter_end_page
 
         self.stdout.write(
             f"  Extracting text from pages {start_page}-{end_page}..."
         )
 
-        raw_chapter_text = book_context_service._extract_text_from_pdf(
-            pdf_reader, (start_page, end_page)
-        )
+        raw_chapter_text = page_store.pages_text(start_page, end_page)
 
         if not raw_chapter_text:
             self.stdout.write(
@@ -310,9 +322,7 @@ class Command(BaseCommand):
             )
             # Try to extract from a single page to debug
             if start_page < total_pages:
-                test_text = book_context_service._extract_text_from_pdf(
-                    pdf_reader, (start_page, start_page + 1)
-                )
+                test_text = page_store.pages_text(start_page, start_page + 1)
                 if test_text:
                     self.stdout.write(
                         f"  Debug: Extracted {len(test_text)} chars from single page {start_page}"
@@ -350,23 +360,13 @@ class Command(BaseCommand):
         wrong_chapter = False
         text_start = chapter_text[:500]  # Check first 500 chars - this is where chapter markers appear
         
-        # Find the first chapter marker in the START of the text
-        first_chapter_found = None
-        first_chapter_pos = len(text_start)
-        
-        for check_chapter in range(1, 19):
-            for pattern in [f'Chapter {check_chapter}', f'CHAPTER {check_chapter}']:
-                pos = text_start.find(pattern)
-                if pos != -1 and pos < first_chapter_pos:
-                    first_chapter_pos = pos
-                    first_chapter_found = check_chapter
+        # Find the first chapter marker in the START of the text (one marker scan)
+        start_markers = [marker for marker in scan_markers(text_start) if marker.is_chapter]
+        first_chapter_found = start_markers[0].chapter if start_markers else None
+        first_chapter_pos = start_markers[0].start if start_markers else len(text_start)
         
         # Check if our target chapter appears in the first 500 chars
-        target_chapter_in_start = False
-        for pattern in [f'Chapter {chapter_num}', f'CHAPTER {chapter_num}']:
-            if pattern in text_start:
-                target_chapter_in_start = True
-                break
+        target_chapter_in_start = any(marker.chapter == chapter_num for marker in start_markers)
         
         # If the first chapter found is not our target chapter, we have wrong chapter
         # This is strict: if "Chapter 13" appears first and "Chapter 1" doesn't appear in first 500 chars, it's wrong
@@ -413,31 +413,14 @@ class Command(BaseCommand):
                 if try_page < 0 or try_page >= total_pages:
                     continue
                 
-                test_text = book_context_service._extract_text_from_pdf(
-                    pdf_reader, (try_page, min(try_page + 10, total_pages))
-                )
+                test_text = page_store.pages_text(try_page, min(try_page + 10, total_pages))
                 if test_text:
                     test_cleaned = shloka_service._clean_pdf_text(test_text)
+                    chapter_markers = [marker for marker in scan_markers(test_cleaned) if marker.is_chapter]
                     # Check if this page has the correct chapter
-                    has_correct_chapter = (
-                        f'Chapter {chapter_num}' in test_cleaned or 
-                        f'CHAPTER {chapter_num}' in test_cleaned
-                    )
-                    # Check if it doesn't have other chapters prominently
-                    has_other_chapter = False
-                    for other_chapter in range(1, 19):
-                        if other_chapter != chapter_num:
-                            if f'Chapter {other_chapter}' in test_cleaned or f'CHAPTER {other_chapter}' in test_cleaned:
-                                other_pos = test_cleaned.find(f'Chapter {other_chapter}')
-                                if other_pos == -1:
-                                    other_pos = test_cleaned.find(f'CHAPTER {other_chapter}')
-                                correct_pos = test_cleaned.find(f'Chapter {chapter_num}')
-                                if correct_pos == -1:
-                                    correct_pos = test_cleaned.find(f'CHAPTER {chapter_num}')
-                                
-                                if other_pos != -1 and (correct_pos == -1 or other_pos < correct_pos):
-                                    has_other_chapter = True
-                                    break
+                    has_correct_chapter = any(marker.chapter == chapter_num for marker in chapter_markers)
+                    # Check if it doesn't have other chapters prominently (before ours)
+                    has_other_chapter = first_chapter_mentioned(chapter_markers) not in (None, chapter_num)
                     
                     if has_correct_chapter and not has_other_chapter:
                         test_has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in test_cleaned)
@@ -473,9 +456,7 @@ class Command(BaseCommand):
                 try_page = start_page + offset
                 if try_page >= total_pages:
                     break
-                test_text = book_context_service._extract_text_from_pdf(
-                    pdf_reader, (try_page, min(try_page + 5, total_pages))
-                )
+                test_text = page_store.pages_text(try_page, min(try_page + 5, total_pages))
                 if test_text:
                     test_cleaned = shloka_service._clean_pdf_text(test_text)
                     test_has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in test_cleaned)
@@ -777,11 +758,8 @@ class Command(BaseCommand):
                                 )
                             )
                             
-                            # Generate and save explanations immediately for consistency
                             if not dry_run and not skip_explanations:
-                                self._generate_explanations_for_shloka(
-                                    shloka_service, shloka, verbose
-                                )
+                                pending_explanations.append(shloka)
                         else:
                             skipped += 1
                             self.stdout.write(
@@ -791,16 +769,13 @@ class Command(BaseCommand):
                             
                             # Create explanation for existing shloka if it doesn't have one
                             if not dry_run and not skip_explanations and create_explanations_for_existing:
-                                from apps.sanatan_app.models import ShlokaExplanation
                                 has_explanation = ShlokaExplanation.objects.filter(shloka=shloka).exists()
                                 if not has_explanation:
                                     if verbose:
                                         self.stdout.write(
-                                            f"      Creating explanation for existing shloka..."
+                                            f"      Queued explanation for existing shloka"
                                         )
-                                    self._generate_explanations_for_shloka(
-                                        shloka_service, shloka, verbose
-                                    )
+                                    pending_explanations.append(shloka)
                                 elif verbose:
                                     self.stdout.write(
                                         f"      Shloka already has explanation, skipping"
@@ -824,115 +799,69 @@ class Command(BaseCommand):
                 )
                 logger.exception(e)
 
-        # After processing all shlokas, create explanations for existing shlokas if requested
+        # After processing all shlokas, include existing shlokas without explanations if requested
         if not dry_run and not skip_explanations and create_explanations_for_existing:
-            from apps.sanatan_app.models import ShlokaExplanation
-            self.stdout.write("  Creating explanations for existing shlokas without explanations...")
-            existing_shlokas_in_chapter = Shloka.objects.filter(
-                book_name=book_name,
-                chapter_number=chapter_num
+            pending_ids = {shloka.id for shloka in pending_explanations}
+            pending_explanations.extend(
+                shloka for shloka in Shloka.objects.filter(
+                    book_name=book_name,
+                    chapter_number=chapter_num,
+                    explanations__isnull=True
+                ).order_by('verse_number')
+                if shloka.id not in pending_ids
+            )
+
+        if pending_explanations:
+            self._generate_explanations_for_shlokas(
+                shloka_service, pending_explanations, verbose, concurrency
             )
-            explanations_created = 0
-            for existing_shloka in existing_shlokas_in_chapter:
-                has_explanation = ShlokaExplanation.objects.filter(shloka=existing_shloka).exists()
-                if not has_explanation:
-                    try:
-                        if verbose:
-                            self.stdout.write(
-                                f"    Creating explanation for Chapter {chapter_num}, "
-                                f"Verse {existing_shloka.verse_number}..."
-                            )
-                        self._generate_explanations_for_shloka(
-                            shloka_service, existing_shloka, verbose
-                        )
-                        explanations_created += 1
-                    except Exception as e:
-                        logger.warning(
-                            f"Failed to create explanation for existing shloka "
-                            f"{existing_shloka.id}: {str(e)}"
-                        )
-                        if verbose:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"      ⚠ Failed to create explanation: {str(e)}"
-                                )
-                            )
-            if explanations_created > 0:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"  ✓ Created {explanations_created} explanation(s) for existing shlokas"
-                    )
-                )
 
         return added, skipped, errors
 
-    def _generate_explanations_for_shloka(self, shloka_service, shloka, verbose=False):
+    def _generate_explanations_for_shlokas(self, shloka_service, shlokas, verbose=False, concurrency=None):
         """
-        Generate and save structured explanation for a shloka.
+        Generate and save structured explanations for a chapter's shlokas.
         
-        This ensures all shlokas have consistent explanations generated at extraction time.
-        Verifies that all explanation fields are properly saved.
+        Up to ``concurrency`` generations run at once and the results are
+        written in bulk. Verifies that all explanation fields are properly saved.
         """
-        explanations_generated = 0
-        explanations_failed = 0
+        self.stdout.write(
+            f"  Generating {len(shlokas)} explanation(s), "
+            f"{concurrency or settings.EXPLANATION_GENERATION_CONCURRENCY} at a time..."
+        )
+        explanations = shloka_service.generate_and_store_explanations(shlokas, max_workers=concurrency)
         
-        # Generate structured explanation (single explanation per shloka now)
-        try:
-            if verbose:
+        for shloka in shlokas:
+            explanation = explanations.get(shloka.id)
+            label = f"Chapter {shloka.chapter_number}, Verse {shloka.verse_number}"
+            if explanation is None:
+                logger.warning(f"Failed to generate explanation for shloka {shloka.id}")
                 self.stdout.write(
-                    f"      Generating explanation for Chapter {shloka.chapter_number}, "
-                    f"Verse {shloka.verse_number}..."
+                    self.style.WARNING(f"    ⚠ {label}: explanation generation failed")
                 )
+                continue
             
-            explanation = shloka_service.generate_and_store_explanation(shloka)
-            if explanation:
-                explanations_generated += 1
-                # Verify all fields are saved
-                fields_status = self._verify_explanation_fields(explanation)
-                if verbose:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"      ✓ Explanation generated (ID: {explanation.id})"
-                        )
-                    )
-                    self._log_explanation_fields(explanation, fields_status)
-                elif not all(fields_status.values()):
-                    # Log warning if some fields are missing even in non-verbose mode
-                    missing_fields = [field for field, present in fields_status.items() if not present]
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"      ⚠ Explanation missing fields: {', '.join(missing_fields)}"
-                        )
-                    )
-            else:
-                explanations_failed += 1
-                if verbose:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"      ⚠ Explanation generation returned None"
-                        )
-                    )
-        except Exception as e:
-            explanations_failed += 1
-            logger.warning(
-                f"Failed to generate explanation for shloka {shloka.id}: {str(e)}"
-            )
+            # Verify all fields are saved
+            fields_status = self._verify_explanation_fields(explanation)
             if verbose:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"    ✓ {label}: explanation generated (ID: {explanation.id})"
+                    )
+                )
+                self._log_explanation_fields(explanation, fields_status)
+            elif not all(fields_status.values()):
+                # Log warning if some fields are missing even in non-verbose mode
+                missing_fields = [field for field, present in fields_status.items() if not present]
                 self.stdout.write(
                     self.style.WARNING(
-                        f"      ⚠ Failed to generate explanation: {str(e)}"
+                        f"    ⚠ {label}: explanation missing fields: {', '.join(missing_fields)}"
                     )
                 )
         
-        if not verbose and explanations_generated > 0:
-            self.stdout.write(
-                f"      ✓ Generated explanation for shloka"
-            )
-        
-        if explanations_failed > 0:
-            logger.warning(
-                f"Failed to generate explanation for shloka {shloka.id}"
-            )
+        self.stdout.write(
+            self.style.SUCCESS(f"  ✓ Generated {len(explanations)}/{len(shlokas)} explanation(s)")
+        )
     
     def _verify_explanation_fields(self, explanation):
         """
@@ -985,154 +914,16 @@ class Command(BaseCommand):
             status_style(f"          {status_icon} word_by_word (on Shloka): {'Present' + word_count if word_by_word_present else 'Missing'}")
         )
 
-    def _find_chapter_start_page(self, pdf_reader, chapter_num):
+    def _find_chapter_pages(self, page_store, chapter_num):
         """
-        Find the starting page number for a chapter.
+        Find the page range (start, end) of a chapter.
         
-        This method intelligently finds the actual chapter content, not the table of contents.
-        It looks for:
-        1. Chapter markers (Chapter X, CHAPTER X, etc.)
-        2. Actual chapter content indicators (Sanskrit text, verse numbers, etc.)
-        3. Excludes table of contents (TOC) pages
+        Uses the chapter index built alongside the book's page text store, which
+        only records pages with actual chapter content (not the table of contents).
+        Returns None if the chapter's heading was not found in the book.
         """
-        # Search for chapter markers
-        chapter_patterns = [
-            f'Chapter {chapter_num}',
-            f'CHAPTER {chapter_num}',
-            f'Ch. {chapter_num}',
-            f'CH. {chapter_num}',
-        ]
-        
-        # Patterns that indicate table of contents (TOC)
-        toc_indicators = [
-            'Contents',
-            'CONTENTS',
-            'Table of Contents',
-            'TABLE OF CONTENTS',
-            'Preface',
-            'Introduction',
-            'CHAPTER 2',  # If we see multiple chapters listed, it's likely TOC
-            'CHAPTER 3',
-        ]
-        
-        # Patterns that indicate actual chapter content
-        content_indicators = [
-            'VERSE',
-            'verse',
-            'Verse',
-            'श्लोक',  # Shloka in Devanagari
-            'Text:',  # Some PDFs have "Text:" before Sanskrit
-        ]
-
-        # Search in estimated range (wider search for first chapters)
-        # For Chapter 1, start from page 0, for others use estimated
-        if chapter_num == 1:
-            search_start = 0
-            search_end = min(50, len(pdf_reader.pages))  # Search first 50 pages for Chapter 1
-        else:
-            estimated_start = (chapter_num - 1) * 15
-            search_start = max(0, estimated_start - 10)
-            search_end = min(estimated_start + 30, len(pdf_reader.pages))
-
-        candidate_pages = []
-        
-        for page_num in range(search_start, search_end):
-            try:
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-
-                if not page_text:
-                    continue
-                
-                # Check if this page has chapter marker
-                has_chapter_marker = False
-                for pattern in chapter_patterns:
-                    if pattern in page_text:
-                        has_chapter_marker = True
-                        break
-                
-                if not has_chapter_marker:
-                    continue
-                
-                # Check if this looks like TOC (exclude it)
-                is_toc = False
-                for toc_indicator in toc_indicators:
-                    if toc_indicator in page_text:
-                        # Additional check: if page has chapter numbers but also has TOC indicators
-                        # and doesn't have much content, it's likely TOC
-                        if len(page_text) < 1000:  # TOC pages are usually short
-                            is_toc = True
-                            break
-                
-                if is_toc:
-                    continue
-                
-                # Check if this page has actual content indicators
-                has_content = False
-                content_score = 0
-                
-                # Check for Sanskrit/Devanagari characters
-                has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in page_text)
-                if has_devanagari:
-                    content_score += 3
-                    has_content = True
-                
-                # Check for verse markers
-                for indicator in content_indicators:
-                    if indicator in page_text:
-                        content_score += 2
-                        has_content = True
-                
-                # Check for verse numbers (like "1.", "2.", "Verse 1", etc.)
-                verse_patterns = [
-                    rf'\b{chapter_num}\.\d+',  # Chapter.Verse like "1.1", "1.2"
-                    rf'Verse\s+{chapter_num}\.\d+',
-                    rf'VERSE\s+{chapter_num}\.\d+',
-                ]
-                for pattern in verse_patterns:
-                    if re.search(pattern, page_text):
-                        content_score += 2
-                        has_content = True
-                        break
-                
-                # If we found chapter marker and content indicators, this is likely the real chapter
-                if has_content and content_score >= 2:
-                    candidate_pages.append((page_num, content_score))
-                    
-            except Exception as e:
-                logger.debug(f"Error checking page {page_num}: {str(e)}")
-                continue
-        
-        # Return the page with highest content score (most likely to be actual chapter)
-        if candidate_pages:
-            # Sort by content score (descending) and return the first one
-            candidate_pages.sort(key=lambda x: x[1], reverse=True)
-            best_page = candidate_pages[0][0]
-            logger.info(f"Found Chapter {chapter_num} at page {best_page} (score: {candidate_pages[0][1]})")
-            return best_page
-        
-        # Fallback: if no good candidate found, try simple pattern matching
-        # but skip obvious TOC pages
-        for page_num in range(search_start, min(search_start + 30, len(pdf_reader.pages))):
-            try:
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                
-                if not page_text:
-                    continue
-                
-                # Skip if it looks like TOC
-                if any(toc in page_text for toc in toc_indicators) and len(page_text) < 1000:
-                    continue
-                
-                # Check for chapter marker
-                for pattern in chapter_patterns:
-                    if pattern in page_text:
-                        # Additional check: page should have some substantial content
-                        if len(page_text) > 500:  # Real chapters have more content
-                            return page_num
-            except Exception:
-                continue
-
-        return None
+        chapter_pages = page_store.chapter_range(chapter_num)
+        if chapter_pages is not None:
+            logger.info(f"Found Chapter {chapter_num} at pages {chapter_pages[0]}-{chapter_pages[1]}")
+        return chapter_pages
 
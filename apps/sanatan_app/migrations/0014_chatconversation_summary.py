@@ -0,0 +1,24 @@
+# Generated by Django 4.2.26 on 2026-10-18 21:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sanatan_app', '0013_userstreak_awarded_milestones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary',
+            field=models.TextField(blank=True, help_text='Rolling summary of turns older than the prompt history window', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary_message_count',
+            field=models.IntegerField(default=0, help_text='Number of oldest messages covered by the summary', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
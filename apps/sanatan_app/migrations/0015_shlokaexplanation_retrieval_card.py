@@ -0,0 +1,86 @@
+# Generated by Django 4.2.26 on 2026-10-18 21:35
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of services.retrieval_cards as of this migration, so later changes to
+# the card format never change what this migration does
+CHARS_PER_TOKEN = 4
+RETRIEVAL_CARD_MAX_TOKENS = 120
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _squash(text):
+    return _WHITESPACE_RE.sub(' ', text or '').strip()
+
+
+def _trim_to_sentences(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+
+    kept = ''
+    for sentence in _SENTENCE_END_RE.split(text):
+        candidate = f"{kept} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        kept = candidate
+
+    if not kept:
+        kept = text[:max_chars].rsplit(' ', 1)[0].rstrip(',;:') + '…'
+    return kept
+
+
+def build_retrieval_card(explanation):
+    remaining = RETRIEVAL_CARD_MAX_TOKENS * CHARS_PER_TOKEN
+    lines = []
+
+    themes = explanation.themes or []
+    themes_str = ', '.join(str(theme) for theme in themes[:5]) if isinstance(themes, list) else str(themes)
+
+    sections = [
+        ('Teaching', _squash(explanation.summary)),
+        ('Meaning', _squash(explanation.detailed_meaning)),
+        ('Relevance', _squash(explanation.why_this_matters)),
+        ('Themes', _squash(themes_str)),
+    ]
+    for label, text in sections:
+        budget = remaining - len(label) - 2
+        if not text or budget < 40:
+            continue
+        line = f"{label}: {_trim_to_sentences(text, budget)}"
+        lines.append(line)
+        remaining -= len(line) + 1
+
+    return '\n'.join(lines)
+
+
+def build_retrieval_cards(apps, schema_editor):
+    ShlokaExplanation = apps.get_model('sanatan_app', 'ShlokaExplanation')
+    batch = []
+    for explanation in ShlokaExplanation.objects.iterator(chunk_size=500):
+        explanation.retrieval_card = build_retrieval_card(explanation)
+        batch.append(explanation)
+        if len(batch) >= 500:
+            ShlokaExplanation.objects.bulk_update(batch, ['retrieval_card'])
+            batch = []
+    if batch:
+        ShlokaExplanation.objects.bulk_update(batch, ['retrieval_card'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sanatan_app', '0014_chatconversation_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shlokaexplanation',
+            name='retrieval_card',
+            field=models.TextField(blank=True, default='', help_text='Token-budgeted digest of the explanation for chatbot prompts'),
+        ),
+        migrations.RunPython(build_retrieval_cards, migrations.RunPython.noop),
+    ]
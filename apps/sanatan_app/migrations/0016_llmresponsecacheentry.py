@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-18 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sanatan_app', '0015_shlokaexplanation_retrieval_card'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCacheEntry',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100)),
+                ('response', models.TextField()),
+                ('size_bytes', models.PositiveIntegerField(help_text='UTF-8 size of the response, used for size-based eviction')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'llm_response_cache',
+            },
+        ),
+    ]
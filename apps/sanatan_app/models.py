@@ -113,6 +113,13 @@ class ShlokaExplanation(TimestampedModel):
         help_text="Number of improvement iterations performed"
     )
     
+    # Compact digest used in chatbot prompts (refreshed on save)
+    retrieval_card = models.TextField(
+        blank=True,
+        default='',
+        help_text="Token-budgeted digest of the explanation for chatbot prompts"
+    )
+    
     # Metadata
     ai_model_used = models.TextField(blank=True, null=True)
     generation_prompt = models.TextField(blank=True, null=True)
@@ -428,6 +435,16 @@ class ChatConversation(TimestampedModel):
         related_name='chat_conversations'
     )
     title = models.TextField(blank=True, null=True)  # Optional title for the conversation
+    summary = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Rolling summary of turns older than the prompt history window"
+    )
+    summary_message_count = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Number of oldest messages covered by the summary"
+    )
 
     class Meta:
         db_table = 'chat_conversations'
@@ -461,3 +478,18 @@ class ChatMessage(TimestampedModel):
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
 
+
+class LLMResponseCacheEntry(TimestampedModel):
+    """Cached LLM completion, keyed by a hash of the request (model, messages and sampling parameters)."""
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    size_bytes = models.PositiveIntegerField(help_text="UTF-8 size of the response, used for size-based eviction")
+    hit_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'llm_response_cache'
+
+    def __str__(self):
+        return f"{self.model} - {self.key[:12]} ({self.size_bytes} bytes)"
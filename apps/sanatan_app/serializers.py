@@ -237,10 +237,39 @@ class ChatConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class ChatConversationMetadataSerializer(serializers.ModelSerializer):
+    """Conversation fields returned with a chat turn (messages come from the paginated endpoint)."""
+    
+    class Meta:
+        model = ChatConversation
+        fields = ['id', 'title', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class ChatConversationListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for conversation lists (no nested messages).
+    
+    Expects a queryset annotated by ChatbotService.get_conversation_list_queryset.
+    """
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_preview = serializers.CharField(read_only=True, allow_null=True)
+    last_message_role = serializers.CharField(read_only=True, allow_null=True)
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = ChatConversation
+        fields = [
+            'id', 'title', 'created_at', 'updated_at',
+            'message_count', 'last_message_preview', 'last_message_role', 'last_message_at',
+        ]
+        read_only_fields = fields
+
+
 class ChatMessageCreateSerializer(serializers.Serializer):
     """Serializer for creating a chat message."""
     message = serializers.CharField(required=True, max_length=2000)
     conversation_id = serializers.UUIDField(required=False, allow_null=True)
+    stream = serializers.BooleanField(required=False, default=False)
 
 
 class ProfileUpdateSerializer(serializers.Serializer):
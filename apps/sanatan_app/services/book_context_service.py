@@ -3,13 +3,24 @@ Book Context Service for extracting relevant context from PDF books.
 
 This service extracts relevant passages from the provided Bhagavad Gita PDFs
 (Hindi and English) to provide contextual information for shloka explanations.
+Page text is read from a persistent BookTextStore; pypdf only runs the first
+time a given version of a PDF is seen, and verse passages are sliced using the
+store's verse index. Use ``get_book_context_service()`` to share one instance
+(and its chapter text cache) across the process.
 """
 import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Hashable, List
 import logging
 from django.conf import settings
 
+from .book_text_store import BookTextStore, file_content_hash, slice_verse, verse_offsets
+from .marker_scanner import REFERENCE, scan_markers
+
 try:
     from pypdf import PdfReader
 except ImportError:
@@ -19,6 +30,69 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+class ChapterTextCache:
+    """
+    LRU cache of chapter texts bounded by their in-memory size.
+
+    Keys are (book content hash, chapter number): every verse of a chapter
+    reads the same pages, so verses share one entry.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def set(self, key: Hashable, text: str) -> None:
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = text
+            self._sizes[key] = size
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
 class BookContextService:
     """Service for extracting context from PDF books."""
     
@@ -35,11 +109,14 @@ class BookContextService:
         self.english_book_path = self.base_dir / self.ENGLISH_BOOK
         self.hindi_book_path = self.base_dir / self.HINDI_BOOK
         
-        # Cache for loaded PDFs
-        self._english_pdf = None
-        self._hindi_pdf = None
-        self._english_text_cache = {}
-        self._hindi_text_cache = {}
+        # Page text stores by PDF content hash
+        self._stores: Dict[str, BookTextStore] = {}
+        self._stores_lock = threading.Lock()
+        
+        self.chapter_cache = ChapterTextCache(settings.BOOK_CONTEXT_CACHE_MAX_BYTES)
+        
+        # English and Hindi lookups run side by side
+        self._executor: Optional[ThreadPoolExecutor] = None
     
     def _load_pdf(self, book_path: Path) -> Optional[object]:
         """Load a PDF file and return the reader object."""
@@ -103,15 +180,103 @@ class BookContextService:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             return ""
     
+    def extract_page_text(self, pdf_reader, page_num: int) -> str:
+        """Extracted and cleaned text of one page, as kept in the page text store."""
+        # Imported here: shloka_service depends on this module
+        from .shloka_service import ShlokaService
+        return ShlokaService._clean_pdf_text(
+            self._extract_text_from_pdf(pdf_reader, (page_num, page_num + 1))
+        )
+
+    def _iter_page_texts(self, pdf_reader):
+        """Yield the text of every page, in order ('' for unreadable pages)."""
+        for page_num in range(len(pdf_reader.pages)):
+            yield self.extract_page_text(pdf_reader, page_num)
+
+    def get_store(self, book_path: Path, build: bool = False) -> Optional[BookTextStore]:
+        """
+        Get the page text store for a book.
+
+        Stores are extracted ahead of time by ``manage.py preprocess_books``
+        (run on deploy). Request paths never extract: a missing store is
+        logged and yields no book context. Commands and background tasks pass
+        ``build=True`` to extract it from the PDF instead.
+
+        Returns:
+            BookTextStore, or None if the store is missing (and not built) or
+            the PDF is missing or cannot be read
+        """
+        if not book_path.exists():
+            logger.warning(f"PDF file not found: {book_path}")
+            return None
+
+        content_hash = file_content_hash(book_path)
+        store = self._stores.get(content_hash)
+        if store is not None:
+            return store
+
+        store = BookTextStore(book_path)
+        if not store.exists():
+            if not build:
+                logger.warning(
+                    f"No page text store for {book_path.name}; run 'python manage.py preprocess_books'"
+                )
+                return None
+            with self._stores_lock:
+                store = self._stores.get(content_hash)
+                if store is not None:
+                    return store
+                store = BookTextStore(book_path)
+                if not store.exists():
+                    # The PDF reader is only loaded when the store has to be (re)built
+                    pdf_reader = self._load_pdf(book_path)
+                    if pdf_reader is None:
+                        return None
+                    logger.info(f"Extracting page text store for {book_path.name}")
+                    store.build(self._iter_page_texts(pdf_reader))
+
+        self._stores[content_hash] = store
+        return store
+
+    @staticmethod
+    def estimate_chapter_pages(chapter_number: int) -> tuple:
+        """
+        Rough page range of a chapter, for books whose chapter headings were not indexed.
+
+        For Bhagavad Gita, chapters are roughly 10-20 pages each, so the range
+        is widened to make sure it covers the chapter.
+        """
+        return (chapter_number - 1) * 15, chapter_number * 15 + 5
+
+    def _get_chapter_text(self, book_path: Path, chapter_number: int) -> str:
+        """Text of the pages a chapter spans, through the chapter cache."""
+        store = self.get_store(book_path)
+        if store is None:
+            return ""
+
+        cache_key = (store.content_hash, chapter_number)
+        text = self.chapter_cache.get(cache_key)
+        if text is None:
+            page_range = store.chapter_range(chapter_number) or self.estimate_chapter_pages(chapter_number)
+            text = store.pages_text(*page_range)
+            self.chapter_cache.set(cache_key, text)
+        return text
+
+    def _truncate_context(self, context: str) -> str:
+        if len(context) > self.MAX_CONTEXT_LENGTH:
+            context = context[:self.MAX_CONTEXT_LENGTH] + "..."
+        return context
+
     def _search_for_chapter_verse(self, text: str, chapter: int, verse: int) -> str:
         """
-        Search for relevant context around a specific chapter and verse.
+        Find the passage for a specific chapter and verse in a chapter's text.
         
-        This method looks for patterns like "Chapter X", "Verse Y", etc.
-        and extracts surrounding context.
+        The passage runs from the verse marker ("VERSE 12", "TEXT 12", ...) to
+        the next one. Text without verse markers falls back to a window around
+        the first exact "chapter.verse" reference.
         
         Args:
-            text: Full text to search in
+            text: Chapter text to search in
             chapter: Chapter number
             verse: Verse number
             
@@ -121,54 +286,29 @@ class BookContextService:
         if not text:
             return ""
         
-        # Search patterns (case-insensitive)
-        patterns = [
-            f"Chapter {chapter}",
-            f"chapter {chapter}",
-            f"CHAPTER {chapter}",
-            f"Ch. {chapter}",
-            f"ch. {chapter}",
-            f"Verse {verse}",
-            f"verse {verse}",
-            f"VERSE {verse}",
-            f"Verse {chapter}.{verse}",
-            f"{chapter}.{verse}",
-        ]
-        
-        text_lower = text.lower()
-        context_parts = []
-        
-        # Try to find relevant sections
-        for pattern in patterns:
-            pattern_lower = pattern.lower()
-            if pattern_lower in text_lower:
-                # Find all occurrences
-                start_idx = 0
-                while True:
-                    idx = text_lower.find(pattern_lower, start_idx)
-                    if idx == -1:
-                        break
-                    
-                    # Extract context around the match (500 chars before and after)
-                    context_start = max(0, idx - 500)
-                    context_end = min(len(text), idx + 1000)
-                    context = text[context_start:context_end]
-                    
-                    # Clean up the context
-                    context = context.strip()
-                    if context and len(context) > 100:  # Only include substantial context
-                        context_parts.append(context)
-                    
-                    start_idx = idx + 1
-        
-        # Combine and limit context length
-        combined_context = "\n\n---\n\n".join(context_parts[:3])  # Max 3 matches
-        
-        # Truncate if too long
-        if len(combined_context) > self.MAX_CONTEXT_LENGTH:
-            combined_context = combined_context[:self.MAX_CONTEXT_LENGTH] + "..."
+        markers = list(scan_markers(text))
+        passage = slice_verse(text, verse_offsets(markers, chapter), verse)
+        if not passage:
+            for marker in markers:
+                if marker.kind == REFERENCE and (marker.chapter, marker.verse) == (chapter, verse):
+                    passage = text[max(0, marker.start - 500):marker.start + 1000].strip()
+                    break
         
-        return combined_context
+        return self._truncate_context(passage)
+
+    def _get_verse_context(self, book_path: Path, chapter_number: int, verse_number: int) -> str:
+        """Passage for a verse, sliced from the book's verse index."""
+        store = self.get_store(book_path)
+        if store is None:
+            return ""
+
+        chapter_text = self._get_chapter_text(book_path, chapter_number)
+        offsets = store.verse_index().get(chapter_number, {})
+        if verse_number in offsets:
+            return self._truncate_context(slice_verse(chapter_text, offsets, verse_number))
+
+        # Chapter or verse not indexed: search the (estimated) chapter pages instead
+        return self._search_for_chapter_verse(chapter_text, chapter_number, verse_number)
     
     def get_context_for_shloka(
         self,
@@ -196,55 +336,24 @@ class BookContextService:
             'hindi_context': ''
         }
         
-        # Load English PDF if needed
+        lookups = {}
         if include_english and self.english_book_path.exists():
-            if self._english_pdf is None:
-                self._english_pdf = self._load_pdf(self.english_book_path)
-            
-            if self._english_pdf:
-                # Try to get cached text or extract it
-                cache_key = f"ch{chapter_number}_v{verse_number}"
-                if cache_key not in self._english_text_cache:
-                    # Extract text from relevant pages (approximate)
-                    # For Bhagavad Gita, chapters are roughly 10-20 pages each
-                    # We'll extract a wider range to ensure we get the context
-                    estimated_start_page = (chapter_number - 1) * 15
-                    estimated_end_page = chapter_number * 15 + 5
-                    
-                    text = self._extract_text_from_pdf(
-                        self._english_pdf,
-                        (estimated_start_page, estimated_end_page)
-                    )
-                    self._english_text_cache[cache_key] = text
-                
-                text = self._english_text_cache[cache_key]
-                context['english_context'] = self._search_for_chapter_verse(
-                    text, chapter_number, verse_number
-                )
-        
-        # Load Hindi PDF if needed
+            lookups['english_context'] = self.english_book_path
         if include_hindi and self.hindi_book_path.exists():
-            if self._hindi_pdf is None:
-                self._hindi_pdf = self._load_pdf(self.hindi_book_path)
-            
-            if self._hindi_pdf:
-                # Try to get cached text or extract it
-                cache_key = f"ch{chapter_number}_v{verse_number}"
-                if cache_key not in self._hindi_text_cache:
-                    # Extract text from relevant pages (approximate)
-                    estimated_start_page = (chapter_number - 1) * 15
-                    estimated_end_page = chapter_number * 15 + 5
-                    
-                    text = self._extract_text_from_pdf(
-                        self._hindi_pdf,
-                        (estimated_start_page, estimated_end_page)
-                    )
-                    self._hindi_text_cache[cache_key] = text
-                
-                text = self._hindi_text_cache[cache_key]
-                context['hindi_context'] = self._search_for_chapter_verse(
-                    text, chapter_number, verse_number
-                )
+            lookups['hindi_context'] = self.hindi_book_path
+
+        if len(lookups) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='book-context')
+            futures = {
+                key: self._executor.submit(self._get_verse_context, book_path, chapter_number, verse_number)
+                for key, book_path in lookups.items()
+            }
+            for key, future in futures.items():
+                context[key] = future.result()
+        else:
+            for key, book_path in lookups.items():
+                context[key] = self._get_verse_context(book_path, chapter_number, verse_number)
         
         return context
     
@@ -268,16 +377,18 @@ class BookContextService:
         if not book_path.exists():
             return ""
         
-        pdf_reader = self._load_pdf(book_path)
-        if not pdf_reader:
-            return ""
-        
-        # Extract text from estimated chapter pages
-        estimated_start_page = (chapter_number - 1) * 15
-        estimated_end_page = chapter_number * 15 + 5
-        
-        return self._extract_text_from_pdf(
-            pdf_reader,
-            (estimated_start_page, estimated_end_page)
-        )
+        return self._get_chapter_text(book_path, chapter_number)
+
+
+_book_context_service = None
+_book_context_service_lock = threading.Lock()
+
 
+def get_book_context_service() -> BookContextService:
+    """Return the process-wide book context service."""
+    global _book_context_service
+    if _book_context_service is None:
+        with _book_context_service_lock:
+            if _book_context_service is None:
+                _book_context_service = BookContextService()
+    return _book_context_service
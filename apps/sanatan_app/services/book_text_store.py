@@ -0,0 +1,375 @@
+"""
+Persistent store of pre-extracted PDF page text.
+
+Each source PDF gets a directory under ``BOOK_TEXT_STORE_DIR`` named after the
+SHA-256 of its content. It holds ``pages.bin`` (the cleaned UTF-8 text of
+every page back to back, followed by the byte offset table of the pages),
+``index.json`` (format version and source metadata), ``chapters.json`` (the chapter -> page range index found while writing the
+pages) and ``verses.json`` (the offset of every verse marker in each chapter's
+text). pypdf runs once per book version; afterwards locating a chapter is a
+dictionary lookup and the passage for a verse is a slice between two known
+offsets.
+
+``pages.bin`` is read through a read-only memory map shared by every store in
+the process, offset table included, so gunicorn workers and Celery children on
+one host all read the same OS page-cache copy of the books instead of holding
+their own.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from array import array
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .marker_scanner import CHAPTER_HEADING, VERSE_HEADING, Marker, scan_markers
+
+logger = logging.getLogger(__name__)
+
+# (resolved path, size, mtime_ns) -> content hash, so a PDF is hashed once per process
+_content_hashes: Dict[Tuple[str, int, int], str] = {}
+_content_hashes_lock = threading.Lock()
+
+# pages.bin layout: page text | offset table (page_count + 1 native uint64) | page_count | magic.
+# Native byte order: the file is a host-local cache, rebuilt from the PDF anywhere else.
+PAGES_MAGIC = b'BKTEXT01'
+_PAGES_TRAILER = struct.Struct('=Q8s')
+
+
+class PagesMap(NamedTuple):
+    """A mapped pages file: the raw map and a zero-copy view of its offset table."""
+    data: mmap.mmap
+    offsets: memoryview
+
+
+# Read-only maps of pages files shared by all stores: path -> (inode, map)
+_page_maps: Dict[str, Tuple[int, PagesMap]] = {}
+_page_maps_lock = threading.Lock()
+
+
+def map_pages_file(path: Path) -> PagesMap:
+    """
+    Process-wide read-only memory map of a pages file.
+
+    A rebuilt file has a new inode and gets a new map; readers still holding
+    the old one keep a consistent view of the old content and offsets.
+    """
+    key = str(path)
+    inode = os.stat(key).st_ino
+    with _page_maps_lock:
+        entry = _page_maps.get(key)
+        if entry is not None and entry[0] == inode:
+            return entry[1]
+
+        with open(key, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        trailer_start = len(data) - _PAGES_TRAILER.size
+        page_count, magic = _PAGES_TRAILER.unpack_from(data, trailer_start)
+        if magic != PAGES_MAGIC:
+            raise ValueError(f"Not a page text file: {path}")
+        table_start = trailer_start - 8 * (page_count + 1)
+        pages_map = PagesMap(data, memoryview(data)[table_start:trailer_start].cast('Q'))
+
+        _page_maps[key] = (inode, pages_map)
+        return pages_map
+
+
+_TOC_RE = re.compile(r'\b(?:contents|preface|introduction)\b', re.IGNORECASE)
+_DEVANAGARI_RE = re.compile(r'[\u0900-\u097f]')
+
+
+def verse_offsets(markers: Iterable[Marker], chapter_number: int) -> Dict[int, int]:
+    """
+    Offset of each verse heading among scanned markers of a chapter's text.
+
+    Headings qualified with another chapter number are skipped, and verse
+    numbers only move forward, so references back to earlier verses in the
+    commentary are ignored. A combined heading ("TEXTS 16-18") maps every verse
+    in the range to the same offset.
+    """
+    offsets: Dict[int, int] = {}
+    last_verse = 0
+    for marker in markers:
+        if marker.kind != VERSE_HEADING:
+            continue
+        if marker.chapter and marker.chapter != chapter_number:
+            continue
+        if marker.verse <= last_verse or marker.verse_end < marker.verse:
+            continue
+        for verse in range(marker.verse, marker.verse_end + 1):
+            offsets[verse] = marker.start
+        last_verse = marker.verse_end
+    return offsets
+
+
+def find_verse_offsets(text: str, chapter_number: int) -> Dict[int, int]:
+    """Character offset of each verse heading in a chapter's text."""
+    return verse_offsets(scan_markers(text), chapter_number)
+
+
+def slice_verse(text: str, offsets: Dict[int, int], verse_number: int) -> str:
+    """The passage from a verse's marker up to the next marker (or the end of the text)."""
+    start = offsets.get(verse_number)
+    if start is None:
+        return ''
+    boundaries = sorted(set(offsets.values()))
+    next_index = bisect.bisect_right(boundaries, start)
+    end = boundaries[next_index] if next_index < len(boundaries) else len(text)
+    return text[start:end].strip()
+
+
+def file_content_hash(path: Path) -> str:
+    """SHA-256 of a file's content, memoized on its size and modification time."""
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _content_hashes_lock:
+        if key in _content_hashes:
+            return _content_hashes[key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+
+    with _content_hashes_lock:
+        _content_hashes[key] = content_hash
+    return content_hash
+
+
+class ChapterIndexBuilder:
+    """
+    Finds the first page of every chapter in a single pass over the pages.
+
+    A page starts a chapter when it has a chapter heading, looks like verse
+    content (Devanagari or verse markers) and is not a table of contents.
+    Chapters only move forward, so later cross-references are ignored.
+    """
+
+    def __init__(self):
+        self.starts: Dict[int, int] = {}
+        self._last_chapter = 0
+
+    def add(self, page_num: int, text: str) -> None:
+        chapters = set()
+        has_verse_marker = False
+        for marker in scan_markers(text):
+            if marker.kind == CHAPTER_HEADING:
+                chapters.add(marker.chapter)
+            elif marker.is_verse:
+                has_verse_marker = True
+
+        if not chapters or len(chapters) > 2:
+            # No heading, or a list of chapters (table of contents)
+            return
+        if _TOC_RE.search(text) and len(text) < 1000:
+            return
+        if not has_verse_marker and not _DEVANAGARI_RE.search(text):
+            return
+
+        new_chapters = [chapter for chapter in chapters if chapter > self._last_chapter]
+        if new_chapters:
+            chapter = min(new_chapters)
+            self.starts[chapter] = page_num
+            self._last_chapter = chapter
+
+    def ranges(self, page_count: int) -> Dict[int, Tuple[int, int]]:
+        """Chapter -> (start_page, end_page), each chapter ending where the next one starts."""
+        ordered = sorted(self.starts.items(), key=lambda item: item[1])
+        ranges = {}
+        for i, (chapter, start_page) in enumerate(ordered):
+            end_page = ordered[i + 1][1] if i + 1 < len(ordered) else page_count
+            ranges[chapter] = (start_page, max(end_page, start_page + 1))
+        return ranges
+
+
+class BookTextStore:
+    """
+    Page text store for one PDF.
+
+    Page numbers are 0-indexed, like pypdf. Reads are thread-safe and go
+    through the shared memory map; the store is written once by ``build`` and
+    replaced atomically.
+    """
+
+    # Bumped whenever the on-disk layout changes
+    FORMAT_VERSION = 4
+
+    PAGES_FILE = 'pages.bin'
+    INDEX_FILE = 'index.json'
+    CHAPTERS_FILE = 'chapters.json'
+    VERSES_FILE = 'verses.json'
+
+    def __init__(self, pdf_path: Path, store_dir: Optional[Path] = None):
+        self.pdf_path = Path(pdf_path)
+        self.store_dir = Path(store_dir or settings.BOOK_TEXT_STORE_DIR)
+        self._chapters: Optional[Dict[int, Tuple[int, int]]] = None
+        self._verses: Optional[Dict[int, Dict[int, int]]] = None
+
+    @property
+    def content_hash(self) -> str:
+        return file_content_hash(self.pdf_path)
+
+    @property
+    def path(self) -> Path:
+        return self.store_dir / self.content_hash[:32]
+
+    def exists(self) -> bool:
+        """Whether a complete store for the current PDF content is on disk."""
+        return self._read_index() is not None
+
+    def build(self, pages: Iterable[str]) -> int:
+        """
+        Write the store from an iterable of page texts, in page order.
+
+        Returns:
+            Number of pages written
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix='.building-', dir=self.store_dir))
+        try:
+            offsets = [0]
+            chapter_index = ChapterIndexBuilder()
+            with open(tmp_dir / self.PAGES_FILE, 'wb') as f:
+                for page_num, text in enumerate(pages):
+                    data = (text or '').encode('utf-8')
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+                    chapter_index.add(page_num, text)
+                array('Q', offsets).tofile(f)
+                f.write(_PAGES_TRAILER.pack(len(offsets) - 1, PAGES_MAGIC))
+            chapters = chapter_index.ranges(len(offsets) - 1)
+
+            index = {
+                'version': self.FORMAT_VERSION,
+                'source': self.pdf_path.name,
+                'content_hash': self.content_hash,
+                'page_count': len(offsets) - 1,
+            }
+            with open(tmp_dir / self.INDEX_FILE, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            with open(tmp_dir / self.CHAPTERS_FILE, 'w', encoding='utf-8') as f:
+                json.dump({str(chapter): list(pages) for chapter, pages in chapters.items()}, f)
+
+            target = self.path
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(tmp_dir, target)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._chapters = chapters
+        self._verses = None
+        logger.info(
+            f"Stored {len(offsets) - 1} pages ({len(chapters)} chapters located) "
+            f"of {self.pdf_path.name} in {self.path}"
+        )
+        return len(offsets) - 1
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages_map().offsets) - 1
+
+    def page_text(self, page_num: int) -> str:
+        """Text of a single page ('' if out of range)."""
+        data, offsets = self._pages_map()
+        if page_num < 0 or page_num >= len(offsets) - 1:
+            return ''
+        return data[offsets[page_num]:offsets[page_num + 1]].decode('utf-8')
+
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[str]:
+        """
+        Texts of pages ``start_page`` up to (not including) ``end_page``, decoded
+        one page at a time so a consumer that stops early never reads the rest.
+        """
+        data, offsets = self._pages_map()
+        page_count = len(offsets) - 1
+        start_page = max(start_page, 0)
+        end_page = page_count if end_page is None else min(end_page, page_count)
+        for n in range(start_page, end_page):
+            yield data[offsets[n]:offsets[n + 1]].decode('utf-8')
+
+    def pages(self, start_page: int = 0, end_page: Optional[int] = None) -> List[str]:
+        """Texts of pages ``start_page`` up to (not including) ``end_page``."""
+        return list(self.iter_pages(start_page, end_page))
+
+    def pages_text(self, start_page: int = 0, end_page: Optional[int] = None) -> str:
+        """Non-empty pages in the range joined by blank lines (same shape as pypdf extraction)."""
+        return "\n\n".join(text for text in self.pages(start_page, end_page) if text)
+
+    def chapter_index(self) -> Dict[int, Tuple[int, int]]:
+        """Chapter number -> (start_page, end_page) for every chapter found in the book."""
+        if self._chapters is None:
+            with open(self.path / self.CHAPTERS_FILE, encoding='utf-8') as f:
+                chapters = json.load(f)
+            self._chapters = {int(chapter): tuple(pages) for chapter, pages in chapters.items()}
+        return self._chapters
+
+    def chapter_range(self, chapter_number: int) -> Optional[Tuple[int, int]]:
+        """Page range of a chapter (end exclusive), or None if its heading was not found."""
+        return self.chapter_index().get(chapter_number)
+
+    def chapter_text(self, chapter_number: int) -> str:
+        """Text of a chapter's pages ('' if the chapter is not indexed)."""
+        chapter_pages = self.chapter_range(chapter_number)
+        return self.pages_text(*chapter_pages) if chapter_pages else ''
+
+    def verse_index(self) -> Dict[int, Dict[int, int]]:
+        """
+        Chapter -> verse -> offset of the verse marker in ``chapter_text(chapter)``.
+
+        Built from the stored pages on first use and persisted next to them.
+        """
+        if self._verses is None:
+            verses_path = self.path / self.VERSES_FILE
+            try:
+                with open(verses_path, encoding='utf-8') as f:
+                    stored = json.load(f)
+                verses = {
+                    int(chapter): {int(verse): offset for verse, offset in offsets.items()}
+                    for chapter, offsets in stored.items()
+                }
+            except (OSError, ValueError):
+                verses = {
+                    chapter: find_verse_offsets(self.chapter_text(chapter), chapter)
+                    for chapter in self.chapter_index()
+                }
+                tmp_path = verses_path.with_name(f'.{self.VERSES_FILE}.{os.getpid()}.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(verses, f)
+                os.replace(tmp_path, verses_path)
+            self._verses = verses
+        return self._verses
+
+    def verse_passage(self, chapter_number: int, verse_number: int) -> str:
+        """Text from a verse's marker up to the next verse ('' if the verse is not indexed)."""
+        offsets = self.verse_index().get(chapter_number, {})
+        if verse_number not in offsets:
+            return ''
+        return slice_verse(self.chapter_text(chapter_number), offsets, verse_number)
+
+    def _read_index(self) -> Optional[Dict]:
+        try:
+            with open(self.path / self.INDEX_FILE, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != self.FORMAT_VERSION:
+            return None
+        if not (self.path / self.PAGES_FILE).exists() or not (self.path / self.CHAPTERS_FILE).exists():
+            return None
+        return index
+
+    def _pages_map(self) -> PagesMap:
+        return map_pages_file(self.path / self.PAGES_FILE)
@@ -2,16 +2,24 @@
 Chatbot service for handling AI conversations about Sanatan Dharma.
 Acts as Lord Krishna, providing guidance based on Bhagavad Gita wisdom.
 """
-from groq import Groq
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from typing import List, Dict, Optional
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Substr
+from django.utils import timezone
+from django.utils.text import Truncator
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from ..models import (
-    ChatConversation, ChatMessage, User, ReadingLog, 
-    Shloka, ShlokaExplanation
+    ChatConversation, ChatMessage, User, ReadingLog, Shloka
 )
+from .shloka_search_index import build_shloka_payload, get_shloka_search_index
+from .tfidf_retrieval import TfidfShlokaRetriever, get_tfidf_retriever
+from .llm_gateway import LLMRateLimitExceeded, llm_gateway
+from .response_cache import response_cache
+from .token_budget import allocate_budget, estimate_messages_tokens, estimate_tokens, trim_history
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 
@@ -19,201 +27,151 @@ logger = logging.getLogger(__name__)
 class ChatbotService:
     """Service for handling chatbot conversations as Lord Krishna."""
     
-    def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+    TEMPERATURE = 0.7  # Balanced for natural but focused responses
+    MAX_TOKENS = 1300  # Limited to encourage concise, efficient responses
+    
+    HISTORY_WINDOW = 10  # Most recent messages sent verbatim to the LLM
+    SUMMARY_REFRESH_INTERVAL = 10  # Unsummarized messages beyond the window before re-summarizing
+    # Older messages not yet folded into the summary are sent verbatim too, up to this many in all
+    MAX_HISTORY_MESSAGES = HISTORY_WINDOW + SUMMARY_REFRESH_INTERVAL
+    SUMMARY_MAX_TOKENS = 400
+    
+    READING_CONTEXT_CACHE_PREFIX = 'chat_reading_context'
+    READING_CONTEXT_CACHE_TTL = 60 * 60  # Safety net; entries are invalidated on new readings
+    
+    JOB_OWNER_CACHE_PREFIX = 'chat_job_owner'
+    
+    # Key karma yoga shlokas to prioritize for achievement questions
+    KEY_ACHIEVEMENT_SHLOKAS = [
+        (2, 47),  # Karma Yoga (do work without attachment to results)
+        (3, 30),  # Dedicate actions to Divine
+        (6, 5),   # Self-improvement
+    ]
+    
+    ACHIEVEMENT_KEYWORDS = ['number', 'first', 'best', 'top', 'success', 'achieve', 
+                            'goal', 'win', 'excel', 'excellence', 'better', 'improve',
+                            'compete', 'competition', 'rank', 'position', 'lead', 'leader']
+    
+    def __init__(self, llm_max_wait: Optional[float] = None):
+        """
+        Args:
+            llm_max_wait: Seconds a chat completion may wait for the shared LLM
+                quota before LLMRateLimitExceeded; None keeps LLM_RATE_LIMIT_MAX_WAIT
+        """
         self.model = "openai/gpt-oss-20b"
+        self.llm_max_wait = llm_max_wait
+    
+    def _get_retriever(self):
+        """Return the configured retrieval engine, ready to query."""
+        if settings.CHATBOT_RETRIEVAL_BACKEND == 'tfidf' and TfidfShlokaRetriever.is_available():
+            retriever = get_tfidf_retriever()
+            retriever.ensure_ready()
+            return retriever
+        
+        index = get_shloka_search_index()
+        index.ensure_built()
+        return index
     
     def find_relevant_shlokas(self, user_message: str, limit: int = 3) -> List[Dict]:
         """
         Find relevant Bhagavad Gita shlokas based on user's question.
-        Uses keyword matching on themes, explanations, and transliteration.
+        Ranks shlokas over themes, explanations, and transliteration with the
+        configured retrieval engine (in-memory BM25 index or TF-IDF matrix).
         Automatically includes key karma yoga shlokas for achievement/success questions.
+        
+        Returns:
+            List of shloka dicts; search hits carry a ``score`` key (BM25 score or
+            TF-IDF cosine similarity, depending on the retrieval engine)
         """
         try:
+            index = self._get_retriever()
+            
             # Check if question is about achievement, success, goals, being number 1, etc.
-            achievement_keywords = ['number', 'first', 'best', 'top', 'success', 'achieve', 
-                                  'goal', 'win', 'excel', 'excellence', 'better', 'improve',
-                                  'compete', 'competition', 'rank', 'position', 'lead', 'leader']
             message_lower = user_message.lower()
-            is_achievement_question = any(keyword in message_lower for keyword in achievement_keywords)
+            is_achievement_question = any(keyword in message_lower for keyword in self.ACHIEVEMENT_KEYWORDS)
             
-            # Key karma yoga shlokas to prioritize for achievement questions
             key_shlokas = []
             if is_achievement_question:
-                # Chapter 2, Verse 47 - Karma Yoga (do work without attachment to results)
-                shloka_2_47 = Shloka.objects.filter(
-                    book_name="Bhagavad Gita",
-                    chapter_number=2,
-                    verse_number=47
-                ).prefetch_related('explanations').first()
-                
-                # Chapter 3, Verse 30 - Dedicate actions to Divine
-                shloka_3_30 = Shloka.objects.filter(
-                    book_name="Bhagavad Gita",
-                    chapter_number=3,
-                    verse_number=30
-                ).prefetch_related('explanations').first()
-                
-                # Chapter 6, Verse 5 - Self-improvement
-                shloka_6_5 = Shloka.objects.filter(
-                    book_name="Bhagavad Gita",
-                    chapter_number=6,
-                    verse_number=5
-                ).prefetch_related('explanations').first()
-                
-                for shloka in [shloka_2_47, shloka_3_30, shloka_6_5]:
-                    if shloka:
-                        key_shlokas.append(shloka)
+                for chapter, verse in self.KEY_ACHIEVEMENT_SHLOKAS:
+                    shloka_data = index.get("Bhagavad Gita", chapter, verse)
+                    if shloka_data:
+                        key_shlokas.append(shloka_data)
             
-            # Extract keywords from user message (simple approach)
-            words = re.findall(r'\b\w+\b', message_lower)
-            # Filter out common words
-            stop_words = {'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'you', 'your', 
-                         'yours', 'he', 'she', 'it', 'they', 'them', 'their', 'what', 
-                         'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 
-                         'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 
-                         'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 
-                         'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while', 'of', 
-                         'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 
-                         'through', 'during', 'before', 'after', 'above', 'below', 'up', 
-                         'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 
-                         'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 
-                         'all', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 
-                         'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 
-                         'very', 'can', 'will', 'just', 'should', 'now', 'how', 'can', 'could'}
+            found_shlokas = index.search(user_message, limit=limit, book_name="Bhagavad Gita")
             
-            keywords = [w for w in words if len(w) > 3 and w not in stop_words]
+            # For achievement questions, prioritize key shlokas and merge with found results
+            combined = list(key_shlokas)
+            key_positions = {(s['chapter'], s['verse']) for s in key_shlokas}
+            for shloka_data in found_shlokas:
+                if (shloka_data['chapter'], shloka_data['verse']) not in key_positions:
+                    combined.append(shloka_data)
             
-            # Combine key shlokas with search results
-            if not keywords:
-                # If no good keywords, use key shlokas or return some popular shlokas
-                if key_shlokas:
-                    shlokas = key_shlokas[:limit]
-                else:
-                    shlokas = Shloka.objects.filter(book_name="Bhagavad Gita")[:limit]
-            else:
-                # Search in themes, explanations, and transliteration
-                base_query = Q(book_name="Bhagavad Gita")
-                
-                # Build OR query for keywords
-                keyword_query = Q()
-                for keyword in keywords[:5]:  # Limit to 5 keywords
-                    keyword_query |= (
-                        Q(explanations__themes__icontains=keyword) |
-                        Q(explanations__summary__icontains=keyword) |
-                        Q(explanations__detailed_meaning__icontains=keyword) |
-                        Q(explanations__detailed_explanation__icontains=keyword) |
-                        Q(transliteration__icontains=keyword)
-                    )
-                
-                # Combine base query with keyword query
-                query = base_query & keyword_query
-                
-                # Get shlokas with explanations
-                found_shlokas = list(Shloka.objects.filter(query).prefetch_related('explanations').distinct()[:limit])
-                
-                # If no results, try broader search - just match transliteration
-                if not found_shlokas:
-                    transliteration_query = Q(book_name="Bhagavad Gita")
-                    transliteration_keyword_query = Q()
-                    for keyword in keywords[:3]:  # Use fewer keywords for fallback
-                        transliteration_keyword_query |= Q(transliteration__icontains=keyword)
-                    
-                    if transliteration_keyword_query:
-                        transliteration_query &= transliteration_keyword_query
-                    
-                    found_shlokas = list(Shloka.objects.filter(transliteration_query).prefetch_related('explanations')[:limit])
-                    
-                    # Final fallback - just get any Bhagavad Gita shlokas
-                    if not found_shlokas:
-                        found_shlokas = list(Shloka.objects.filter(book_name="Bhagavad Gita").prefetch_related('explanations')[:limit])
-                
-                # For achievement questions, prioritize key shlokas and merge with found results
-                if is_achievement_question and key_shlokas:
-                    # Combine key shlokas with found shlokas, prioritizing key ones
-                    combined = []
-                    key_ids = {s.id for s in key_shlokas}
-                    # Add key shlokas first
-                    combined.extend(key_shlokas)
-                    # Add found shlokas that aren't already in key shlokas
-                    for shloka in found_shlokas:
-                        if shloka.id not in key_ids and len(combined) < limit:
-                            combined.append(shloka)
-                    shlokas = combined[:limit]
-                else:
-                    shlokas = found_shlokas[:limit]
+            if combined:
+                return combined[:limit]
             
-            # Format shlokas with their explanations
+            # Final fallback - just get any Bhagavad Gita shlokas
+            shlokas = Shloka.objects.filter(book_name="Bhagavad Gita").prefetch_related('explanations')[:limit]
             relevant_shlokas = []
             for shloka in shlokas:
-                try:
-                    explanation = shloka.explanations.first()
-                    shloka_data = {
-                        'chapter': shloka.chapter_number,
-                        'verse': shloka.verse_number,
-                        'sanskrit': shloka.sanskrit_text,
-                        'transliteration': shloka.transliteration or '',
-                    }
-                    
-                    if explanation:
-                        shloka_data['summary'] = explanation.summary or ''
-                        shloka_data['meaning'] = explanation.detailed_meaning or ''
-                        shloka_data['explanation'] = explanation.detailed_explanation or ''
-                        shloka_data['themes'] = explanation.themes or []
-                    
-                    relevant_shlokas.append(shloka_data)
-                except Exception as e:
-                    logger.warning(f"Error processing shloka {shloka.id}: {str(e)}")
-                    continue
-            
+                explanations = list(shloka.explanations.all())
+                relevant_shlokas.append(build_shloka_payload(shloka, explanations[0] if explanations else None))
             return relevant_shlokas
         except Exception as e:
             logger.error(f"Error finding relevant shlokas: {str(e)}")
             return []
     
+    @classmethod
+    def reading_context_cache_key(cls, user_id) -> str:
+        return f"{cls.READING_CONTEXT_CACHE_PREFIX}:{user_id}"
+    
+    @classmethod
+    def invalidate_conversation_context(cls, user_id) -> None:
+        """Drop the cached reading context after the user's reading log changes."""
+        cache.delete(cls.reading_context_cache_key(user_id))
+    
+    @classmethod
+    def remember_job_owner(cls, job_id, user_id) -> None:
+        """Record who queued a chat job, so only they can read its result."""
+        cache.set(f"{cls.JOB_OWNER_CACHE_PREFIX}:{job_id}", str(user_id), timeout=settings.CHAT_JOB_OWNER_TTL)
+    
+    @classmethod
+    def get_job_owner(cls, job_id) -> Optional[str]:
+        """ID of the user who queued a chat job, or None if unknown or expired."""
+        return cache.get(f"{cls.JOB_OWNER_CACHE_PREFIX}:{job_id}")
+    
     def get_conversation_context(self, user: User) -> str:
-        """Get user's reading context for better chatbot responses."""
+        """
+        Get user's reading context for better chatbot responses.
+        
+        Cached per user; ReadingLog signals invalidate the entry when a
+        reading is logged.
+        """
+        cache_key = self.reading_context_cache_key(user.id)
         try:
-            # Get recent reading stats
-            recent_readings = ReadingLog.objects.filter(user=user).order_by('-read_at')[:5]
+            context = cache.get(cache_key)
+            if context is not None:
+                return context
             
-            if not recent_readings:
-                return ""
+            # Get recent reading stats
+            recent_readings = (
+                ReadingLog.objects.filter(user=user)
+                .select_related('shloka')
+                .order_by('-read_at')[:5]
+            )
             
-            context = "User's recent reading activity:\n"
+            context = ""
             for reading in recent_readings:
                 context += f"- Read {reading.shloka.book_name}, Chapter {reading.shloka.chapter_number}, Verse {reading.shloka.verse_number} ({reading.reading_type})\n"
+            if context:
+                context = "User's recent reading activity:\n" + context
             
+            cache.set(cache_key, context, timeout=self.READING_CONTEXT_CACHE_TTL)
             return context
         except Exception as e:
             logger.warning(f"Failed to get conversation context: {str(e)}")
             return ""
     
-    def generate_response(
-        self,
-        user_message: str,
-        conversation_history: List[Dict[str, str]],
-        user: User
-    ) -> str:
-        """
-        Generate a chatbot response as Lord Krishna using Groq AI.
-        
-        Args:
-            user_message: The user's message
-            conversation_history: List of previous messages in format [{"role": "user/assistant", "content": "..."}]
-            user: The user object for context
-            
-        Returns:
-            The assistant's response text
-        """
-        try:
-            # Find relevant shlokas based on user's question
-            relevant_shlokas = self.find_relevant_shlokas(user_message, limit=3)
-            
-            # Build system message as Lord Krishna
-            context = self.get_conversation_context(user)
-            
-            system_message = """You are Lord Krishna, the Supreme Personality of Godhead, speaking to your devotee as their friend, guide, and mentor. You are the same Krishna who spoke the Bhagavad Gita to Arjuna on the battlefield of Kurukshetra.
+    SYSTEM_PROMPT = """You are Lord Krishna, the Supreme Personality of Godhead, speaking to your devotee as their friend, guide, and mentor. You are the same Krishna who spoke the Bhagavad Gita to Arjuna on the battlefield of Kurukshetra.
 
 CRITICAL: Keep responses EFFICIENT, and ACTIONABLE. Focus on understanding and solving their problem directly.
 
@@ -252,60 +210,341 @@ Core Teachings to Always Emphasize (when relevant):
 Remember: You ARE Krishna speaking directly to help them solve their problem. Be efficient, practical, and solution-focused while maintaining divine wisdom and love. Always remind them of the path: devotion + action without attachment = I take care of the rest.
 
 IMPORTANT: Make your responses feel human and relatable. Use examples from everyday life - work, relationships, studies, hobbies, challenges. Don't just quote scripture - show them how the wisdom applies to their real situation. Like a friend explaining something, use simple analogies and concrete examples. Make them feel understood and supported, not just taught."""
+    
+    def build_messages(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None,
+        relevant_shlokas: Optional[List[Dict]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the chat completion messages for a user turn.
+        
+        The system message carries Krishna's persona, the user's reading
+        context, the rolling summary of older turns and the relevant shlokas,
+        followed by the recent history window and the current user message.
+        The prompt is kept within ``CHAT_PROMPT_TOKEN_BUDGET``: older history
+        is dropped first, then the lowest-ranked shloka context.
+        """
+        # Find relevant shlokas based on user's question
+        if relevant_shlokas is None:
+            relevant_shlokas = self.find_relevant_shlokas(user_message, limit=3)
+        
+        # Build system message as Lord Krishna
+        context = self.get_conversation_context(user)
+        
+        system_message = self.SYSTEM_PROMPT
+        if context:
+            system_message += f"\n\n{context}"
+        if conversation_summary:
+            system_message += f"\n\nSummary of the earlier conversation with this devotee:\n{conversation_summary}"
+        
+        # Persona, reading context, summary and the current message are always sent;
+        # shloka context and then history share what is left of the prompt budget
+        remaining = (
+            settings.CHAT_PROMPT_TOKEN_BUDGET
+            - estimate_messages_tokens([
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message},
+            ])
+        )
+        
+        if relevant_shlokas:
+            shloka_header = "\n\nRelevant Bhagavad Gita shlokas for this conversation:\n"
+            shloka_blocks = allocate_budget(
+                [self._format_shloka_block(i, shloka) for i, shloka in enumerate(relevant_shlokas, 1)],
+                remaining - estimate_tokens(shloka_header)
+            )
+            shloka_blocks = [block for block in shloka_blocks if block]
+            if shloka_blocks:
+                remaining -= estimate_tokens(shloka_header) + sum(estimate_tokens(block) for block in shloka_blocks)
+                system_message += shloka_header + ''.join(shloka_blocks)
+        
+        window = conversation_history[-self.MAX_HISTORY_MESSAGES:]
+        history = trim_history(window, remaining)
+        if len(history) < len(window):
+            logger.info(
+                f"Trimmed chat history to {len(history)} messages to fit the "
+                f"{settings.CHAT_PROMPT_TOKEN_BUDGET}-token prompt budget"
+            )
+        
+        # Build messages for API
+        messages = [
+            {"role": "system", "content": system_message}
+        ]
+        
+        # Add conversation history
+        for msg in history:
+            messages.append({
+                "role": msg["role"],
+                "content": msg["content"]
+            })
+        
+        # Add current user message
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
+        
+        return messages
+    
+    @staticmethod
+    def _format_shloka_block(position: int, shloka: Dict) -> str:
+        """Format one retrieved shloka for the system prompt."""
+        block = f"\n{position}. Chapter {shloka['chapter']}, Verse {shloka['verse']}:\n"
+        if shloka.get('card'):
+            # Compact precomputed digest instead of the full explanation
+            return block + ''.join(f"   {line}\n" for line in shloka['card'].splitlines())
+        if shloka.get('transliteration'):
+            block += f"   Transliteration: {shloka['transliteration']}\n"
+        if shloka.get('summary'):
+            block += f"   Summary: {shloka['summary']}\n"
+        if shloka.get('meaning'):
+            block += f"   Meaning: {shloka['meaning']}\n"
+        if shloka.get('explanation'):
+            block += f"   Explanation: {shloka['explanation']}\n"
+        if shloka.get('themes'):
+            themes_str = ', '.join(shloka['themes']) if isinstance(shloka['themes'], list) else str(shloka['themes'])
+            block += f"   Themes: {themes_str}\n"
+        return block
+    
+    def _prepare_turn(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None
+    ):
+        """
+        Build the prompt for a turn and look up the response cache.
+        
+        Only first-turn messages (no history, no summary) are cacheable. The
+        key covers the whole system prompt, which carries the user's reading
+        context, so an answer is only reused for an identical prompt.
+        
+        Returns:
+            Tuple of (messages, cache_key, cached_response); messages is None on a cache hit
+        """
+        relevant_shlokas = self.find_relevant_shlokas(user_message, limit=3)
+        messages = self.build_messages(
+            user_message, conversation_history, user, conversation_summary, relevant_shlokas
+        )
+        
+        cache_key = None
+        if not conversation_history and not conversation_summary:
+            cache_key = response_cache.make_key(user_message, messages[0]['content'], self.model)
+            if cache_key:
+                cached_response = response_cache.get(cache_key)
+                if cached_response is not None:
+                    return None, cache_key, cached_response
+        
+        return messages, cache_key, None
+    
+    def generate_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """
+        Generate a chatbot response as Lord Krishna using Groq AI.
+        
+        Args:
+            user_message: The user's message
+            conversation_history: List of previous messages in format [{"role": "user/assistant", "content": "..."}]
+            user: The user object for context
+            conversation_summary: Optional rolling summary of turns before the history window
             
-            # Add relevant shlokas context
-            if relevant_shlokas:
-                system_message += "\n\nRelevant Bhagavad Gita shlokas for this conversation:\n"
-                for i, shloka in enumerate(relevant_shlokas, 1):
-                    system_message += f"\n{i}. Chapter {shloka['chapter']}, Verse {shloka['verse']}:\n"
-                    if shloka.get('transliteration'):
-                        system_message += f"   Transliteration: {shloka['transliteration']}\n"
-                    if shloka.get('summary'):
-                        system_message += f"   Summary: {shloka['summary']}\n"
-                    if shloka.get('meaning'):
-                        system_message += f"   Meaning: {shloka['meaning']}\n"
-                    if shloka.get('explanation'):
-                        system_message += f"   Explanation: {shloka['explanation']}\n"
-                    if shloka.get('themes'):
-                        themes_str = ', '.join(shloka['themes']) if isinstance(shloka['themes'], list) else str(shloka['themes'])
-                        system_message += f"   Themes: {themes_str}\n"
+        Returns:
+            The assistant's response text
+        """
+        try:
+            messages, cache_key, cached_response = self._prepare_turn(
+                user_message, conversation_history, user, conversation_summary
+            )
+            if cached_response is not None:
+                return cached_response
             
-            if context:
-                system_message += f"\n\n{context}"
+            # Generate response
+            with llm_gateway.wait_limit(self.llm_max_wait):
+                response = llm_gateway.chat_completion(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                )
             
-            # Build messages for API
-            messages = [
-                {"role": "system", "content": system_message}
-            ]
+            assistant_response = response.choices[0].message.content.strip()
+            if cache_key:
+                response_cache.set(cache_key, assistant_response)
+            return assistant_response
+            
+        except LLMRateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating chatbot response: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    def stream_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Stream a chatbot response as Lord Krishna, yielding text deltas as they arrive.
+        
+        Args:
+            user_message: The user's message
+            conversation_history: List of previous messages in format [{"role": "user/assistant", "content": "..."}]
+            user: The user object for context
+            conversation_summary: Optional rolling summary of turns before the history window
             
-            # Add conversation history
-            for msg in conversation_history[-10:]:  # Keep last 10 messages for context
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+        Yields:
+            Non-empty chunks of the assistant's response text
+        """
+        try:
+            messages, cache_key, cached_response = self._prepare_turn(
+                user_message, conversation_history, user, conversation_summary
+            )
+            if cached_response is not None:
+                yield cached_response
+                return
             
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
+            with llm_gateway.wait_limit(self.llm_max_wait):
+                stream = llm_gateway.chat_completion(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                    stream=True,
+                )
             
-            # Generate response
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,  # Balanced for natural but focused responses
-                max_tokens=1300,  # Limited to encourage concise, efficient responses
+            chunks = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+            
+            if cache_key:
+                response_cache.set(cache_key, ''.join(chunks).strip())
+                    
+        except LLMRateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming chatbot response: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    async def agenerate_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Async variant of generate_response using the async Groq client."""
+        try:
+            messages, cache_key, cached_response = await sync_to_async(self._prepare_turn)(
+                user_message, conversation_history, user, conversation_summary
             )
+            if cached_response is not None:
+                return cached_response
+            
+            with llm_gateway.wait_limit(self.llm_max_wait):
+                response = await llm_gateway.achat_completion(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                )
             
             assistant_response = response.choices[0].message.content.strip()
+            if cache_key:
+                await sync_to_async(response_cache.set)(cache_key, assistant_response)
             return assistant_response
             
+        except LLMRateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generating chatbot response: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    async def astream_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        user: User,
+        conversation_summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Async variant of stream_response using the async Groq client."""
+        try:
+            messages, cache_key, cached_response = await sync_to_async(self._prepare_turn)(
+                user_message, conversation_history, user, conversation_summary
+            )
+            if cached_response is not None:
+                yield cached_response
+                return
+            
+            with llm_gateway.wait_limit(self.llm_max_wait):
+                stream = await llm_gateway.achat_completion(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                    stream=True,
+                )
+            
+            chunks = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+            
+            if cache_key:
+                await sync_to_async(response_cache.set)(cache_key, ''.join(chunks).strip())
+                    
+        except LLMRateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming chatbot response: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    LAST_MESSAGE_PREVIEW_LENGTH = 120
+    TITLE_MAX_LENGTH = 60
+    
+    @classmethod
+    def get_conversation_list_queryset(cls, user: User) -> QuerySet:
+        """
+        User's conversations, newest first, annotated for list views.
+        
+        Adds ``message_count`` and the last message's preview, role and
+        timestamp in the same query, so lists never load nested messages.
+        """
+        last_message = ChatMessage.objects.filter(conversation=OuterRef('pk')).order_by('-created_at')
+        return (
+            ChatConversation.objects.filter(user=user)
+            .only('id', 'title', 'created_at', 'updated_at')
+            .annotate(
+                message_count=Count('messages'),
+                last_message_preview=Substr(
+                    Subquery(last_message.values('content')[:1]), 1, cls.LAST_MESSAGE_PREVIEW_LENGTH
+                ),
+                last_message_role=Subquery(last_message.values('role')[:1]),
+                last_message_at=Subquery(last_message.values('created_at')[:1]),
+            )
+            .order_by('-updated_at')
+        )
+    
     def create_conversation(self, user: User, title: str = None) -> ChatConversation:
         """Create a new conversation."""
         return ChatConversation.objects.create(user=user, title=title)
@@ -323,11 +562,176 @@ IMPORTANT: Make your responses feel human and relatable. Use examples from every
             content=content
         )
     
-    def get_conversation_messages(self, conversation: ChatConversation) -> List[Dict[str, str]]:
-        """Get all messages in a conversation as a list of dicts."""
-        messages = ChatMessage.objects.filter(conversation=conversation).order_by('created_at')
-        return [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
+    @classmethod
+    def make_title(cls, user_message: str) -> str:
+        """Derive a conversation title from its first user message."""
+        first_line = user_message.strip().splitlines()[0] if user_message.strip() else ''
+        return Truncator(first_line).chars(cls.TITLE_MAX_LENGTH)
+    
+    def save_turn(
+        self,
+        conversation: ChatConversation,
+        user_message: str,
+        ai_response: str
+    ) -> Tuple[ChatMessage, ChatMessage]:
+        """
+        Persist a completed chat turn in one transaction.
+        
+        Both messages are written with a single ``bulk_create``. The
+        conversation gets exactly one write: an INSERT if it has not been
+        saved yet, otherwise an UPDATE of ``updated_at`` (and ``title`` if it
+        has none), which keeps the (user, -updated_at) ordering current.
+        
+        Returns:
+            Tuple of (user message, assistant message)
+        """
+        if not conversation.title:
+            conversation.title = self.make_title(user_message)
+        
+        with transaction.atomic():
+            if conversation._state.adding:
+                conversation.save()
+            else:
+                conversation.updated_at = timezone.now()
+                ChatConversation.objects.filter(pk=conversation.pk).update(
+                    updated_at=conversation.updated_at,
+                    title=conversation.title
+                )
+            
+            user_msg, assistant_msg = ChatMessage.objects.bulk_create([
+                ChatMessage(conversation=conversation, role='user', content=user_message),
+                ChatMessage(conversation=conversation, role='assistant', content=ai_response),
+            ])
+        
+        return user_msg, assistant_msg
+    
+    def get_conversation_messages(
+        self,
+        conversation: ChatConversation,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Get messages in a conversation as a list of dicts, oldest first.
+        
+        With ``limit`` only the most recent ``limit`` messages are read, using a
+        bounded reverse-ordered query on the (conversation, created_at) index.
+        """
+        messages = ChatMessage.objects.filter(conversation=conversation)
+        if limit is None:
+            messages = messages.order_by('created_at').values('role', 'content')
+            return [{"role": msg['role'], "content": msg['content']} for msg in messages]
+        
+        recent = messages.order_by('-created_at').values('role', 'content')[:limit]
+        return [{"role": msg['role'], "content": msg['content']} for msg in reversed(list(recent))]
+    
+    def history_limit(self, message_count: int, summary_message_count: int) -> int:
+        """
+        Number of recent messages to send verbatim: the history window, plus any
+        older messages that are not covered by the summary yet.
+        """
+        unsummarized = message_count - summary_message_count
+        return max(self.HISTORY_WINDOW, min(unsummarized, self.MAX_HISTORY_MESSAGES))
+    
+    def get_history(self, conversation: ChatConversation) -> List[Dict[str, str]]:
+        """Messages of the conversation that the summary does not cover, oldest first."""
+        if conversation._state.adding:
+            return []
+        count = ChatMessage.objects.filter(conversation=conversation).count()
+        return self.get_conversation_messages(
+            conversation, limit=self.history_limit(count, conversation.summary_message_count)
+        )
+    
+    def needs_summary_refresh(self, conversation: ChatConversation) -> bool:
+        """Whether enough turns have scrolled out of the history window to re-summarize."""
+        total = ChatMessage.objects.filter(conversation=conversation).count()
+        unsummarized = total - self.HISTORY_WINDOW - conversation.summary_message_count
+        return unsummarized >= self.SUMMARY_REFRESH_INTERVAL
+    
+    def schedule_summary_refresh(self, conversation: ChatConversation) -> None:
+        """Queue a rolling summary refresh for the conversation if it is due."""
+        try:
+            if self.needs_summary_refresh(conversation):
+                from ..tasks import summarize_chat_conversation
+                summarize_chat_conversation.delay(str(conversation.id))
+        except Exception as e:
+            logger.warning(f"Failed to schedule conversation summary refresh: {str(e)}")
+    
+    def summarize_conversation(self, conversation: ChatConversation) -> bool:
+        """
+        Fold messages that have left the history window into the conversation summary.
+        
+        Only messages not yet covered by the summary are sent to the LLM,
+        together with the previous summary, so each refresh is bounded.
+        
+        Returns:
+            True if the summary was updated
+        """
+        messages = ChatMessage.objects.filter(conversation=conversation)
+        cutoff = messages.count() - self.HISTORY_WINDOW
+        if cutoff <= conversation.summary_message_count:
+            return False
+        
+        new_messages = messages.order_by('created_at').values('role', 'content')[
+            conversation.summary_message_count:cutoff
         ]
-
+        transcript = "\n".join(
+            f"{'Devotee' if msg['role'] == 'user' else 'Krishna'}: {msg['content']}"
+            for msg in new_messages
+        )
+        
+        prompt = ""
+        if conversation.summary:
+            prompt += f"Existing summary:\n{conversation.summary}\n\n"
+        prompt += f"New conversation turns:\n{transcript}\n\n"
+        prompt += (
+            "Write an updated summary of the whole conversation so far in at most 150 words. "
+            "Keep the devotee's situation, concerns, goals and any advice or verses already given."
+        )
+        
+        response = llm_gateway.chat_completion(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You summarize spiritual guidance conversations concisely and faithfully."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=self.SUMMARY_MAX_TOKENS,
+        )
+        
+        conversation.summary = response.choices[0].message.content.strip()
+        conversation.summary_message_count = cutoff
+        # Summary refreshes must not bump updated_at (conversation list ordering)
+        conversation.save(update_fields=['summary', 'summary_message_count'])
+        return True
+    
+    async def asave_turn(
+        self,
+        conversation: ChatConversation,
+        user_message: str,
+        ai_response: str
+    ) -> Tuple[ChatMessage, ChatMessage]:
+        """Persist a completed chat turn in one transaction (async)."""
+        return await sync_to_async(self.save_turn)(conversation, user_message, ai_response)
+    
+    async def aget_history(self, conversation: ChatConversation) -> List[Dict[str, str]]:
+        """Messages of the conversation that the summary does not cover, oldest first (async)."""
+        if conversation._state.adding:
+            return []
+        count = await ChatMessage.objects.filter(conversation=conversation).acount()
+        return await self.aget_conversation_messages(
+            conversation, limit=self.history_limit(count, conversation.summary_message_count)
+        )
+    
+    async def aget_conversation_messages(
+        self,
+        conversation: ChatConversation,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """Get messages in a conversation as a list of dicts, oldest first (async)."""
+        messages = ChatMessage.objects.filter(conversation=conversation)
+        if limit is None:
+            messages = messages.order_by('created_at').values('role', 'content')
+            return [{"role": msg['role'], "content": msg['content']} async for msg in messages]
+        
+        recent = messages.order_by('-created_at').values('role', 'content')[:limit]
+        return [{"role": msg['role'], "content": msg['content']} for msg in reversed([m async for m in recent])]
@@ -13,6 +13,8 @@ from django.conf import settings
 from django.utils import timezone
 from apps.sanatan_app.models import ShlokaExplanation, Shloka
 from apps.sanatan_app.groq_service import GroqService
+from apps.sanatan_app.services.llm_gateway import llm_gateway
+from apps.sanatan_app.services.llm_response_cache import llm_response_cache
 from apps.sanatan_app.services.quality_checker import QualityCheckerService
 import logging
 import copy
@@ -442,22 +444,29 @@ class ImprovementService:
                     quality_result  # Pass quality feedback
                 )
                 
-                # Call Groq API to get improved content
+                messages = [
+                    {"role": "system", "content": self._get_improvement_system_message()},
+                    {"role": "user", "content": improvement_prompt}
+                ]
                 # CRITICAL: Use lower temperature (0.2) for maximum accuracy with religious content
-                response = self.groq_service.client.chat.completions.create(
-                    model=self.groq_service.model,
-                    messages=[
-                        {"role": "system", "content": self._get_improvement_system_message()},
-                        {"role": "user", "content": improvement_prompt}
-                    ],
-                    temperature=0.2,  # Lower temperature for maximum accuracy (critical for religious content)
-                    max_tokens=2000,
-                )
+                temperature = 0.2
+                max_tokens = 2000
+                cache_key = llm_response_cache.make_key(self.groq_service.model, messages, temperature, max_tokens)
+                improved_content = llm_response_cache.get(cache_key)
                 
-                improved_content = response.choices[0].message.content.strip()
+                if improved_content is None:
+                    # Call Groq API to get improved content
+                    response = llm_gateway.chat_completion(
+                        model=self.groq_service.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
+                    improved_content = response.choices[0].message.content.strip()
                 
                 # Parse and update the section
                 if self._update_section(explanation, section_name, improved_content):
+                    llm_response_cache.set(cache_key, self.groq_service.model, improved_content)
                     improved_sections.append(section_name)
                     logger.info(f"Successfully improved section '{section_name}'")
                 else:
@@ -867,7 +876,7 @@ Just the transliteration, one line per line of Sanskrit text.
 
 Transliteration:"""
 
-            response = self.groq_service.client.chat.completions.create(
+            response = llm_gateway.chat_completion(
                 model=self.groq_service.model,
                 messages=[
                     {
@@ -947,7 +956,7 @@ Transliteration:"""
             
             prompt = "\n".join(prompt_parts)
 
-            response = self.groq_service.client.chat.completions.create(
+            response = llm_gateway.chat_completion(
                 model=self.groq_service.model,
                 messages=[
                     {
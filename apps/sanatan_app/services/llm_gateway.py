@@ -0,0 +1,340 @@
+"""
+Single gateway for every Groq chat completion call.
+
+Each process shares one pooled Groq client (and one async client per event
+loop), so connections are reused across requests and tasks instead of a new
+client per service instance. Before a call is sent, the gateway takes one
+request and the estimated prompt tokens from per-minute buckets in the Django
+cache (shared Redis), so the RPM/TPM quota is tracked across every web and
+Celery worker. The token charge is settled against the reported usage once
+the response arrives. Calls wait for quota for up to LLM_RATE_LIMIT_MAX_WAIT;
+request paths cap that with ``wait_limit()`` so a user is answered with a
+429 instead of a long stall. Rate limited,
+overloaded or unreachable calls are retried with exponential backoff,
+honouring the ``retry-after`` header; a 429 also pauses every worker until
+the quota frees up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+import weakref
+
+import groq
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .token_budget import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: quota (429), Groq overloaded (5xx), network and timeouts
+_RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+
+# Cap on the quota wait set by ``LLMGateway.wait_limit`` for the current thread or task
+_max_wait: ContextVar[Optional[float]] = ContextVar('llm_max_wait', default=None)
+
+
+class LLMRateLimitExceeded(Exception):
+    """Raised when the shared Groq quota does not free up within the allowed wait."""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__('The LLM request quota is exhausted. Please try again shortly.')
+
+
+class LLMGateway:
+    """
+    Pooled Groq clients, a cross-process request/token quota and retries.
+
+    Quota buckets are keyed by the current minute and hold the requests and
+    tokens spent in it; a call that would overflow either bucket waits for the
+    next minute. Counters expire on their own, like the in-flight slots of
+    ``LLMConcurrencyLimiter``.
+    """
+
+    WINDOW_SECONDS = 60
+    REQUESTS_KEY_PREFIX = 'llm_rate:requests'
+    TOKENS_KEY_PREFIX = 'llm_rate:tokens'
+    COOLDOWN_KEY = 'llm_rate:cooldown_until'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> groq.Groq:
+        """The process-wide Groq client, recreated after a fork so pools are never shared."""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    self._client = groq.Groq(
+                        api_key=settings.GROQ_API_KEY,
+                        max_retries=0,  # Retries are done here, against the shared quota
+                        http_client=groq.DefaultHttpxClient(
+                            limits=self._http_limits(), timeout=settings.LLM_HTTP_TIMEOUT
+                        ),
+                    )
+                    self._client_pid = os.getpid()
+        return self._client
+
+    @property
+    def async_client(self) -> groq.AsyncGroq:
+        """The async Groq client of the running event loop (pooled connections are bound to a loop)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = groq.AsyncGroq(
+                    api_key=settings.GROQ_API_KEY,
+                    max_retries=0,
+                    http_client=groq.DefaultAsyncHttpxClient(
+                        limits=self._http_limits(), timeout=settings.LLM_HTTP_TIMEOUT
+                    ),
+                )
+                self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _http_limits() -> httpx.Limits:
+        max_connections = settings.LLM_HTTP_MAX_CONNECTIONS
+        return httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+
+    @contextmanager
+    def wait_limit(self, seconds: Optional[float]) -> Iterator[None]:
+        """
+        Wait at most ``seconds`` for quota in calls made inside the block, then
+        raise ``LLMRateLimitExceeded``. None keeps the current limit.
+        """
+        if seconds is None:
+            yield
+            return
+        token = _max_wait.set(seconds)
+        try:
+            yield
+        finally:
+            _max_wait.reset(token)
+
+    @staticmethod
+    def max_wait() -> float:
+        """Seconds a call may wait for quota: the ``wait_limit`` cap or LLM_RATE_LIMIT_MAX_WAIT."""
+        seconds = _max_wait.get()
+        return settings.LLM_RATE_LIMIT_MAX_WAIT if seconds is None else seconds
+
+    def chat_completion(self, messages: Sequence[Dict[str, str]], **kwargs):
+        """
+        ``client.chat.completions.create`` through the shared quota, with retries.
+
+        With ``stream=True`` the stream is returned as is; only opening it is retried.
+
+        Raises:
+            LLMRateLimitExceeded: If the quota does not free up in time, or
+                Groq rate limits the call for longer than ``max_wait()``
+            groq.APIError: If the call still fails after LLM_MAX_RETRIES retries
+        """
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            reservation = self.reserve(messages, kwargs)
+            try:
+                response = self.client.chat.completions.create(messages=messages, **kwargs)
+            except _RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                if isinstance(e, groq.RateLimitError) and delay > self.max_wait():
+                    raise LLMRateLimitExceeded(math.ceil(delay)) from e
+                time.sleep(delay)
+                continue
+            if not kwargs.get('stream'):
+                self.settle(reservation, response)
+            return response
+
+    async def achat_completion(self, messages: Sequence[Dict[str, str]], **kwargs):
+        """Async variant of ``chat_completion`` on the event loop's client."""
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            reservation = await self.areserve(messages, kwargs)
+            try:
+                response = await self.async_client.chat.completions.create(messages=messages, **kwargs)
+            except _RETRYABLE_ERRORS as e:
+                delay = await sync_to_async(self._retry_delay)(e, attempt)
+                if delay is None:
+                    raise
+                if isinstance(e, groq.RateLimitError) and delay > self.max_wait():
+                    raise LLMRateLimitExceeded(math.ceil(delay)) from e
+                await asyncio.sleep(delay)
+                continue
+            if not kwargs.get('stream'):
+                await sync_to_async(self.settle)(reservation, response)
+            return response
+
+    def reserve(self, messages: Sequence[Dict[str, str]], kwargs: Dict) -> Tuple[int, int]:
+        """
+        Take one request and the call's estimated tokens from the shared quota.
+
+        Blocks until both fit, for at most ``max_wait()`` seconds.
+
+        Returns:
+            (window, tokens) charged, to be passed to ``settle``
+        """
+        tokens = self.estimate_cost(messages, kwargs)
+        deadline = time.monotonic() + self.max_wait()
+        while True:
+            reservation, wait = self._try_reserve(tokens)
+            if reservation is not None:
+                return reservation
+            if time.monotonic() + wait > deadline:
+                raise LLMRateLimitExceeded(math.ceil(wait))
+            logger.info(f"LLM quota exhausted, waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    async def areserve(self, messages: Sequence[Dict[str, str]], kwargs: Dict) -> Tuple[int, int]:
+        """Async variant of ``reserve`` that waits without blocking the event loop."""
+        tokens = self.estimate_cost(messages, kwargs)
+        deadline = time.monotonic() + self.max_wait()
+        while True:
+            reservation, wait = await sync_to_async(self._try_reserve)(tokens)
+            if reservation is not None:
+                return reservation
+            if time.monotonic() + wait > deadline:
+                raise LLMRateLimitExceeded(math.ceil(wait))
+            logger.info(f"LLM quota exhausted, waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def estimate_cost(messages: Sequence[Dict[str, str]], kwargs: Dict) -> int:
+        """
+        Tokens charged before the call: the prompt estimate, plus the completion
+        allowance for streams (they report no usage to settle against).
+        """
+        tokens = estimate_messages_tokens(messages)
+        if kwargs.get('stream'):
+            tokens += kwargs.get('max_tokens') or 0
+        return tokens
+
+    def settle(self, reservation: Tuple[int, int], response) -> None:
+        """Correct the token charge of a reservation to the usage Groq reported."""
+        window, tokens = reservation
+        usage = getattr(response, 'usage', None)
+        total_tokens = getattr(usage, 'total_tokens', None)
+        if not isinstance(total_tokens, int) or total_tokens == tokens or settings.LLM_RATE_LIMIT_TPM <= 0:
+            return
+        try:
+            cache.incr(self._tokens_key(window), total_tokens - tokens)
+        except ValueError:
+            # The window has already expired
+            pass
+
+    def requests_used(self) -> int:
+        """Requests charged to the current window."""
+        return cache.get(self._requests_key(self._window()), 0)
+
+    def tokens_used(self) -> int:
+        """Tokens charged to the current window."""
+        return cache.get(self._tokens_key(self._window()), 0)
+
+    def _try_reserve(self, tokens: int) -> Tuple[Optional[Tuple[int, int]], float]:
+        """Charge the current window, or return how long to wait before trying again."""
+        now = time.time()
+        cooldown_until = cache.get(self.COOLDOWN_KEY)
+        if cooldown_until and cooldown_until > now:
+            return None, cooldown_until - now
+
+        window = self._window(now)
+        # A call larger than the whole token quota still goes through in an otherwise unused minute
+        tpm = settings.LLM_RATE_LIMIT_TPM
+        tokens = min(tokens, tpm) if tpm > 0 else tokens
+        charged = []
+        for key, limit, cost in (
+            (self._requests_key(window), settings.LLM_RATE_LIMIT_RPM, 1),
+            (self._tokens_key(window), tpm, tokens),
+        ):
+            if limit <= 0 or cost <= 0:
+                continue
+            if self._increment(key, cost) > limit:
+                self._decrement(key, cost)
+                for charged_key, charged_cost in charged:
+                    self._decrement(charged_key, charged_cost)
+                return None, (window + 1) * self.WINDOW_SECONDS - now
+            charged.append((key, cost))
+        return (window, tokens), 0.0
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying ``error``, or None once retries are used up."""
+        if attempt >= settings.LLM_MAX_RETRIES:
+            logger.error(f"LLM call failed after {attempt + 1} attempts: {error}")
+            return None
+
+        retry_after = self._retry_after(error)
+        if retry_after is None:
+            backoff = settings.LLM_RETRY_BASE_DELAY * 2 ** attempt
+            delay = min(backoff, settings.LLM_RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+        else:
+            delay = min(retry_after, settings.LLM_RETRY_MAX_DELAY)
+
+        if isinstance(error, groq.RateLimitError):
+            # Groq's view of the quota wins: hold back every worker, not just this one
+            cache.set(self.COOLDOWN_KEY, time.time() + delay, timeout=math.ceil(delay) + 1)
+        logger.warning(
+            f"LLM call failed ({error.__class__.__name__}), retrying in {delay:.1f}s "
+            f"(attempt {attempt + 1}/{settings.LLM_MAX_RETRIES})"
+        )
+        return delay
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """The server's ``retry-after-ms``/``retry-after`` hint in seconds, if it sent one."""
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return max(float(headers['retry-after-ms']) / 1000, 0.0)
+            if headers.get('retry-after'):
+                return max(float(headers['retry-after']), 0.0)
+        except ValueError:
+            # HTTP-date form, not used by Groq
+            pass
+        return None
+
+    def _window(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.WINDOW_SECONDS)
+
+    def _requests_key(self, window: int) -> str:
+        return f"{self.REQUESTS_KEY_PREFIX}:{window}"
+
+    def _tokens_key(self, window: int) -> str:
+        return f"{self.TOKENS_KEY_PREFIX}:{window}"
+
+    def _increment(self, key: str, delta: int) -> int:
+        timeout = 2 * self.WINDOW_SECONDS
+        if cache.add(key, delta, timeout=timeout):
+            return delta
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, delta, timeout=timeout)
+            return delta
+
+    @staticmethod
+    def _decrement(key: str, delta: int) -> None:
+        try:
+            cache.decr(key, delta)
+        except ValueError:
+            # Counter already expired
+            pass
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,120 @@
+"""
+Concurrency limiter for LLM-backed request paths.
+
+In-flight LLM calls are held as expiring leases per user and globally in the
+shared Django cache (Redis), so one user cannot occupy every worker or the
+whole Groq quota. When a limit is reached the caller gets
+``LLMConcurrencyLimitExceeded`` immediately and the view answers with a 429
+and a ``Retry-After`` hint instead of queueing behind the worker timeout.
+"""
+from typing import List, Optional, Tuple
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMConcurrencyLimitExceeded(Exception):
+    """Raised when an LLM slot cannot be acquired."""
+
+    def __init__(self, scope: str, retry_after: int):
+        self.scope = scope
+        self.retry_after = retry_after
+        if scope == 'user':
+            message = 'You already have a response being generated. Please wait for it to finish.'
+        else:
+            message = 'The assistant is busy right now. Please try again shortly.'
+        super().__init__(message)
+
+
+class LLMSlot:
+    """An acquired in-flight slot; release it once the LLM call has finished."""
+
+    def __init__(self, limiter: 'LLMConcurrencyLimiter', leases: List[Tuple[str, str]]):
+        self._limiter = limiter
+        self._leases = leases
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            for key, token in self._leases:
+                self._limiter.release_lease(key, token)
+
+    def __enter__(self) -> 'LLMSlot':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class LLMConcurrencyLimiter:
+    """
+    Per-user and global caps on in-flight LLM calls.
+
+    Every in-flight call holds one lease per scope: a cache key per slot
+    number (``llm_inflight:global:3``) claimed with an atomic ``cache.add``.
+    A lease expires on its own after LLM_SLOT_TIMEOUT and is never extended,
+    so a slot leaked by a killed worker always comes back, however busy the
+    other slots are.
+    """
+
+    GLOBAL_KEY = 'llm_inflight:global'
+    USER_KEY_PREFIX = 'llm_inflight:user'
+
+    def user_key(self, user_id) -> str:
+        return f"{self.USER_KEY_PREFIX}:{user_id}"
+
+    def acquire(self, user_id=None) -> LLMSlot:
+        """
+        Claim a global slot and, if ``user_id`` is given, a per-user slot.
+
+        Raises:
+            LLMConcurrencyLimitExceeded: If either limit is already reached
+        """
+        global_lease = self._claim(self.GLOBAL_KEY, settings.LLM_MAX_CONCURRENT_GLOBAL)
+        if global_lease is None:
+            logger.warning("Global LLM concurrency limit reached")
+            raise LLMConcurrencyLimitExceeded('global', settings.LLM_RETRY_AFTER_SECONDS)
+        leases = [global_lease]
+
+        if user_id is not None:
+            user_lease = self._claim(self.user_key(user_id), settings.LLM_MAX_CONCURRENT_PER_USER)
+            if user_lease is None:
+                self.release_lease(*global_lease)
+                logger.info(f"LLM concurrency limit reached for user {user_id}")
+                raise LLMConcurrencyLimitExceeded('user', settings.LLM_RETRY_AFTER_SECONDS)
+            leases.append(user_lease)
+
+        return LLMSlot(self, leases)
+
+    def release_lease(self, key: str, token: str) -> None:
+        """Free a slot, unless its lease expired and the slot was claimed again since."""
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    def in_flight(self, user_id=None) -> int:
+        """Current in-flight count for a user, or globally if no user is given."""
+        if user_id is not None:
+            key, limit = self.user_key(user_id), settings.LLM_MAX_CONCURRENT_PER_USER
+        else:
+            key, limit = self.GLOBAL_KEY, settings.LLM_MAX_CONCURRENT_GLOBAL
+        return len(cache.get_many(self._slot_keys(key, limit)))
+
+    @staticmethod
+    def _slot_keys(key: str, limit: int) -> List[str]:
+        return [f"{key}:{slot}" for slot in range(limit)]
+
+    def _claim(self, key: str, limit: int) -> Optional[Tuple[str, str]]:
+        """Take the first free slot of ``key``, or return None if all ``limit`` are held."""
+        token = uuid.uuid4().hex
+        for slot_key in self._slot_keys(key, limit):
+            if cache.add(slot_key, token, timeout=settings.LLM_SLOT_TIMEOUT):
+                return slot_key, token
+        return None
+
+
+llm_limiter = LLMConcurrencyLimiter()
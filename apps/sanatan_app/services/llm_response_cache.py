@@ -0,0 +1,179 @@
+"""
+Persistent cache of LLM completions for the content pipeline.
+
+Explanation generation, quality checks and section improvements send the same
+prompts again whenever a command or batch is re-run. Their responses are
+stored in the database under a hash of everything that determines the
+completion (model, messages, temperature, max_tokens), so a deterministic
+re-run is answered without calling Groq. Once the stored responses exceed
+LLM_RESPONSE_CACHE_MAX_BYTES, the least recently used ones are evicted.
+
+Callers store a response only after it parsed, so a malformed completion is
+never replayed. ``bypass()`` skips the cache (reads and writes) for the
+current thread; LLM_RESPONSE_CACHE_ENABLED turns it off everywhere.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import LLMResponseCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Evict down to this fraction of the size bound, so eviction runs once per batch of writes.
+# Writes are tallied in a running total and the table is only summed once that total
+# crosses the bound.
+EVICTION_LOW_WATERMARK = 0.9
+
+
+class LLMResponseCache:
+    """Content-addressed store of LLM responses with size-based LRU eviction."""
+
+    KEY_PREFIX = 'llm_response_cache'
+    HITS_KEY = f'{KEY_PREFIX}:hits'
+    MISSES_KEY = f'{KEY_PREFIX}:misses'
+    BYTES_KEY = f'{KEY_PREFIX}:bytes'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def is_enabled(self) -> bool:
+        return settings.LLM_RESPONSE_CACHE_ENABLED and not self.is_bypassed()
+
+    def is_bypassed(self) -> bool:
+        """Whether the current thread is inside ``bypass()``."""
+        return getattr(self._local, 'bypass', False)
+
+    @contextmanager
+    def bypass(self) -> Iterator[None]:
+        """Call the LLM for every request made by this thread inside the block."""
+        previous = self.is_bypassed()
+        self._local.bypass = True
+        try:
+            yield
+        finally:
+            self._local.bypass = previous
+
+    @staticmethod
+    def make_key(model: str, messages: Sequence[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        """Hash of the request parameters that determine the completion."""
+        payload = json.dumps(
+            [model, list(messages), temperature, max_tokens],
+            sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None on a miss or while bypassed."""
+        if not self.is_enabled():
+            return None
+        try:
+            response = LLMResponseCacheEntry.objects.filter(key=key).values_list('response', flat=True).first()
+            if response is None:
+                self._increment(self.MISSES_KEY)
+                return None
+            LLMResponseCacheEntry.objects.filter(key=key).update(
+                hit_count=F('hit_count') + 1, last_used_at=timezone.now()
+            )
+            self._increment(self.HITS_KEY)
+            return response
+        except Exception as e:
+            logger.warning(f"LLM response cache read failed: {str(e)}")
+            return None
+
+    def set(self, key: str, model: str, response: str) -> None:
+        """Store a response that the caller has successfully parsed."""
+        if not self.is_enabled() or not response:
+            return
+        size_bytes = len(response.encode('utf-8'))
+        try:
+            LLMResponseCacheEntry.objects.update_or_create(
+                key=key,
+                defaults={
+                    'model': model,
+                    'response': response,
+                    'size_bytes': size_bytes,
+                    'last_used_at': timezone.now(),
+                },
+            )
+            if self._add_bytes(size_bytes) > settings.LLM_RESPONSE_CACHE_MAX_BYTES:
+                self.evict()
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {str(e)}")
+
+    def evict(self) -> int:
+        """Delete least recently used entries once the cache exceeds its size bound."""
+        max_bytes = settings.LLM_RESPONSE_CACHE_MAX_BYTES
+        total = self.total_bytes()
+        if total <= max_bytes:
+            cache.set(self.BYTES_KEY, total, timeout=None)
+            return 0
+
+        to_free = total - int(max_bytes * EVICTION_LOW_WATERMARK)
+        keys = []
+        for key, size_bytes in LLMResponseCacheEntry.objects.order_by('last_used_at').values_list('key', 'size_bytes').iterator():
+            if to_free <= 0:
+                break
+            keys.append(key)
+            to_free -= size_bytes
+            total -= size_bytes
+        LLMResponseCacheEntry.objects.filter(key__in=keys).delete()
+        cache.set(self.BYTES_KEY, total, timeout=None)
+        logger.info(f"Evicted {len(keys)} LLM responses from the cache")
+        return len(keys)
+
+    @staticmethod
+    def total_bytes() -> int:
+        return LLMResponseCacheEntry.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+
+    def purge(self) -> None:
+        """Delete every cached response and reset the hit/miss counters."""
+        LLMResponseCacheEntry.objects.all().delete()
+        cache.delete_many([self.HITS_KEY, self.MISSES_KEY, self.BYTES_KEY])
+
+    def stats(self) -> Dict:
+        """Size of the cache and hit/miss counters since the last purge."""
+        hits = cache.get(self.HITS_KEY, 0)
+        misses = cache.get(self.MISSES_KEY, 0)
+        total = hits + misses
+        return {
+            'enabled': settings.LLM_RESPONSE_CACHE_ENABLED,
+            'entries': LLMResponseCacheEntry.objects.count(),
+            'bytes': self.total_bytes(),
+            'max_bytes': settings.LLM_RESPONSE_CACHE_MAX_BYTES,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+    def _add_bytes(self, size_bytes: int) -> int:
+        """Add a write to the running total, seeding it from the table when it is missing.
+
+        Overwrites are counted again, so the total only ever overestimates; the
+        exact size is restored whenever ``evict()`` sums the table.
+        """
+        try:
+            return cache.incr(self.BYTES_KEY, size_bytes)
+        except ValueError:
+            total = self.total_bytes()
+            cache.set(self.BYTES_KEY, total, timeout=None)
+            return total
+
+    @staticmethod
+    def _increment(key: str) -> None:
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+llm_response_cache = LLMResponseCache()
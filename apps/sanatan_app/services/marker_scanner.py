@@ -0,0 +1,106 @@
+"""
+Single-pass scanner for chapter and verse markers in book text.
+
+Every marker kind the PDF extraction code looks for is one branch of a single
+precompiled alternation regex, so a caller that needs headings, verse markers
+and "2.47"-style references walks the text once instead of once per pattern.
+"""
+from typing import Iterable, Iterator, NamedTuple, Optional
+import re
+
+CHAPTER_HEADING = 'chapter_heading'  # "Chapter 2" / "अध्याय २" at the start of a line
+VERSE_HEADING = 'verse_heading'      # "VERSE 12", "Text 2.12", "TEXTS 16-18", "श्लोक १२" at the start of a line
+NUMBERED_LINE = 'numbered_line'      # "12. " at the start of a line
+CHAPTER_MENTION = 'chapter_mention'  # "chapter 2" anywhere else
+VERSE_MENTION = 'verse_mention'      # "verse 12" anywhere else
+REFERENCE = 'reference'              # "2.12"
+
+# Every marker starts at a line break, a digit or a C/V, so the pattern opens with
+# that character class and the regex engine skips ahead to candidates in C instead
+# of trying each branch at every position. ``scan_markers`` prepends a line break
+# so headings on the first line are found too. The empty named group closing each
+# branch is the marker kind, read back through ``match.lastgroup``. Line-start
+# headings are tried first, so they win over a mention at the same position.
+# Without the leading class and the lookbehinds (plain ``^``/``\b`` branches) the
+# scan is 4-7x slower than searching for each pattern separately.
+_MARKER_RE = re.compile(r"""
+    [\n\dCcVv]
+    (?:
+        (?<=\n)[ \t]*
+        (?:
+            (?:(?i:chapter)|अध्याय)[ \t]+(?P<heading_chapter>\d{1,2})\b(?P<chapter_heading>)
+          | (?i:verses?|texts?|श्लोक)[ \t]+
+                (?:(?P<verse_chapter>\d{1,2})\.)?(?P<heading_verse>\d{1,3})
+                (?:[ \t]*[-–][ \t]*(?P<heading_verse_end>\d{1,3}))?\b(?P<verse_heading>)
+          | (?P<line_verse>\d{1,3})\.[ \t]+(?P<numbered_line>)
+        )
+      | (?i:hapter(?<=chapter))(?<!\w.{7})[ \t]+(?P<mention_chapter>\d{1,2})\b(?P<chapter_mention>)
+      | (?i:erse(?<=verse))(?<!\w.{5})[ \t]+(?P<mention_verse>\d{1,3})\b(?P<verse_mention>)
+      | (?<=\d)(?<![\d.]\d)(?P<reference_chapter>\d?)\.(?P<reference_verse>\d{1,3})(?!\d)(?P<reference>)
+    )
+""", re.VERBOSE)
+
+_LINE_START_KINDS = frozenset({CHAPTER_HEADING, VERSE_HEADING, NUMBERED_LINE})
+_CHAPTER_KINDS = frozenset({CHAPTER_HEADING, CHAPTER_MENTION})
+_VERSE_KINDS = frozenset({VERSE_HEADING, VERSE_MENTION})
+
+
+class Marker(NamedTuple):
+    """A chapter or verse marker and its span in the scanned text."""
+    kind: str
+    chapter: Optional[int]
+    verse: Optional[int]
+    verse_end: Optional[int]
+    start: int
+    end: int
+
+    @property
+    def is_chapter(self) -> bool:
+        return self.kind in _CHAPTER_KINDS
+
+    @property
+    def is_verse(self) -> bool:
+        return self.kind in _VERSE_KINDS
+
+
+def _number(value: Optional[str]) -> Optional[int]:
+    # int() also parses Devanagari digits
+    return int(value) if value else None
+
+
+def scan_markers(text: str) -> Iterator[Marker]:
+    """Yield every chapter/verse marker in ``text`` in order of position, in one pass."""
+    scanned = '\n' + (text or '')
+    for match in _MARKER_RE.finditer(scanned):
+        kind = match.lastgroup
+        group = match.group
+        # Offsets into ``text``: headings start at their line (after the consumed
+        # line break), everything else at the consumed first character
+        start = match.start() if kind in _LINE_START_KINDS else match.start() - 1
+        end = match.end() - 1
+        if kind == CHAPTER_HEADING:
+            chapter, verse, verse_end = _number(group('heading_chapter')), None, None
+        elif kind == VERSE_HEADING:
+            chapter = _number(group('verse_chapter'))
+            verse = _number(group('heading_verse'))
+            verse_end = _number(group('heading_verse_end')) or verse
+        elif kind == NUMBERED_LINE:
+            chapter, verse, verse_end = None, _number(group('line_verse')), None
+        elif kind == CHAPTER_MENTION:
+            chapter, verse, verse_end = _number(group('mention_chapter')), None, None
+        elif kind == VERSE_MENTION:
+            chapter, verse, verse_end = None, _number(group('mention_verse')), None
+        else:
+            # The reference's first digit is the consumed lead character
+            chapter = int(scanned[match.start()] + group('reference_chapter'))
+            verse, verse_end = _number(group('reference_verse')), None
+        yield Marker(kind, chapter, verse, verse_end, start, end)
+
+
+def first_chapter_mentioned(markers: Iterable[Marker]) -> Optional[int]:
+    """Chapter number of the first chapter heading or mention, if any."""
+    for marker in markers:
+        if marker.is_chapter:
+            return marker.chapter
+    return None
+
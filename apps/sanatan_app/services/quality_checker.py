@@ -13,6 +13,8 @@ from django.conf import settings
 from django.utils import timezone
 from apps.sanatan_app.models import ShlokaExplanation, Shloka
 from apps.sanatan_app.groq_service import GroqService
+from apps.sanatan_app.services.llm_gateway import llm_gateway
+from apps.sanatan_app.services.llm_response_cache import llm_response_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -39,6 +41,9 @@ class QualityCheckerService:
         'themes',
     ]
     
+    # Feedback of a criterion missing from the LLM evaluation
+    EVALUATION_PARSE_ERROR = "Could not parse evaluation"
+    
     def __init__(self):
         self.groq_service = GroqService()
     
@@ -224,22 +229,33 @@ class QualityCheckerService:
             # Build evaluation prompt
             prompt = self._build_evaluation_prompt(explanation, shloka)
             
-            # Call Groq API
+            messages = [
+                {"role": "system", "content": self._get_evaluation_system_message()},
+                {"role": "user", "content": prompt}
+            ]
             # CRITICAL: Use very low temperature (0.2) for consistent, accurate evaluation of religious content
-            response = self.groq_service.client.chat.completions.create(
-                model=self.groq_service.model,
-                messages=[
-                    {"role": "system", "content": self._get_evaluation_system_message()},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,  # Very low temperature for consistent, accurate evaluation
-                max_tokens=1500,
-            )
+            temperature = 0.2
+            max_tokens = 1500
+            cache_key = llm_response_cache.make_key(self.groq_service.model, messages, temperature, max_tokens)
+            response_text = llm_response_cache.get(cache_key)
             
-            response_text = response.choices[0].message.content.strip()
+            if response_text is None:
+                # Call Groq API
+                response = llm_gateway.chat_completion(
+                    model=self.groq_service.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+                response_text = response.choices[0].message.content.strip()
             
             # Parse LLM response
-            return self._parse_llm_evaluation(response_text)
+            evaluation = self._parse_llm_evaluation(response_text)
+            if self.EVALUATION_PARSE_ERROR not in (
+                evaluation['clarity_feedback'], evaluation['accuracy_feedback'], evaluation['relevance_feedback']
+            ):
+                llm_response_cache.set(cache_key, self.groq_service.model, response_text)
+            return evaluation
             
         except Exception as e:
             logger.error(f"Error in LLM quality check: {str(e)}")
@@ -334,9 +350,9 @@ Provide specific, constructive feedback that identifies any issues."""
         clarity_score = self.CLARITY_WEIGHT * 0.5
         accuracy_score = self.ACCURACY_WEIGHT * 0.5
         relevance_score = self.RELEVANCE_WEIGHT * 0.5
-        clarity_feedback = "Could not parse evaluation"
-        accuracy_feedback = "Could not parse evaluation"
-        relevance_feedback = "Could not parse evaluation"
+        clarity_feedback = self.EVALUATION_PARSE_ERROR
+        accuracy_feedback = self.EVALUATION_PARSE_ERROR
+        relevance_feedback = self.EVALUATION_PARSE_ERROR
         
         try:
             # Extract clarity
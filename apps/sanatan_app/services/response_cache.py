@@ -0,0 +1,108 @@
+"""
+Response cache for repeated first-turn chatbot questions.
+
+Answers are keyed by the normalized question and a hash of the system
+prompt (persona, the user's reading context and the retrieved shlokas), and
+stored in the Django cache with a TTL. Normalization only drops case,
+punctuation and extra whitespace, so negations and word order still tell
+questions apart. Purging bumps a version number instead of deleting keys,
+so it is O(1) on any cache backend.
+"""
+from typing import Dict, Optional
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_APOSTROPHE_RE = re.compile(r"['’]")
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+class ChatResponseCache:
+    """Cache of chatbot answers for first-turn questions."""
+
+    KEY_PREFIX = 'chat_response_cache'
+    VERSION_KEY = f'{KEY_PREFIX}:version'
+    HITS_KEY = f'{KEY_PREFIX}:hits'
+    MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.CHAT_RESPONSE_CACHE_ENABLED
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace, keeping every word in order."""
+        text = _APOSTROPHE_RE.sub('', question.lower())
+        return ' '.join(_PUNCTUATION_RE.sub(' ', text).split())
+
+    def _version(self) -> int:
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            cache.add(self.VERSION_KEY, 1, timeout=None)
+            version = cache.get(self.VERSION_KEY, 1)
+        return version
+
+    def make_key(self, question: str, system_prompt: str, model: str) -> Optional[str]:
+        """Build the cache key, or None if caching is disabled or the question has no words."""
+        if not self.is_enabled():
+            return None
+
+        normalized = self.normalize_question(question)
+        if not normalized:
+            return None
+
+        prompt_digest = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+        digest = hashlib.sha256(f"{model}|{normalized}|{prompt_digest}".encode('utf-8')).hexdigest()
+        return f"{self.KEY_PREFIX}:v{self._version()}:{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer and record a hit or miss."""
+        try:
+            response = cache.get(key)
+            self._increment(self.HITS_KEY if response is not None else self.MISSES_KEY)
+            return response
+        except Exception as e:
+            logger.warning(f"Chat response cache read failed: {str(e)}")
+            return None
+
+    def set(self, key: str, response: str) -> None:
+        try:
+            cache.set(key, response, timeout=settings.CHAT_RESPONSE_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Chat response cache write failed: {str(e)}")
+
+    def purge(self) -> None:
+        """Invalidate every cached answer and reset the hit/miss counters."""
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            cache.set(self.VERSION_KEY, 2, timeout=None)
+        cache.delete_many([self.HITS_KEY, self.MISSES_KEY])
+
+    def stats(self) -> Dict:
+        """Hit/miss counters since the last purge."""
+        hits = cache.get(self.HITS_KEY, 0)
+        misses = cache.get(self.MISSES_KEY, 0)
+        total = hits + misses
+        return {
+            'enabled': self.is_enabled(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+    @staticmethod
+    def _increment(key: str) -> None:
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+response_cache = ChatResponseCache()
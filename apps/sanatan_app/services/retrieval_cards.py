@@ -0,0 +1,79 @@
+"""
+Compact per-shloka "retrieval cards" for chatbot prompts.
+
+A card is a short digest of an explanation (teaching, core meaning, modern
+relevance, themes) trimmed to a token budget. Cards are stored on
+``ShlokaExplanation.retrieval_card`` and refreshed whenever the explanation is
+saved, so prompts no longer carry the full transliteration and explanations.
+"""
+from typing import List, Optional
+import re
+
+from .token_budget import CHARS_PER_TOKEN
+
+# Approximate prompt budget for a single card
+RETRIEVAL_CARD_MAX_TOKENS = 120
+
+# Explanation fields a card is built from
+CARD_SOURCE_FIELDS = frozenset({'summary', 'detailed_meaning', 'why_this_matters', 'themes'})
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _squash(text: Optional[str]) -> str:
+    return _WHITESPACE_RE.sub(' ', text or '').strip()
+
+
+def _trim_to_sentences(text: str, max_chars: int) -> str:
+    """Keep whole leading sentences that fit in ``max_chars`` (at least a cut first sentence)."""
+    if len(text) <= max_chars:
+        return text
+
+    kept = ''
+    for sentence in _SENTENCE_END_RE.split(text):
+        candidate = f"{kept} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        kept = candidate
+
+    if not kept:
+        kept = text[:max_chars].rsplit(' ', 1)[0].rstrip(',;:') + '…'
+    return kept
+
+
+def build_retrieval_card(explanation, max_tokens: int = RETRIEVAL_CARD_MAX_TOKENS) -> str:
+    """
+    Build the card text for an explanation.
+
+    Sections are added in priority order and each one only gets the budget
+    left over by the previous sections.
+
+    Args:
+        explanation: ShlokaExplanation (or any object with the same fields)
+        max_tokens: Approximate token budget for the whole card
+
+    Returns:
+        Card text, or an empty string if the explanation has no content
+    """
+    remaining = max_tokens * CHARS_PER_TOKEN
+    lines: List[str] = []
+
+    themes = explanation.themes or []
+    themes_str = ', '.join(str(theme) for theme in themes[:5]) if isinstance(themes, list) else str(themes)
+
+    sections = [
+        ('Teaching', _squash(explanation.summary)),
+        ('Meaning', _squash(explanation.detailed_meaning)),
+        ('Relevance', _squash(explanation.why_this_matters)),
+        ('Themes', _squash(themes_str)),
+    ]
+    for label, text in sections:
+        budget = remaining - len(label) - 2
+        if not text or budget < 40:
+            continue
+        line = f"{label}: {_trim_to_sentences(text, budget)}"
+        lines.append(line)
+        remaining -= len(line) + 1
+
+    return '\n'.join(lines)
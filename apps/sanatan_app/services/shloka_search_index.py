@@ -0,0 +1,313 @@
+"""
+In-memory BM25 search index over shloka explanations.
+
+The index is built once per worker process from the shloka catalog and kept
+up to date through model signals, so chatbot retrieval does not have to run
+multi-column ``icontains`` queries against the database on every message.
+Signals only reach the process that made the write, so each process also
+compares the catalog fingerprint with the one its index was built from
+(at most every SHLOKA_INDEX_SYNC_INTERVAL seconds) and rebuilds once another
+process, such as a Celery worker, changed the catalog.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from ..models import Shloka, ShlokaExplanation
+from .retrieval_cards import build_retrieval_card
+
+logger = logging.getLogger(__name__)
+
+
+# Common English words that carry no retrieval signal
+STOP_WORDS = frozenset({
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'you', 'your',
+    'yours', 'he', 'she', 'it', 'they', 'them', 'their', 'what',
+    'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
+    'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the',
+    'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while', 'of',
+    'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into',
+    'through', 'during', 'before', 'after', 'above', 'below', 'up',
+    'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further',
+    'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how',
+    'all', 'each', 'few', 'more', 'most', 'other', 'some', 'such',
+    'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too',
+    'very', 'can', 'will', 'just', 'should', 'now', 'could',
+})
+
+_TOKEN_RE = re.compile(r'\b\w+\b')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms, dropping stop words and short tokens."""
+    if not text:
+        return []
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if len(token) > 2 and token not in STOP_WORDS
+    ]
+
+
+def build_shloka_payload(shloka: Shloka, explanation: Optional[ShlokaExplanation]) -> Dict:
+    """Format a shloka and its explanation as the dict used in chatbot prompts."""
+    shloka_data = {
+        'chapter': shloka.chapter_number,
+        'verse': shloka.verse_number,
+        'sanskrit': shloka.sanskrit_text,
+        'transliteration': shloka.transliteration or '',
+    }
+
+    if explanation:
+        shloka_data['summary'] = explanation.summary or ''
+        shloka_data['meaning'] = explanation.detailed_meaning or ''
+        shloka_data['explanation'] = explanation.detailed_explanation or ''
+        shloka_data['themes'] = explanation.themes or []
+        shloka_data['card'] = explanation.retrieval_card or build_retrieval_card(explanation)
+
+    return shloka_data
+
+
+def document_text(payload: Dict) -> str:
+    """Concatenate the searchable fields of a shloka payload."""
+    themes = payload.get('themes') or []
+    themes_str = ' '.join(themes) if isinstance(themes, list) else str(themes)
+    return ' '.join([
+        payload.get('summary', ''),
+        payload.get('meaning', ''),
+        payload.get('explanation', ''),
+        themes_str,
+        payload.get('transliteration', ''),
+    ])
+
+
+def catalog_fingerprint() -> str:
+    """Cheap aggregate describing the current catalog state (row counts and latest ``updated_at``)."""
+    shlokas = Shloka.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    explanations = ShlokaExplanation.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return json.dumps([
+        shlokas['count'], str(shlokas['latest']),
+        explanations['count'], str(explanations['latest']),
+    ])
+
+
+class ShlokaSearchIndex:
+    """
+    BM25 inverted index of shlokas keyed by shloka ID.
+
+    Each document stores the formatted payload alongside its term counts, so a
+    search returns ready-to-use shloka dicts without touching the database.
+    Document counts and lengths are also kept per book, so a search limited to
+    one book is scored as if that book were indexed on its own.
+    All public methods are thread-safe.
+    """
+
+    # Standard BM25 parameters
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built = False
+        self._fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._payloads: Dict[str, Dict] = {}
+        self._books: Dict[str, str] = {}
+        self._positions: Dict[Tuple[str, int, int], str] = {}
+        self._total_length = 0
+        self._book_doc_counts: Counter = Counter()
+        self._book_lengths: Counter = Counter()
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def build(self, shlokas: Optional[Iterable[Shloka]] = None, fingerprint: Optional[str] = None) -> None:
+        """
+        (Re)build the index from the catalog, replacing any existing documents.
+
+        The new documents are indexed aside and swapped in at the end, so
+        searches keep being served from the previous index meanwhile.
+        """
+        if shlokas is None:
+            fingerprint = fingerprint or catalog_fingerprint()
+            shlokas = Shloka.objects.prefetch_related('explanations').iterator(chunk_size=500)
+
+        fresh = ShlokaSearchIndex()
+        for shloka in shlokas:
+            fresh._add(shloka, self._first_explanation(shloka))
+
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_lengths = fresh._doc_lengths
+            self._payloads = fresh._payloads
+            self._books = fresh._books
+            self._positions = fresh._positions
+            self._total_length = fresh._total_length
+            self._book_doc_counts = fresh._book_doc_counts
+            self._book_lengths = fresh._book_lengths
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+            self._built = True
+        logger.info(f"Built shloka search index with {len(self)} documents")
+
+    def ensure_built(self) -> None:
+        """Build the index on first use in this process, and rebuild it once the catalog changed."""
+        if self._built and time.monotonic() - self._checked_at < settings.SHLOKA_INDEX_SYNC_INTERVAL:
+            return
+        with self._build_lock:
+            if self._built and time.monotonic() - self._checked_at < settings.SHLOKA_INDEX_SYNC_INTERVAL:
+                return
+            fingerprint = catalog_fingerprint()
+            if self._built and fingerprint == self._fingerprint:
+                self._checked_at = time.monotonic()
+                return
+            self.build(fingerprint=fingerprint)
+
+    def clear(self) -> None:
+        """Drop all documents and mark the index as unbuilt."""
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._payloads = {}
+            self._books = {}
+            self._positions = {}
+            self._total_length = 0
+            self._book_doc_counts = Counter()
+            self._book_lengths = Counter()
+            self._fingerprint = None
+            self._built = False
+
+    def upsert(self, shloka: Shloka, explanation: Optional[ShlokaExplanation] = None) -> None:
+        """Add or replace a single shloka's document."""
+        with self._lock:
+            self._remove(str(shloka.id))
+            self._add(shloka, explanation)
+
+    def remove(self, shloka_id) -> None:
+        """Remove a shloka's document if it is indexed."""
+        with self._lock:
+            self._remove(str(shloka_id))
+
+    def get(self, book_name: str, chapter_number: int, verse_number: int) -> Optional[Dict]:
+        """Return the payload for a specific verse, or None if it is not indexed."""
+        doc_id = self._positions.get((book_name, chapter_number, verse_number))
+        if doc_id is None:
+            return None
+        return dict(self._payloads[doc_id])
+
+    def search(self, query: str, limit: int = 3, book_name: Optional[str] = None) -> List[Dict]:
+        """
+        Rank indexed shlokas against a free-text query.
+
+        With ``book_name``, IDF and the average document length are computed
+        over that book's documents only.
+
+        Returns:
+            Up to ``limit`` payload dicts, best first, each with a ``score`` key
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            if book_name:
+                doc_count = self._book_doc_counts[book_name]
+                total_length = self._book_lengths[book_name]
+            else:
+                doc_count = len(self._doc_lengths)
+                total_length = self._total_length
+            if doc_count == 0:
+                return []
+            avg_length = total_length / doc_count
+
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if postings and book_name:
+                    postings = {doc_id: tf for doc_id, tf in postings.items() if self._books[doc_id] == book_name}
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.K1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            results = []
+            for doc_id, score in ranked:
+                payload = dict(self._payloads[doc_id])
+                payload['score'] = round(score, 4)
+                results.append(payload)
+            return results
+
+    @staticmethod
+    def _first_explanation(shloka: Shloka) -> Optional[ShlokaExplanation]:
+        explanations = list(shloka.explanations.all())
+        return explanations[0] if explanations else None
+
+    def _add(self, shloka: Shloka, explanation: Optional[ShlokaExplanation]) -> None:
+        doc_id = str(shloka.id)
+        payload = build_shloka_payload(shloka, explanation)
+        terms = Counter(tokenize(document_text(payload)))
+
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._payloads[doc_id] = payload
+        self._books[doc_id] = shloka.book_name
+        self._positions[(shloka.book_name, shloka.chapter_number, shloka.verse_number)] = doc_id
+        self._total_length += self._doc_lengths[doc_id]
+        self._book_doc_counts[shloka.book_name] += 1
+        self._book_lengths[shloka.book_name] += self._doc_lengths[doc_id]
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        length = self._doc_lengths.pop(doc_id, 0)
+        self._total_length -= length
+        payload = self._payloads.pop(doc_id, {})
+        book_name = self._books.pop(doc_id, None)
+        self._book_doc_counts[book_name] -= 1
+        self._book_lengths[book_name] -= length
+        if self._book_doc_counts[book_name] <= 0:
+            del self._book_doc_counts[book_name]
+            del self._book_lengths[book_name]
+        position = (book_name, payload.get('chapter'), payload.get('verse'))
+        if self._positions.get(position) == doc_id:
+            del self._positions[position]
+
+
+_shloka_search_index = ShlokaSearchIndex()
+
+
+def get_shloka_search_index() -> ShlokaSearchIndex:
+    """Return the process-wide shloka search index."""
+    return _shloka_search_index
@@ -1,12 +1,25 @@
 """Shloka Service for managing shlokas and their explanations."""
+from django.conf import settings
+from django.db import connections, transaction
 from django.db.models import Count, F, Q
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from datetime import timedelta
 from ..models import Shloka, ShlokaExplanation, ReadingType, ShlokaReadStatus
 from ..groq_service import GroqService
-from .book_context_service import BookContextService
+from .book_context_service import get_book_context_service
+from .llm_gateway import LLMRateLimitExceeded, llm_gateway
+from .llm_limiter import LLMConcurrencyLimitExceeded, llm_limiter
+from .llm_response_cache import llm_response_cache
+from .marker_scanner import NUMBERED_LINE, REFERENCE, scan_markers
+from .retrieval_cards import build_retrieval_card
+from .shloka_search_index import get_shloka_search_index
+from .tfidf_retrieval import get_tfidf_retriever
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Dict, Iterable, Optional
 import logging
 import random
 import json
@@ -16,6 +29,118 @@ import unicodedata
 logger = logging.getLogger(__name__)
 
 
+def _pdf_dropped_chars_pattern():
+    """
+    Negated character class of every code point ``ShlokaService._clean_pdf_text`` keeps.
+
+    Kept: printable ASCII, tab/newline/carriage return, Devanagari (0x0900-0x097F)
+    and other Unicode below the private use area (0x00A0-0xDFFF) except the
+    0x2000-0x200A spaces and control/format/unassigned characters. Everything
+    else is dropped, including the private use area (corrupted glyphs) and all
+    code points above it.
+    """
+    def keep(code):
+        if 0x20 <= code <= 0x7E or code in (0x09, 0x0A, 0x0D) or 0x0900 <= code <= 0x097F:
+            return True
+        if 0x00A0 <= code < 0xE000 and not 0x2000 <= code < 0x200B:
+            return unicodedata.category(chr(code))[0] != 'C'
+        return False
+
+    ranges = []
+    for code in range(0xE000):
+        if not keep(code):
+            continue
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return '[^' + ''.join(
+        f'\\U{first:08x}' if first == last else f'\\U{first:08x}-\\U{last:08x}'
+        for first, last in ranges
+    ) + ']'
+
+
+# Precomputed once so cleaning is a few C-level regex passes instead of a Python loop per character
+_PDF_DROPPED_CHARS_RE = re.compile(_pdf_dropped_chars_pattern())
+# A hyphen followed by a line break/whitespace and a Latin letter
+_PDF_HYPHEN_BREAK_RE = re.compile(r'-\s+(?=[a-zA-Z])')
+_PDF_SPACE_RUN_RE = re.compile(r'  +')
+_DIGIT_RE = re.compile(r'\d')
+_DEVANAGARI_RE = re.compile(r'[\u0900-\u097f]')
+
+
+def _fix_pdf_hyphens(text, spaced):
+    """
+    Join Latin words broken around a hyphen.
+
+    Same result as ``re.sub(r'([a-zA-Z])-\\s+([a-zA-Z])', r'\\1\\2', text)`` or, with
+    ``spaced``, ``re.sub(r'([a-zA-Z])\\s+-\\s+([a-zA-Z])', r'\\1-\\2', text)``, but the
+    regex only scans for hyphens instead of starting a match attempt at every
+    letter; the letter before the hyphen is checked here.
+    """
+    parts = []
+    copied = 0
+    # End of the last fix, including the letter after its hyphen, which the
+    # regex would have consumed and so cannot start the next fix
+    consumed = 0
+    for match in _PDF_HYPHEN_BREAK_RE.finditer(text):
+        hyphen = match.start()
+        letter = hyphen - 1
+        if spaced:
+            while letter >= 0 and text[letter].isspace():
+                letter -= 1
+            if letter == hyphen - 1:
+                continue
+        if letter < consumed or not ('a' <= text[letter] <= 'z' or 'A' <= text[letter] <= 'Z'):
+            continue
+        parts.append(text[copied:letter + 1])
+        if spaced:
+            parts.append('-')
+        copied = match.end()
+        consumed = copied + 1
+    if not parts:
+        return text
+    parts.append(text[copied:])
+    return ''.join(parts)
+
+
+class CleanedPageLines:
+    """
+    Cleaned lines of a page range in the page text store, read lazily.
+    
+    Every iteration reads and cleans one page at a time, so a consumer that stops
+    at its target verse never touches the remaining pages, and peak memory scales
+    with a page rather than the whole chapter. Iterate again to start over.
+    """
+    
+    def __init__(self, page_store, start_page, end_page):
+        self.page_store = page_store
+        self.start_page = start_page
+        self.end_page = end_page
+    
+    def __iter__(self):
+        return ShlokaService._iter_clean_lines(self.page_store.iter_pages(self.start_page, self.end_page))
+    
+    def has_text(self):
+        """Whether any page in the range has text (stops at the first one that does)."""
+        return any(page.strip() for page in self.page_store.iter_pages(self.start_page, self.end_page))
+    
+    def sample(self, max_chars):
+        """The first ``max_chars`` characters of the cleaned text, for logging."""
+        lines = []
+        length = 0
+        for line in self:
+            lines.append(line)
+            length += len(line) + 1
+            if length >= max_chars:
+                break
+        return '\n'.join(lines)[:max_chars]
+    
+    def text(self):
+        """The whole range as one cleaned string, for callers that need random access."""
+        return '\n'.join(self)
+
+
 class ShlokaService:
     """Service for managing shlokas and their explanations."""
     
@@ -23,7 +148,7 @@ class ShlokaService:
         # GroqService and BookContextService are only used for PDF extraction of new shlokas
         # Explanations are now pre-generated and stored in the database, not generated on-demand
         self.groq_service = GroqService()
-        self.book_context_service = BookContextService()
+        self.book_context_service = get_book_context_service()
     
     def get_random_shloka(self, user=None):
         """
@@ -179,7 +304,7 @@ class ShlokaService:
             logger.error(f"Error getting shloka by ID: {str(e)}")
             raise
     
-    def get_shloka_by_chapter_verse(self, book_name, chapter_number, verse_number):
+    def get_shloka_by_chapter_verse(self, book_name, chapter_number, verse_number, user_id=None):
         """
         Get shloka by book name, chapter number, and verse number.
         If not found in database, automatically extracts it from PDF and generates explanation.
@@ -188,6 +313,12 @@ class ShlokaService:
             book_name: Name of the book (e.g., 'Bhagavad Gita')
             chapter_number: Chapter number
             verse_number: Verse number
+            user_id: Optional ID of the requesting user, counted against the
+                     per-user LLM concurrency limit for on-demand generation
+            
+        Raises:
+            LLMConcurrencyLimitExceeded: If on-demand generation is over the limit
+            LLMRateLimitExceeded: If the shared LLM quota is exhausted while extracting the verse
             
         Returns:
             dict: ShlokaResponse with shloka and explanation
@@ -212,29 +343,31 @@ class ShlokaService:
             # Shloka not found in database - extract it from PDF
             logger.info(f"Shloka not found in database: {book_name} Chapter {chapter_number}, Verse {verse_number}. Extracting from PDF...")
             
-            # Extract the specific shloka from PDF
-            extracted_shloka = self._extract_specific_shloka_from_pdf(
-                book_name, chapter_number, verse_number
-            )
-            
-            if not extracted_shloka:
-                raise Exception(f"Could not extract shloka from PDF: {book_name} Chapter {chapter_number}, Verse {verse_number}")
-            
-            # Save the extracted shloka to database
-            shloka = Shloka.objects.create(
-                book_name=extracted_shloka.get('book_name', book_name),
-                chapter_number=extracted_shloka.get('chapter_number', chapter_number),
-                verse_number=extracted_shloka.get('verse_number', verse_number),
-                sanskrit_text=extracted_shloka.get('sanskrit_text', ''),
-                transliteration=extracted_shloka.get('transliteration', ''),
-                word_by_word=extracted_shloka.get('word_by_word'),
-            )
-            
-            logger.info(f"Successfully extracted and saved shloka: {book_name} Chapter {chapter_number}, Verse {verse_number} (ID: {shloka.id})")
-            
-            # Generate and store explanation
-            logger.info(f"Generating explanation for shloka {shloka.id}...")
-            explanation = self.generate_and_store_explanation(shloka)
+            # PDF extraction and explanation generation run under one LLM concurrency slot
+            with llm_limiter.acquire(user_id):
+                # Extract the specific shloka from PDF
+                extracted_shloka = self._extract_specific_shloka_from_pdf(
+                    book_name, chapter_number, verse_number
+                )
+                
+                if not extracted_shloka:
+                    raise Exception(f"Could not extract shloka from PDF: {book_name} Chapter {chapter_number}, Verse {verse_number}")
+                
+                # Save the extracted shloka to database
+                shloka = Shloka.objects.create(
+                    book_name=extracted_shloka.get('book_name', book_name),
+                    chapter_number=extracted_shloka.get('chapter_number', chapter_number),
+                    verse_number=extracted_shloka.get('verse_number', verse_number),
+                    sanskrit_text=extracted_shloka.get('sanskrit_text', ''),
+                    transliteration=extracted_shloka.get('transliteration', ''),
+                    word_by_word=extracted_shloka.get('word_by_word'),
+                )
+                
+                logger.info(f"Successfully extracted and saved shloka: {book_name} Chapter {chapter_number}, Verse {verse_number} (ID: {shloka.id})")
+                
+                # Generate and store explanation
+                logger.info(f"Generating explanation for shloka {shloka.id}...")
+                explanation = self.generate_and_store_explanation(shloka)
             
             if not explanation:
                 logger.warning(f"Failed to generate explanation for shloka {shloka.id}, but shloka was saved")
@@ -244,6 +377,8 @@ class ShlokaService:
                 'explanation': explanation,
             }
             
+        except (LLMConcurrencyLimitExceeded, LLMRateLimitExceeded):
+            raise
         except Shloka.DoesNotExist:
             # This shouldn't happen now, but keep for safety
             raise Exception(f"Shloka not found: {book_name} Chapter {chapter_number}, Verse {verse_number}")
@@ -280,6 +415,13 @@ class ShlokaService:
             logger.error(f"Error getting explanation: {str(e)}")
             return None
     
+    # Explanation fields filled from the generated structured data
+    STRUCTURED_TEXT_FIELDS = [
+        'summary', 'detailed_meaning', 'detailed_explanation', 'context',
+        'why_this_matters', 'reflection_prompt', 'generation_prompt',
+    ]
+    STRUCTURED_LIST_FIELDS = ['modern_examples', 'themes']
+    
     def generate_and_store_explanation(self, shloka):
         """
         Generate structured explanation using Groq and store in database.
@@ -294,92 +436,20 @@ class ShlokaService:
             ShlokaExplanation object or None if generation failed
         """
         try:
-            # Convert shloka to dict for Groq service
-            shloka_dict = {
-                "book_name": shloka.book_name,
-                "chapter_number": shloka.chapter_number,
-                "verse_number": shloka.verse_number,
-                "sanskrit_text": shloka.sanskrit_text,
-                "transliteration": shloka.transliteration or "",
-            }
-            
-            # Get book context from PDFs (English and Hindi translations)
-            book_context = None
-            try:
-                if shloka.chapter_number and shloka.verse_number:
-                    book_context = self.book_context_service.get_context_for_shloka(
-                        book_name=shloka.book_name,
-                        chapter_number=shloka.chapter_number,
-                        verse_number=shloka.verse_number,
-                        include_hindi=True,
-                        include_english=True
-                    )
-                    if not book_context.get('english_context') and not book_context.get('hindi_context'):
-                        book_context = None
-            except Exception as e:
-                logger.warning(f"Failed to extract book context for shloka {shloka.id}: {str(e)}")
-                book_context = None
-            
-            # Generate structured explanation with book context
-            try:
-                structured_data = self.groq_service.generate_structured_explanation(
-                    shloka_dict, book_context=book_context
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to generate structured explanation for shloka {shloka.id}: {str(e)}"
-                )
-                # Don't raise - return None so the process can continue with other shlokas
-                return None
-            
-            # Validate that we got structured data
-            if not structured_data:
-                logger.warning(
-                    f"Generated explanation is empty for shloka {shloka.id}. "
-                    f"Skipping this explanation."
-                )
-                return None
-            
-            # Validate that at least some fields are populated
-            required_fields = ['summary', 'detailed_meaning', 'detailed_explanation']
-            if not any(structured_data.get(field) for field in required_fields):
-                logger.warning(
-                    f"Generated explanation has no required fields for shloka {shloka.id}. "
-                    f"Skipping this explanation."
-                )
+            structured_data = self.generate_structured_data(shloka)
+            if structured_data is None:
                 return None
             
             # Use get_or_create to handle both new and existing explanations
             # Only one explanation per shloka now (no explanation_type)
             explanation, created = ShlokaExplanation.objects.get_or_create(
                 shloka=shloka,
-                defaults={
-                    'summary': structured_data.get('summary', ''),
-                    'detailed_meaning': structured_data.get('detailed_meaning', ''),
-                    'detailed_explanation': structured_data.get('detailed_explanation', ''),
-                    'context': structured_data.get('context', ''),
-                    'why_this_matters': structured_data.get('why_this_matters', ''),
-                    'modern_examples': structured_data.get('modern_examples', []),
-                    'themes': structured_data.get('themes', []),
-                    'reflection_prompt': structured_data.get('reflection_prompt', ''),
-                    'ai_model_used': self.groq_service.model,
-                    'generation_prompt': structured_data.get('generation_prompt', ''),
-                    'quality_score': 0,  # Will be checked later by QA tasks
-                }
+                defaults=self._new_explanation_fields(structured_data)
             )
             
             # If explanation already exists, update it
             if not created:
-                explanation.summary = structured_data.get('summary', '') or explanation.summary
-                explanation.detailed_meaning = structured_data.get('detailed_meaning', '') or explanation.detailed_meaning
-                explanation.detailed_explanation = structured_data.get('detailed_explanation', '') or explanation.detailed_explanation
-                explanation.context = structured_data.get('context', '') or explanation.context
-                explanation.why_this_matters = structured_data.get('why_this_matters', '') or explanation.why_this_matters
-                explanation.modern_examples = structured_data.get('modern_examples', []) or explanation.modern_examples
-                explanation.themes = structured_data.get('themes', []) or explanation.themes
-                explanation.reflection_prompt = structured_data.get('reflection_prompt', '') or explanation.reflection_prompt
-                explanation.ai_model_used = self.groq_service.model
-                explanation.generation_prompt = structured_data.get('generation_prompt', '') or explanation.generation_prompt
+                self._merge_structured_data(explanation, structured_data)
                 explanation.save()
             
             logger.info(f"{'Created' if created else 'Updated'} structured explanation for shloka {shloka.id}")
@@ -390,6 +460,181 @@ class ShlokaService:
             logger.exception(e)
             return None
     
+    def generate_and_store_explanations(
+        self,
+        shlokas: Iterable[Shloka],
+        max_workers: Optional[int] = None
+    ) -> Dict:
+        """
+        Generate structured explanations for many shlokas with bounded concurrency.
+        
+        Each generation is seconds of waiting on Groq, so up to ``max_workers``
+        (default EXPLANATION_GENERATION_CONCURRENCY) run at once in a thread pool;
+        the LLM gateway keeps them within the shared rate limit. Results are then
+        written in one transaction with bulk_create/bulk_update.
+        
+        Args:
+            shlokas: Shloka model instances
+            max_workers: Maximum number of generations in flight
+            
+        Returns:
+            Dict mapping shloka ID to its stored ShlokaExplanation; shlokas whose
+            generation failed are missing from it
+        """
+        shlokas = list(shlokas)
+        if not shlokas:
+            return {}
+        
+        max_workers = max(1, min(max_workers or settings.EXPLANATION_GENERATION_CONCURRENCY, len(shlokas)))
+        # The cache bypass is per thread, so hand it on to the workers
+        bypass_cache = llm_response_cache.is_bypassed()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='explanations') as executor:
+            generated = list(executor.map(
+                lambda shloka: self._generate_structured_data_in_worker(shloka, bypass_cache), shlokas
+            ))
+        
+        existing = {}
+        for explanation in ShlokaExplanation.objects.filter(
+            shloka_id__in=[shloka.id for shloka in shlokas]
+        ).order_by('-created_at'):
+            existing[explanation.shloka_id] = explanation  # Oldest wins, as with get_or_create
+        
+        now = timezone.now()
+        to_create, to_update, stored = [], [], {}
+        for shloka, structured_data in zip(shlokas, generated):
+            if structured_data is None:
+                continue
+            explanation = existing.get(shloka.id)
+            if explanation is None:
+                explanation = ShlokaExplanation(shloka=shloka, **self._new_explanation_fields(structured_data))
+                to_create.append(explanation)
+            else:
+                explanation.shloka = shloka
+                self._merge_structured_data(explanation, structured_data)
+                explanation.updated_at = now
+                to_update.append(explanation)
+            # Bulk writes skip the pre_save signal that builds the card
+            explanation.retrieval_card = build_retrieval_card(explanation)
+            stored[shloka.id] = explanation
+        
+        with transaction.atomic():
+            ShlokaExplanation.objects.bulk_create(to_create)
+            if to_update:
+                ShlokaExplanation.objects.bulk_update(
+                    to_update,
+                    self.STRUCTURED_TEXT_FIELDS + self.STRUCTURED_LIST_FIELDS
+                    + ['ai_model_used', 'retrieval_card', 'updated_at']
+                )
+            explanations = list(stored.values())
+            transaction.on_commit(lambda: self._reindex_explanations(explanations))
+        
+        logger.info(
+            f"Stored {len(stored)}/{len(shlokas)} structured explanations "
+            f"({len(to_create)} created, {len(to_update)} updated, {max_workers} concurrent)"
+        )
+        return stored
+    
+    def generate_structured_data(self, shloka) -> Optional[dict]:
+        """
+        Generate the structured explanation fields of a shloka without storing them.
+        
+        Returns:
+            Structured data dict, or None if generation failed or returned no content
+        """
+        # Convert shloka to dict for Groq service
+        shloka_dict = {
+            "book_name": shloka.book_name,
+            "chapter_number": shloka.chapter_number,
+            "verse_number": shloka.verse_number,
+            "sanskrit_text": shloka.sanskrit_text,
+            "transliteration": shloka.transliteration or "",
+        }
+        
+        # Get book context from PDFs (English and Hindi translations)
+        book_context = None
+        try:
+            if shloka.chapter_number and shloka.verse_number:
+                book_context = self.book_context_service.get_context_for_shloka(
+                    book_name=shloka.book_name,
+                    chapter_number=shloka.chapter_number,
+                    verse_number=shloka.verse_number,
+                    include_hindi=True,
+                    include_english=True
+                )
+                if not book_context.get('english_context') and not book_context.get('hindi_context'):
+                    book_context = None
+        except Exception as e:
+            logger.warning(f"Failed to extract book context for shloka {shloka.id}: {str(e)}")
+            book_context = None
+        
+        # Generate structured explanation with book context
+        try:
+            structured_data = self.groq_service.generate_structured_explanation(
+                shloka_dict, book_context=book_context
+            )
+        except Exception as e:
+            logger.error(
+                f"Failed to generate structured explanation for shloka {shloka.id}: {str(e)}"
+            )
+            # Don't raise - return None so the process can continue with other shlokas
+            return None
+        
+        # Validate that we got structured data
+        if not structured_data:
+            logger.warning(
+                f"Generated explanation is empty for shloka {shloka.id}. "
+                f"Skipping this explanation."
+            )
+            return None
+        
+        # Validate that at least some fields are populated
+        required_fields = ['summary', 'detailed_meaning', 'detailed_explanation']
+        if not any(structured_data.get(field) for field in required_fields):
+            logger.warning(
+                f"Generated explanation has no required fields for shloka {shloka.id}. "
+                f"Skipping this explanation."
+            )
+            return None
+        
+        return structured_data
+    
+    def _generate_structured_data_in_worker(self, shloka, bypass_cache=False) -> Optional[dict]:
+        """``generate_structured_data`` on a pool thread, which never raises and closes its DB connection."""
+        try:
+            with llm_response_cache.bypass() if bypass_cache else nullcontext():
+                return self.generate_structured_data(shloka)
+        except Exception as e:
+            logger.error(f"Error generating explanation for shloka {shloka.id}: {str(e)}")
+            logger.exception(e)
+            return None
+        finally:
+            connections.close_all()
+    
+    def _new_explanation_fields(self, structured_data: dict) -> dict:
+        """Field values of a new explanation built from generated structured data."""
+        fields = {field: structured_data.get(field, '') for field in self.STRUCTURED_TEXT_FIELDS}
+        fields.update({field: structured_data.get(field, []) for field in self.STRUCTURED_LIST_FIELDS})
+        fields['ai_model_used'] = self.groq_service.model
+        fields['quality_score'] = 0  # Will be checked later by QA tasks
+        return fields
+    
+    def _merge_structured_data(self, explanation, structured_data: dict) -> None:
+        """Overwrite an existing explanation's fields with the non-empty generated values."""
+        for field in self.STRUCTURED_TEXT_FIELDS:
+            setattr(explanation, field, structured_data.get(field, '') or getattr(explanation, field))
+        for field in self.STRUCTURED_LIST_FIELDS:
+            setattr(explanation, field, structured_data.get(field, []) or getattr(explanation, field))
+        explanation.ai_model_used = self.groq_service.model
+    
+    @staticmethod
+    def _reindex_explanations(explanations) -> None:
+        """Refresh the search indexes for bulk-written explanations (bulk writes send no post_save)."""
+        get_tfidf_retriever().invalidate()
+        index = get_shloka_search_index()
+        if index.is_built:
+            for explanation in explanations:
+                index.upsert(explanation.shloka, explanation)
+    
     def mark_shloka_as_read(self, user, shloka_id):
         """
         Mark a shloka as read for a user.
@@ -467,8 +712,8 @@ class ShlokaService:
                 logger.warning(f"PDF book not found: {book_path}")
                 return
             
-            pdf_reader = self.book_context_service._load_pdf(book_path)
-            if not pdf_reader:
+            page_store = self.book_context_service.get_store(book_path)
+            if not page_store:
                 logger.warning("Failed to load PDF")
                 return
             
@@ -494,68 +739,45 @@ class ShlokaService:
                 if added_count >= num_shlokas:
                     break
                 
-                # Extract chapter text - try to find actual chapter content
-                # Search for pages with "Chapter X" or "VERSE" patterns
-                estimated_start_page = (target_chapter - 1) * 15
-                estimated_end_page = target_chapter * 15 + 5
-                
-                # First, try to find the actual chapter start page
-                chapter_start_page = None
-                for page_num in range(max(0, estimated_start_page - 5), min(estimated_end_page + 5, len(pdf_reader.pages))):
-                    try:
-                        page = pdf_reader.pages[page_num]
-                        page_text = page.extract_text()
-                        if page_text and (f'Chapter {target_chapter}' in page_text or f'CHAPTER {target_chapter}' in page_text):
-                            chapter_start_page = page_num
-                            logger.info(f"Found Chapter {target_chapter} starting at page {page_num}")
-                            break
-                    except:
-                        continue
-                
-                # Use found page or fallback to estimated
-                if chapter_start_page is not None:
-                    start_page = chapter_start_page
-                    end_page = min(chapter_start_page + 20, len(pdf_reader.pages))
+                # Locate the chapter in the book's chapter index, falling back to an estimate
+                chapter_pages = page_store.chapter_range(target_chapter)
+                if chapter_pages is not None:
+                    start_page, end_page = chapter_pages
+                    logger.info(f"Found Chapter {target_chapter} starting at page {start_page}")
                 else:
-                    start_page = estimated_start_page
-                    end_page = estimated_end_page
-                
-                raw_chapter_text = self.book_context_service._extract_text_from_pdf(
-                    pdf_reader, (start_page, end_page)
-                )
+                    start_page, end_page = self.book_context_service.estimate_chapter_pages(target_chapter)
                 
-                if not raw_chapter_text:
+                chapter_lines = CleanedPageLines(page_store, start_page, end_page)
+                if not chapter_lines.has_text():
                     logger.warning(f"No text extracted for chapter {target_chapter}")
                     continue
                 
-                # Clean the extracted text
-                logger.info(f"Extracting from Chapter {target_chapter} (pages {start_page}-{end_page}) - Raw text length: {len(raw_chapter_text)} chars")
-                chapter_text = self._clean_pdf_text(raw_chapter_text)
-                logger.info(f"After cleaning - Text length: {len(chapter_text)} chars")
+                logger.info(f"Extracting from Chapter {target_chapter} (pages {start_page}-{end_page})")
                 
-                # Check if we have actual shloka content (look for Devanagari or VERSE patterns)
-                has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in chapter_text)
-                has_verse = 'VERSE' in chapter_text or 'verse' in chapter_text.lower()
+                # Check if we have actual shloka content (look for Devanagari or VERSE patterns);
+                # stops reading at the first line that has either
+                has_shloka_content = any(
+                    _DEVANAGARI_RE.search(line) or 'verse' in line.lower()
+                    for line in chapter_lines
+                )
                 
-                if not has_devanagari and not has_verse:
+                if not has_shloka_content:
                     logger.warning(f"Chapter {target_chapter} text doesn't appear to contain shloka content (no Devanagari or VERSE markers)")
                     # Log sample to help debug
-                    sample_text = chapter_text[:500] if len(chapter_text) > 500 else chapter_text
-                    logger.info(f"Text sample: {sample_text}")
+                    logger.info(f"Text sample: {chapter_lines.sample(500)}")
                     continue
                 
                 # Log a sample of the text (first 300 chars) to verify extraction
-                sample_text = chapter_text[:300] if len(chapter_text) > 300 else chapter_text
-                logger.info(f"Text sample (first 300 chars): {sample_text}")
+                logger.info(f"Text sample (first 300 chars): {chapter_lines.sample(300)}")
                 
                 # Calculate how many more shlokas we need
                 remaining_needed = num_shlokas - added_count
                 shlokas_to_extract = min(shlokas_per_chapter, remaining_needed)
                 
-                # Use AI to extract shlokas from this chapter
+                # Use AI to extract shlokas from this chapter, reading it a page at a time
                 logger.info(f"Calling AI to extract {shlokas_to_extract} shlokas from Chapter {target_chapter}")
                 shlokas_data = self._extract_shlokas_with_ai(
-                    chapter_text, target_chapter, shlokas_to_extract
+                    chapter_lines, target_chapter, shlokas_to_extract
                 )
                 logger.info(f"AI returned {len(shlokas_data)} shlokas from Chapter {target_chapter}")
                 
@@ -700,7 +922,8 @@ class ShlokaService:
         
         return cleaned_text.strip()
     
-    def _clean_pdf_text(self, text):
+    @staticmethod
+    def _clean_pdf_text(text):
         """
         Clean text extracted from PDF, preserving Sanskrit/Devanagari characters.
         
@@ -728,74 +951,31 @@ class ShlokaService:
         # Use NFC (Canonical Composition) to better preserve Devanagari
         text = unicodedata.normalize('NFC', text)
         
-        # Remove null bytes and control characters (but preserve Devanagari)
-        text = re.sub(r'\x00', '', text)  # Remove null bytes
-        
-        # Remove corrupted characters (private use area) and control characters
-        # Preserve:
-        # - Printable ASCII (0x20-0x7E)
-        # - Newlines, tabs, carriage returns (0x09, 0x0A, 0x0D)
-        # - Devanagari range (0x0900-0x097F)
-        # - Extended Latin and other valid Unicode (0x00A0-0xDFFF, excluding control chars)
-        # Remove:
-        # - Private Use Area (0xE000-0xF8FF) - these are corrupted characters
-        # - Control characters (except newlines/tabs)
-        cleaned_chars = []
-        for char in text:
-            code = ord(char)
-            # Keep printable ASCII
-            if 0x20 <= code <= 0x7E:
-                cleaned_chars.append(char)
-            # Keep newlines, tabs, carriage returns
-            elif code in [0x09, 0x0A, 0x0D]:
-                cleaned_chars.append(char)
-            # Keep Devanagari range (Sanskrit)
-            elif 0x0900 <= code <= 0x097F:
-                cleaned_chars.append(char)
-            # Keep extended Latin and other valid Unicode (but skip control chars)
-            elif 0x00A0 <= code < 0xE000 and code not in range(0x2000, 0x200B):  # Exclude some problematic ranges
-                # Additional check: skip if it's a control character
-                if unicodedata.category(char)[0] != 'C':  # Not a control character
-                    cleaned_chars.append(char)
-            # Skip private use area (corrupted characters) - don't add anything
-            elif 0xE000 <= code <= 0xF8FF:
-                pass  # Skip corrupted characters completely
-            # Skip other problematic Unicode ranges
-            elif 0xF900 <= code <= 0xFAFF:  # CJK Compatibility Ideographs
-                pass
-            elif 0xFFF0 <= code <= 0xFFFF:  # Specials
-                pass
-            # For other characters, be conservative and skip
-            else:
-                pass
-        
-        text = ''.join(cleaned_chars)
+        # Remove null bytes, control characters and corrupted characters (private
+        # use area) in one pass, preserving Devanagari and other valid Unicode
+        text = _PDF_DROPPED_CHARS_RE.sub('', text)
         
         # Fix common PDF extraction issues with hyphenated words
-        # But be careful not to break Sanskrit text
         # Only fix for ASCII/Latin characters, not Devanagari
-        text = re.sub(r'([a-zA-Z])-\s+([a-zA-Z])', r'\1\2', text)  # Fix hyphenated words split across lines
-        text = re.sub(r'([a-zA-Z])\s+-\s+([a-zA-Z])', r'\1-\2', text)  # Fix spaced hyphens
+        text = _fix_pdf_hyphens(text, spaced=False)  # Fix hyphenated words split across lines
+        text = _fix_pdf_hyphens(text, spaced=True)  # Fix spaced hyphens
         
-        # Clean up excessive whitespace (multiple spaces/tabs)
-        # But preserve single newlines which might be intentional in Sanskrit text
-        text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces/tabs to single space
-        text = re.sub(r'\n{3,}', '\n\n', text)  # Multiple newlines to double newline
+        # Multiple spaces/tabs to single space
+        text = _PDF_SPACE_RUN_RE.sub(' ', text.replace('\t', ' '))
         
-        # Remove leading/trailing whitespace from each line
-        lines = text.split('\n')
-        cleaned_lines = [line.strip() for line in lines if line.strip()]  # Remove empty lines
-        text = '\n'.join(cleaned_lines)
+        # Remove leading/trailing whitespace from each line and drop empty lines
+        text = '\n'.join(filter(None, map(str.strip, text.split('\n'))))
         
-        # Final cleanup - remove leading/trailing whitespace
-        text = text.strip()
-        
-        return text
+        return text.strip()
     
     def _extract_shlokas_with_ai(self, chapter_text, chapter_num, max_shlokas=10):
         """
         Use AI to extract shlokas from chapter text.
         
+        ``chapter_text`` is a string or an iterable of lines such as
+        ``CleanedPageLines``; verse sections are split as the lines are read, and
+        reading stops once ``max_shlokas`` valid verses have been found.
+        
         Optimized strategy for performance and cost:
         1. Batch 3-5 verses together to reduce API calls (cost optimization)
         2. Use concise prompts with focused context
@@ -803,35 +983,36 @@ class ShlokaService:
         4. Validate chapter correctness before processing
         """
         try:
-            # Split chapter text into verse sections
-            verse_sections = self._split_into_verse_sections(chapter_text, chapter_num)
-            
-            if not verse_sections:
-                logger.warning(f"No verse sections found in chapter {chapter_num} text")
-                return self._extract_shlokas_fallback(chapter_text, chapter_num, max_shlokas)
-            
-            logger.info(f"Found {len(verse_sections)} verse sections in chapter {chapter_num}")
+            chapter_lines = chapter_text.split('\n') if isinstance(chapter_text, str) else chapter_text
             
-            # Filter out verses from wrong chapters
+            # Split verse sections, filtering out verses from wrong chapters
+            sections_found = 0
             valid_verse_sections = []
-            for verse_section in verse_sections:
+            for verse_section in self._iter_verse_sections(chapter_lines, chapter_num):
+                sections_found += 1
                 verse_text = verse_section.get('text', '')
                 if not verse_text:
                     continue
                 
                 # Quick validation - check if verse text contains wrong chapter markers
-                verse_lower = verse_text[:500].lower()  # Check first 500 chars
-                has_wrong_chapter = False
-                for other_chapter in range(1, 19):
-                    if other_chapter != chapter_num:
-                        if f'chapter {other_chapter}' in verse_lower:
-                            # Check if our chapter also appears
-                            if f'chapter {chapter_num}' not in verse_lower:
-                                has_wrong_chapter = True
-                                break
+                # (first 500 chars) without mentioning our chapter
+                chapters_mentioned = {
+                    marker.chapter for marker in scan_markers(verse_text[:500]) if marker.is_chapter
+                }
+                has_wrong_chapter = bool(chapters_mentioned - {chapter_num}) and chapter_num not in chapters_mentioned
                 
                 if not has_wrong_chapter:
                     valid_verse_sections.append(verse_section)
+                    if len(valid_verse_sections) >= max_shlokas:
+                        break  # Enough verses - stop reading the chapter
+            
+            if not sections_found:
+                logger.warning(f"No verse sections found in chapter {chapter_num} text")
+                if not isinstance(chapter_text, str):
+                    chapter_text = '\n'.join(chapter_text)
+                return self._extract_shlokas_fallback(chapter_text, chapter_num, max_shlokas)
+            
+            logger.info(f"Read {sections_found} verse sections in chapter {chapter_num}")
             
             if not valid_verse_sections:
                 logger.warning(f"No valid verse sections found for chapter {chapter_num}")
@@ -898,81 +1079,41 @@ class ShlokaService:
                 logger.warning(f"PDF book not found: {book_path}")
                 return None
             
-            pdf_reader = self.book_context_service._load_pdf(book_path)
-            if not pdf_reader:
+            page_store = self.book_context_service.get_store(book_path)
+            if not page_store:
                 logger.warning("Failed to load PDF")
                 return None
             
-            # Find chapter start page - expand search range
-            estimated_start_page = (chapter_number - 1) * 15
-            estimated_end_page = chapter_number * 15 + 30  # Increased range
-            
-            chapter_start_page = None
-            search_range = range(max(0, estimated_start_page - 10), min(estimated_end_page + 10, len(pdf_reader.pages)))
-            logger.info(f"Searching for Chapter {chapter_number} in pages {min(search_range)}-{max(search_range)}")
-            
-            for page_num in search_range:
-                try:
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text and (f'Chapter {chapter_number}' in page_text or f'CHAPTER {chapter_number}' in page_text):
-                        # Check if it's actual content (has Devanagari or VERSE)
-                        has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in page_text)
-                        has_verse = 'VERSE' in page_text or 'verse' in page_text.lower()
-                        if has_devanagari or has_verse:
-                            chapter_start_page = page_num
-                            logger.info(f"Found Chapter {chapter_number} starting at page {page_num}")
-                            break
-                except Exception as e:
-                    logger.debug(f"Error reading page {page_num}: {str(e)}")
-                    continue
-            
-            # Use found page or fallback to estimated
-            if chapter_start_page is not None:
-                start_page = chapter_start_page
-                end_page = min(chapter_start_page + 30, len(pdf_reader.pages))  # Increased range
+            # Locate the chapter in the book's chapter index, falling back to an estimate
+            chapter_pages = page_store.chapter_range(chapter_number)
+            if chapter_pages is not None:
+                start_page, end_page = chapter_pages
+                logger.info(f"Found Chapter {chapter_number} starting at page {start_page}")
             else:
-                start_page = estimated_start_page
-                end_page = estimated_end_page
+                start_page, end_page = (chapter_number - 1) * 15, chapter_number * 15 + 30
                 logger.warning(f"Could not find Chapter {chapter_number} start page, using estimated pages {start_page}-{end_page}")
             
-            # Extract chapter text
-            raw_chapter_text = self.book_context_service._extract_text_from_pdf(
-                pdf_reader, (start_page, end_page)
-            )
-            
-            if not raw_chapter_text:
+            chapter_lines = CleanedPageLines(page_store, start_page, end_page)
+            if not chapter_lines.has_text():
                 logger.warning(f"No text extracted for chapter {chapter_number}")
                 return None
             
-            # Clean the extracted text
-            chapter_text = self._clean_pdf_text(raw_chapter_text)
-            logger.info(f"Extracted {len(chapter_text)} characters from chapter {chapter_number} (pages {start_page}-{end_page})")
-            
-            # Log a sample of the text to help debug
-            if chapter_text:
-                sample = chapter_text[:500] if len(chapter_text) > 500 else chapter_text
-                logger.debug(f"Chapter text sample: {sample}")
-            
-            # Split into verse sections
-            verse_sections = self._split_into_verse_sections(chapter_text, chapter_number)
-            logger.info(f"Found {len(verse_sections)} verse sections in chapter {chapter_number}")
-            
-            # Log verse numbers found
-            if verse_sections:
-                verse_numbers_found = [vs.get('verse_number') for vs in verse_sections]
-                logger.info(f"Verse numbers found: {verse_numbers_found[:20]}...")  # Log first 20
-            
-            # Find the specific verse
+            # Read the chapter a page at a time, splitting verse sections as we go,
+            # and stop as soon as the target verse is complete
             target_verse_section = None
-            for verse_section in verse_sections:
-                if verse_section.get('verse_number') == verse_number:
+            verse_numbers_found = []
+            for verse_section in self._iter_verse_sections(chapter_lines, chapter_number):
+                if verse_section['verse_number'] == verse_number:
                     target_verse_section = verse_section
                     break
+                verse_numbers_found.append(verse_section['verse_number'])
+            logger.info(f"Read {len(verse_numbers_found)} verse sections of chapter {chapter_number} (pages {start_page}-{end_page}) before verse {verse_number}")
             
             # If verse not found in split sections, try to find it directly in the text
             if not target_verse_section:
+                logger.info(f"Verse numbers found: {verse_numbers_found[:20]}...")  # Log first 20
                 logger.warning(f"Verse {verse_number} not found in split sections, trying direct search...")
+                chapter_text = chapter_lines.text()
                 
                 # Use book_context_service to search for the verse
                 verse_context = self.book_context_service._search_for_chapter_verse(
@@ -1047,6 +1188,8 @@ class ShlokaService:
             
             return extracted_shloka
             
+        except LLMRateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extracting specific shloka from PDF: {str(e)}")
             logger.exception(e)
@@ -1062,79 +1205,101 @@ class ShlokaService:
         - context_before: str (previous verse for context)
         - context_after: str (next verse for context)
         """
-        verse_sections = []
+        return list(self._iter_verse_sections(chapter_text.split('\n'), chapter_num))
+    
+    @staticmethod
+    def _iter_clean_lines(pages):
+        """
+        Yield the cleaned, non-empty lines of an iterable of page texts.
         
-        # Pattern to find verse markers: "VERSE 1", "Verse 1", "1.", "1.1", etc.
-        verse_patterns = [
-            rf'VERSE\s+(\d+)',
-            rf'Verse\s+(\d+)',
-            rf'^\s*(\d+)\.\s+',  # "1. " at start of line
-            rf'^\s*{chapter_num}\.(\d+)\s+',  # "1.1 " format
-        ]
+        Pages are cleaned one at a time, so only the current page is held in memory.
+        """
+        for page in pages:
+            cleaned = ShlokaService._clean_pdf_text(page)
+            if cleaned:
+                yield from cleaned.split('\n')
+    
+    def _iter_verse_sections(self, lines, chapter_num, context_lines=5):
+        """
+        Yield verse sections (as in ``_split_into_verse_sections``) from an iterable of lines.
         
-        lines = chapter_text.split('\n')
-        current_verse = None
-        current_text = []
-        verse_start_idx = 0
+        Lines are consumed one at a time and each section is yielded as soon as the
+        ``context_lines`` lines after it have been read, so a caller looking for one
+        verse stops reading there. Only the current verse and a few lines of context
+        are held in memory.
+        """
+        recent_lines = deque(maxlen=context_lines)  # lines before the current one
+        current = None  # (verse number, lines, context_before) of the verse being read
+        waiting = []  # finished sections still collecting their context_after lines
         
-        for i, line in enumerate(lines):
-            # Check if this line starts a new verse
-            verse_found = None
-            for pattern in verse_patterns:
-                match = re.search(pattern, line, re.IGNORECASE)
-                if match:
-                    verse_found = int(match.group(1))
-                    break
-            
+        for line in lines:
+            verse_found = self._verse_start(line, chapter_num)
             if verse_found is not None:
-                # Save previous verse if exists
-                if current_verse is not None and current_text:
-                    verse_text = '\n'.join(current_text).strip()
-                    if verse_text:
-                        # Get context (previous and next verses)
-                        context_before = self._get_context_before(lines, verse_start_idx)
-                        context_after = self._get_context_after(lines, i)
-                        
-                        verse_sections.append({
-                            'verse_number': current_verse,
-                            'text': verse_text,
-                            'context_before': context_before,
-                            'context_after': context_after,
-                        })
-                
-                # Start new verse
-                current_verse = verse_found
-                current_text = [line]
-                verse_start_idx = i
-            elif current_verse is not None:
-                # Continue current verse
-                current_text.append(line)
+                if current is not None:
+                    section = self._build_verse_section(current)
+                    if section:
+                        waiting.append((section, []))
+                current = (verse_found, [line], '\n'.join(recent_lines).strip())
+            elif current is not None:
+                current[1].append(line)
+            
+            if waiting:
+                for _, after_lines in waiting:
+                    after_lines.append(line)
+                while waiting and len(waiting[0][1]) == context_lines:
+                    section, after_lines = waiting.pop(0)
+                    section['context_after'] = '\n'.join(after_lines).strip()
+                    yield section
+            recent_lines.append(line)
         
-        # Save last verse
-        if current_verse is not None and current_text:
-            verse_text = '\n'.join(current_text).strip()
-            if verse_text:
-                context_before = self._get_context_before(lines, verse_start_idx)
-                context_after = ""
-                
-                verse_sections.append({
-                    'verse_number': current_verse,
-                    'text': verse_text,
-                    'context_before': context_before,
-                    'context_after': context_after,
-                })
-        
-        return verse_sections
+        for section, after_lines in waiting:
+            section['context_after'] = '\n'.join(after_lines).strip()
+            yield section
+        if current is not None:
+            section = self._build_verse_section(current)
+            if section:
+                section['context_after'] = ""
+                yield section
     
-    def _get_context_before(self, lines, current_idx, num_lines=5):
-        """Get context from previous lines (previous verse)."""
-        start = max(0, current_idx - num_lines)
-        return '\n'.join(lines[start:current_idx]).strip()
+    @staticmethod
+    def _build_verse_section(verse):
+        """Section dict for a (verse number, lines, context_before) tuple, or None if it has no text."""
+        verse_number, verse_lines, context_before = verse
+        verse_text = '\n'.join(verse_lines).strip()
+        if not verse_text:
+            return None
+        return {
+            'verse_number': verse_number,
+            'text': verse_text,
+            'context_before': context_before,
+            'context_after': "",
+        }
     
-    def _get_context_after(self, lines, current_idx, num_lines=5):
-        """Get context from next lines (next verse)."""
-        end = min(len(lines), current_idx + num_lines)
-        return '\n'.join(lines[current_idx:end]).strip()
+    @staticmethod
+    def _verse_start(line, chapter_num):
+        """
+        Number of the verse a line starts, or None.
+        
+        When a line has several markers, the strongest one wins: a verse marker
+        ("VERSE 1", "Text 1"), then a numbered line ("1. "), then a
+        "chapter.verse" reference at the start of the line.
+        """
+        if not _DIGIT_RE.search(line):
+            # Every verse marker has a number; most commentary lines have none
+            return None
+        best = None  # (priority, verse number)
+        for marker in scan_markers(line):
+            if marker.is_verse and marker.chapter in (None, chapter_num):
+                return marker.verse
+            if marker.kind == NUMBERED_LINE:
+                priority = 1
+            elif marker.kind == REFERENCE and marker.chapter == chapter_num and not line[:marker.start].strip():
+                priority = 2
+            else:
+                continue
+            if best is None or priority < best[0]:
+                best = (priority, marker.verse)
+        return best[1] if best else None
     
     def _extract_verse_batch_with_ai(self, verse_sections, chapter_num):
         """
@@ -1192,7 +1357,7 @@ Rules:
 - Return all {len(verse_numbers)} verses
 - JSON only, no other text"""
 
-            response = self.groq_service.client.chat.completions.create(
+            response = llm_gateway.chat_completion(
                 model=self.groq_service.model,
                 messages=[
                     {
@@ -1313,7 +1478,7 @@ Extract Devanagari Sanskrit (U+0900-U+097F). Reconstruct if corrupted. JSON only
 
             # Call Groq API with higher token limit for reasoning models
             try:
-                response = self.groq_service.client.chat.completions.create(
+                response = llm_gateway.chat_completion(
                     model=self.groq_service.model,
                     messages=[
                         {
@@ -1402,10 +1567,14 @@ Extract Devanagari Sanskrit (U+0900-U+097F). Reconstruct if corrupted. JSON only
                     logger.error(f"Failed to parse AI response as JSON for verse {verse_num}: {str(e)}")
                     logger.error(f"Response text (first 500 chars): {response_text[:500]}")
                     return None
+            except LLMRateLimitExceeded:
+                raise
             except Exception as e:
                 logger.error(f"Error calling Groq API for verse {verse_num}: {str(e)}")
                 return None
                 
+        except LLMRateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extracting single verse {verse_num}: {str(e)}")
             return None
@@ -1445,7 +1614,7 @@ Extract up to 3 shlokas and return as JSON array. Each shloka must have:
 Return ONLY valid JSON array."""
 
                 try:
-                    response = self.groq_service.client.chat.completions.create(
+                    response = llm_gateway.chat_completion(
                         model=self.groq_service.model,
                         messages=[
                             {
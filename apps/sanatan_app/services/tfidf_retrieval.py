@@ -0,0 +1,307 @@
+"""
+Vectorized TF-IDF retrieval over shloka explanations.
+
+The catalog is encoded once as an L2-normalized float32 sparse matrix and
+persisted to disk, so a query is scored with a single sparse matrix-vector
+product and an ``argpartition`` top-k instead of per-keyword database scans.
+Like the BM25 index, each process re-checks the catalog fingerprint at most
+every SHLOKA_INDEX_SYNC_INTERVAL seconds, so writes made by other processes
+replace a stale matrix without a restart.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from ..models import Shloka
+from .shloka_search_index import build_shloka_payload, catalog_fingerprint, document_text, tokenize
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+    logging.warning("numpy/scipy not installed. TF-IDF retrieval will be disabled.")
+
+logger = logging.getLogger(__name__)
+
+
+class TfidfShlokaRetriever:
+    """
+    TF-IDF cosine retrieval engine for shlokas.
+
+    The matrix is rebuilt lazily when the catalog fingerprint (row counts and
+    latest ``updated_at``) no longer matches the one stored with the file. It
+    is checked on the next query after ``invalidate()`` (writes made in this
+    process) and otherwise at most every SHLOKA_INDEX_SYNC_INTERVAL seconds.
+    A rebuild runs aside and is swapped in under ``_lock``; searches take
+    their references under the same lock, so they never mix two builds.
+    """
+
+    # Bumped whenever the on-disk layout changes
+    FORMAT_VERSION = 2
+
+    def __init__(self, index_path: Optional[Path] = None):
+        self.index_path = Path(index_path or settings.SHLOKA_TFIDF_INDEX_PATH)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._matrix = None
+        self._idf = None
+        self._vocabulary: Dict[str, int] = {}
+        self._payloads: List[Dict] = []
+        self._books = None
+        self._positions: Dict[tuple, int] = {}
+        self._fingerprint: Optional[str] = None
+        self._stale = True
+        self._checked_at = 0.0
+
+    @staticmethod
+    def is_available() -> bool:
+        return np is not None and sparse is not None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._matrix is not None
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    @staticmethod
+    def catalog_fingerprint() -> str:
+        """Cheap aggregate describing the current catalog state."""
+        return catalog_fingerprint()
+
+    def invalidate(self) -> None:
+        """Mark the loaded matrix as stale so the next query re-checks the catalog."""
+        self._stale = True
+
+    def build(self, shlokas: Optional[Iterable[Shloka]] = None, fingerprint: Optional[str] = None) -> None:
+        """Encode the catalog as a TF-IDF matrix (sublinear tf, smoothed idf, L2 rows)."""
+        if not self.is_available():
+            raise RuntimeError("numpy and scipy are required for TF-IDF retrieval")
+
+        if shlokas is None:
+            fingerprint = fingerprint or self.catalog_fingerprint()
+            shlokas = Shloka.objects.prefetch_related('explanations').iterator(chunk_size=500)
+
+        payloads = []
+        books = []
+        doc_terms = []
+        vocabulary: Dict[str, int] = {}
+        for shloka in shlokas:
+            explanations = list(shloka.explanations.all())
+            payload = build_shloka_payload(shloka, explanations[0] if explanations else None)
+            terms = Counter(tokenize(document_text(payload)))
+            for term in terms:
+                vocabulary.setdefault(term, len(vocabulary))
+            payloads.append(payload)
+            books.append(shloka.book_name)
+            doc_terms.append(terms)
+
+        rows, cols, values = [], [], []
+        for row, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                rows.append(row)
+                cols.append(vocabulary[term])
+                values.append(1.0 + np.log(tf))
+
+        shape = (len(payloads), max(len(vocabulary), 1))
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape, dtype=np.float32
+        )
+        df = np.bincount(matrix.indices, minlength=shape[1]).astype(np.float32)
+        idf = (np.log((1.0 + shape[0]) / (1.0 + df)) + 1.0).astype(np.float32)
+        matrix = matrix.multiply(idf).tocsr().astype(np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = sparse.diags((1.0 / norms).astype(np.float32)).dot(matrix).tocsr()
+
+        with self._lock:
+            self._matrix = matrix
+            self._idf = idf
+            self._vocabulary = vocabulary
+            self._payloads = payloads
+            self._books = np.asarray(books, dtype=object)
+            self._positions = self._build_positions()
+            self._fingerprint = fingerprint
+            self._stale = False
+            self._checked_at = time.monotonic()
+        logger.info(f"Built TF-IDF shloka matrix {shape[0]}x{shape[1]} ({matrix.nnz} non-zeros)")
+
+    def save(self) -> None:
+        """
+        Persist the matrix and metadata to ``index_path`` atomically.
+
+        Each writer uses its own temporary file next to the index, so workers
+        saving at the same time never interleave their writes.
+        """
+        with self._lock:
+            matrix, idf = self._matrix, self._idf
+            metadata = {
+                'version': self.FORMAT_VERSION,
+                'fingerprint': self._fingerprint,
+                'vocabulary': self._vocabulary,
+                'payloads': self._payloads,
+                'books': list(self._books) if self._books is not None else [],
+            }
+        if matrix is None:
+            return
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f'.{self.index_path.stem}-', suffix='.tmp.npz', dir=self.index_path.parent
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    data=matrix.data,
+                    indices=matrix.indices,
+                    indptr=matrix.indptr,
+                    shape=np.asarray(matrix.shape),
+                    idf=idf,
+                    metadata=np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8),
+                )
+            os.replace(tmp_path, self.index_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self) -> bool:
+        """Load a persisted matrix; returns False if the file is missing or unreadable."""
+        if not self.is_available() or not self.index_path.exists():
+            return False
+
+        try:
+            with np.load(self.index_path) as stored:
+                metadata = json.loads(stored['metadata'].tobytes().decode('utf-8'))
+                if metadata.get('version') != self.FORMAT_VERSION:
+                    return False
+                matrix = sparse.csr_matrix(
+                    (stored['data'], stored['indices'], stored['indptr']),
+                    shape=tuple(stored['shape']),
+                )
+                idf = stored['idf']
+        except Exception as e:
+            logger.warning(f"Could not load TF-IDF index {self.index_path}: {str(e)}")
+            return False
+
+        with self._lock:
+            self._matrix = matrix
+            self._idf = idf
+            self._vocabulary = metadata['vocabulary']
+            self._payloads = metadata['payloads']
+            self._books = np.asarray(metadata['books'], dtype=object)
+            self._positions = self._build_positions()
+            self._fingerprint = metadata['fingerprint']
+            self._stale = True
+        return True
+
+    def ensure_ready(self) -> None:
+        """Load or (re)build the matrix so that it matches the current catalog."""
+        if self._is_fresh():
+            return
+
+        with self._build_lock:
+            if self._is_fresh():
+                return
+            if self._matrix is None:
+                self.load()
+
+            fingerprint = self.catalog_fingerprint()
+            self._checked_at = time.monotonic()
+            if self._matrix is not None and self._fingerprint == fingerprint:
+                self._stale = False
+                return
+
+            self.build(fingerprint=fingerprint)
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Could not persist TF-IDF index {self.index_path}: {str(e)}")
+
+    def _is_fresh(self) -> bool:
+        """Whether the matrix can be used without re-checking the catalog fingerprint."""
+        return (
+            self._matrix is not None and not self._stale
+            and time.monotonic() - self._checked_at < settings.SHLOKA_INDEX_SYNC_INTERVAL
+        )
+
+    def get(self, book_name: str, chapter_number: int, verse_number: int) -> Optional[Dict]:
+        """Return the payload for a specific verse, or None if it is not indexed."""
+        with self._lock:
+            positions, payloads = self._positions, self._payloads
+        row = positions.get((book_name, chapter_number, verse_number))
+        if row is None:
+            return None
+        return dict(payloads[row])
+
+    def _build_positions(self) -> Dict[tuple, int]:
+        return {
+            (book, payload['chapter'], payload['verse']): row
+            for row, (book, payload) in enumerate(zip(self._books, self._payloads))
+        }
+
+    def search(self, query: str, limit: int = 3, book_name: Optional[str] = None) -> List[Dict]:
+        """
+        Rank shlokas by cosine similarity to the query.
+
+        Returns:
+            Up to ``limit`` payload dicts, best first, each with a ``score`` key
+        """
+        # One consistent build, even if a rebuild is swapped in meanwhile
+        with self._lock:
+            matrix, idf, vocabulary = self._matrix, self._idf, self._vocabulary
+            payloads, books = self._payloads, self._books
+        if matrix is None or limit <= 0:
+            return []
+
+        query_terms = Counter(
+            term for term in tokenize(query) if term in vocabulary
+        )
+        if not query_terms:
+            return []
+
+        query_vector = np.zeros(matrix.shape[1], dtype=np.float32)
+        for term, tf in query_terms.items():
+            column = vocabulary[term]
+            query_vector[column] = (1.0 + np.log(tf)) * idf[column]
+
+        scores = matrix.dot(query_vector)
+        if book_name:
+            scores = np.where(books == book_name, scores, 0.0)
+
+        k = min(limit, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for row in top:
+            if scores[row] <= 0:
+                break
+            payload = dict(payloads[row])
+            payload['score'] = round(float(scores[row]), 4)
+            results.append(payload)
+        return results
+
+
+_tfidf_retriever = None
+_tfidf_retriever_lock = threading.Lock()
+
+
+def get_tfidf_retriever() -> TfidfShlokaRetriever:
+    """Return the process-wide TF-IDF retriever."""
+    global _tfidf_retriever
+    if _tfidf_retriever is None:
+        with _tfidf_retriever_lock:
+            if _tfidf_retriever is None:
+                _tfidf_retriever = TfidfShlokaRetriever()
+    return _tfidf_retriever
@@ -0,0 +1,97 @@
+"""
+Token estimation and prompt budget allocation.
+
+Prompts are measured before the LLM call and trimmed to a configured budget,
+so oversized context is cut deliberately (lowest priority first) instead of
+failing the request and retrying without it.
+"""
+from typing import Dict, List, Sequence
+import math
+import re
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+# Devanagari and other non-Latin scripts tokenize far less efficiently
+NON_ASCII_CHARS_PER_TOKEN = 1.5
+
+# Per-message overhead of the chat completion format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_MARKER = '...'
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in ``text`` without a tokenizer."""
+    if not text:
+        return 0
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    ascii_chars = len(text) - non_ascii
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN + non_ascii / NON_ASCII_CHARS_PER_TOKEN)
+
+
+def estimate_messages_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    """Estimate the prompt size of a list of chat completion messages."""
+    return sum(estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` at a word boundary so it fits in ``max_tokens``."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= estimate_tokens(TRUNCATION_MARKER):
+        return ''
+
+    # Binary search the longest prefix that fits, then back off to a word boundary
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid] + TRUNCATION_MARKER) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+
+    prefix = text[:low]
+    if ' ' in prefix:
+        prefix = prefix.rsplit(' ', 1)[0]
+    return prefix.rstrip() + TRUNCATION_MARKER
+
+
+def allocate_budget(sections: Sequence[str], budget: int) -> List[str]:
+    """
+    Fit text sections into a token budget in priority order.
+
+    Sections are given highest priority first. Each one is kept whole while it
+    fits; the first that does not is truncated to the remaining budget and all
+    lower-priority sections are dropped (returned as empty strings).
+
+    Returns:
+        List of (possibly trimmed) sections, same length and order as the input
+    """
+    remaining = max(budget, 0)
+    allocated = []
+    for section in sections:
+        tokens = estimate_tokens(section)
+        if tokens <= remaining:
+            allocated.append(section)
+            remaining -= tokens
+        else:
+            allocated.append(truncate_to_tokens(section, remaining))
+            remaining = 0
+    return allocated
+
+
+def trim_history(history: Sequence[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """Keep the most recent messages whose combined size fits in ``budget``."""
+    kept = []
+    remaining = budget
+    for message in reversed(history):
+        tokens = estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+        if tokens > remaining:
+            break
+        kept.append(message)
+        remaining -= tokens
+    kept.reverse()
+    return kept
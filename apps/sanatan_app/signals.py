@@ -0,0 +1,65 @@
+"""Signal handlers for Sanatan App."""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import ReadingLog, Shloka, ShlokaExplanation
+from .services.chatbot_service import ChatbotService
+from .services.retrieval_cards import CARD_SOURCE_FIELDS, build_retrieval_card
+from .services.shloka_search_index import get_shloka_search_index
+from .services.tfidf_retrieval import get_tfidf_retriever
+
+
+def _reindex_shloka(shloka_id) -> None:
+    """Refresh a single shloka in the search indexes after the write commits."""
+    get_tfidf_retriever().invalidate()
+
+    index = get_shloka_search_index()
+    if not index.is_built:
+        return
+
+    shloka = Shloka.objects.filter(id=shloka_id).prefetch_related('explanations').first()
+    if shloka is None:
+        index.remove(shloka_id)
+    else:
+        explanations = list(shloka.explanations.all())
+        index.upsert(shloka, explanations[0] if explanations else None)
+
+
+@receiver(post_save, sender=Shloka)
+@receiver(post_delete, sender=Shloka)
+def update_search_index_for_shloka(sender, instance, **kwargs):
+    """Keep the shloka search index in sync with shloka changes."""
+    shloka_id = instance.id
+    transaction.on_commit(lambda: _reindex_shloka(shloka_id))
+
+
+@receiver(post_save, sender=ShlokaExplanation)
+@receiver(post_delete, sender=ShlokaExplanation)
+def update_search_index_for_explanation(sender, instance, **kwargs):
+    """Keep the shloka search index in sync with explanation changes."""
+    shloka_id = instance.shloka_id
+    transaction.on_commit(lambda: _reindex_shloka(shloka_id))
+
+
+@receiver(pre_save, sender=ShlokaExplanation)
+def refresh_retrieval_card(sender, instance, **kwargs):
+    """Rebuild the explanation's retrieval card from its current content."""
+    instance.retrieval_card = build_retrieval_card(instance)
+
+
+@receiver(post_save, sender=ShlokaExplanation)
+def persist_retrieval_card(sender, instance, update_fields=None, **kwargs):
+    """Write the card when a partial save changed its source fields but not the card itself."""
+    if update_fields is None or 'retrieval_card' in update_fields:
+        return
+    if CARD_SOURCE_FIELDS.intersection(update_fields):
+        ShlokaExplanation.objects.filter(pk=instance.pk).update(retrieval_card=instance.retrieval_card)
+
+
+@receiver(post_save, sender=ReadingLog)
+@receiver(post_delete, sender=ReadingLog)
+def invalidate_reading_context(sender, instance, **kwargs):
+    """Drop the user's cached chatbot reading context once the reading log changes."""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: ChatbotService.invalidate_conversation_context(user_id))
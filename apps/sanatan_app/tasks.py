@@ -856,7 +856,8 @@ def create_missing_shlokas_with_explanations(
     chapter_number: Optional[int] = None,
     chapters: Optional[list] = None,
     batch_size: int = 50,
-    max_verses_per_chapter: Optional[int] = None
+    max_verses_per_chapter: Optional[int] = None,
+    max_concurrent_explanations: Optional[int] = None
 ) -> Dict:
     """
     Celery task to check for missing shlokas and create them with explanations.
@@ -866,7 +867,7 @@ def create_missing_shlokas_with_explanations(
     2. Extracts all shlokas from each chapter using AI
     3. Identifies which shlokas are missing from the database
     4. Creates missing shlokas in batches of 50
-    5. Creates explanations for newly created shlokas
+    5. Creates explanations for each batch's new shlokas, several generations at a time
     6. Runs quality checks on the explanations
     
     Args:
@@ -876,6 +877,7 @@ def create_missing_shlokas_with_explanations(
                  If both chapter_number and chapters are None, processes all chapters (1-18)
         batch_size: Number of verses to process at a time (default: 50)
         max_verses_per_chapter: Maximum number of verses to process per chapter (None = all missing)
+        max_concurrent_explanations: Explanations generated at once (None = EXPLANATION_GENERATION_CONCURRENCY)
         
     Returns:
         Dictionary with task results:
@@ -908,13 +910,12 @@ def create_missing_shlokas_with_explanations(
     
     try:
         from apps.sanatan_app.models import Shloka, ShlokaExplanation
-        from apps.sanatan_app.services.shloka_service import ShlokaService
-        from apps.sanatan_app.services.book_context_service import BookContextService
-        from django.db import transaction
+        from apps.sanatan_app.services.shloka_service import CleanedPageLines, ShlokaService
+        from apps.sanatan_app.services.book_context_service import get_book_context_service
         import time
         
         shloka_service = ShlokaService()
-        book_context_service = BookContextService()
+        book_context_service = get_book_context_service()
         
         # Step 1: Load PDF
         logger.info(f"[Task {task_id}] Step 1: Loading PDF...")
@@ -929,8 +930,8 @@ def create_missing_shlokas_with_explanations(
                 'message': error_msg
             }
         
-        pdf_reader = book_context_service._load_pdf(book_context_service.english_book_path)
-        if not pdf_reader:
+        page_store = book_context_service.get_store(book_context_service.english_book_path, build=True)
+        if not page_store:
             error_msg = "Failed to load PDF"
             logger.error(f"[Task {task_id}] {error_msg}")
             return {
@@ -940,7 +941,7 @@ def create_missing_shlokas_with_explanations(
                 'message': error_msg
             }
         
-        total_pages = len(pdf_reader.pages)
+        total_pages = page_store.page_count
         
         # Aggregate results across all chapters
         total_missing_all = 0
@@ -958,37 +959,20 @@ def create_missing_shlokas_with_explanations(
             logger.info(f"[Task {task_id}] ========================================")
             
             try:
-                # Find chapter start page
-                chapter_start_page = None
+                # Locate the chapter in the book's chapter index
+                chapter_pages = page_store.chapter_range(chapter_number)
+                if chapter_pages is not None:
+                    start_page, end_page = chapter_pages
+                    logger.info(f"[Task {task_id}] Found Chapter {chapter_number} at page {start_page}")
+                else:
+                    start_page = (chapter_number - 1) * 15
+                    end_page = min(start_page + 25, total_pages)
+                    logger.warning(f"[Task {task_id}] Could not find chapter start page, using estimated page {start_page}")
                 
-                # Search for chapter marker
-                for page_num in range(max(0, (chapter_number - 1) * 15 - 10), min((chapter_number - 1) * 15 + 30, total_pages)):
-                    try:
-                        page = pdf_reader.pages[page_num]
-                        page_text = page.extract_text()
-                        if page_text and (f'Chapter {chapter_number}' in page_text or f'CHAPTER {chapter_number}' in page_text):
-                            # Check if it's actual content (has Devanagari or VERSE)
-                            has_devanagari = any(0x0900 <= ord(c) <= 0x097F for c in page_text)
-                            has_verse = 'VERSE' in page_text or 'verse' in page_text.lower()
-                            if has_devanagari or has_verse:
-                                chapter_start_page = page_num
-                                logger.info(f"[Task {task_id}] Found Chapter {chapter_number} at page {page_num}")
-                                break
-                    except:
-                        continue
+                # Chapter text is read and cleaned a page at a time while verses are split
+                chapter_lines = CleanedPageLines(page_store, start_page, end_page)
                 
-                if chapter_start_page is None:
-                    chapter_start_page = (chapter_number - 1) * 15
-                    logger.warning(f"[Task {task_id}] Could not find chapter start page, using estimated page {chapter_start_page}")
-                
-                # Extract chapter text
-                start_page = chapter_start_page
-                end_page = min(chapter_start_page + 25, total_pages)
-                raw_chapter_text = book_context_service._extract_text_from_pdf(
-                    pdf_reader, (start_page, end_page)
-                )
-                
-                if not raw_chapter_text:
+                if not chapter_lines.has_text():
                     logger.warning(f"[Task {task_id}] No text extracted from Chapter {chapter_number}, skipping")
                     chapter_results[chapter_number] = {
                         'success': False,
@@ -998,13 +982,12 @@ def create_missing_shlokas_with_explanations(
                     }
                     continue
                 
-                chapter_text = shloka_service._clean_pdf_text(raw_chapter_text)
-                logger.info(f"[Task {task_id}] Extracted {len(chapter_text)} characters from Chapter {chapter_number}")
+                logger.info(f"[Task {task_id}] Reading Chapter {chapter_number} from pages {start_page}-{end_page}")
                 
                 # Extract all shlokas from chapter using AI
                 logger.info(f"[Task {task_id}] Extracting shlokas from Chapter {chapter_number} using AI...")
                 all_shlokas_data = shloka_service._extract_shlokas_with_ai(
-                    chapter_text, chapter_number, max_shlokas=200  # Large number to get all
+                    chapter_lines, chapter_number, max_shlokas=200  # Large number to get all
                 )
                 
                 if not all_shlokas_data:
@@ -1070,6 +1053,7 @@ def create_missing_shlokas_with_explanations(
                         f"verses {batch_start + 1}-{batch_end} ({len(batch)} shlokas)"
                     )
                     
+                    created_shlokas = []
                     for shloka_data in batch:
                         try:
                             verse_num = shloka_data.get('verse_number')
@@ -1112,49 +1096,45 @@ def create_missing_shlokas_with_explanations(
                                 transliteration_value = cleaned_transliteration.strip()
                             
                             # Create shloka
-                            with transaction.atomic():
-                                shloka, created = Shloka.objects.get_or_create(
-                                    book_name=book_name,
-                                    chapter_number=chapter_num_extracted,
-                                    verse_number=verse_num,
-                                    defaults={
-                                        'sanskrit_text': cleaned_sanskrit.strip(),
-                                        'transliteration': transliteration_value,
-                                    }
-                                )
-                                
-                                if created:
-                                    chapter_created_shlokas += 1
-                                    logger.info(f"[Task {task_id}] Created shloka: Chapter {chapter_num_extracted}, Verse {verse_num}")
-                                    
-                                    # Create explanation
-                                    try:
-                                        explanation = shloka_service.generate_and_store_explanation(shloka)
-                                        if explanation:
-                                            chapter_created_explanations += 1
-                                            logger.info(f"[Task {task_id}] Created explanation for Chapter {chapter_num_extracted}, Verse {verse_num}")
-                                            
-                                            # Queue quality check task
-                                            quality_task = check_shloka_quality.delay(str(shloka.id))
-                                            chapter_quality_task_ids.append(quality_task.id)
-                                            chapter_quality_checked += 1
-                                        else:
-                                            logger.warning(f"[Task {task_id}] Failed to create explanation for Chapter {chapter_number}, Verse {verse_num}")
-                                            chapter_errors += 1
-                                    except Exception as e:
-                                        logger.error(f"[Task {task_id}] Error creating explanation: {str(e)}")
-                                        chapter_errors += 1
-                                else:
-                                    logger.debug(f"[Task {task_id}] Shloka already exists: Chapter {chapter_num_extracted}, Verse {verse_num}")
+                            shloka, created = Shloka.objects.get_or_create(
+                                book_name=book_name,
+                                chapter_number=chapter_num_extracted,
+                                verse_number=verse_num,
+                                defaults={
+                                    'sanskrit_text': cleaned_sanskrit.strip(),
+                                    'transliteration': transliteration_value,
+                                }
+                            )
                             
-                            # Small delay to avoid rate limiting
-                            time.sleep(0.5)
+                            if created:
+                                chapter_created_shlokas += 1
+                                created_shlokas.append(shloka)
+                                logger.info(f"[Task {task_id}] Created shloka: Chapter {chapter_num_extracted}, Verse {verse_num}")
+                            else:
+                                logger.debug(f"[Task {task_id}] Shloka already exists: Chapter {chapter_num_extracted}, Verse {verse_num}")
                             
                         except Exception as e:
                             logger.error(f"[Task {task_id}] Error processing shloka: {str(e)}", exc_info=True)
                             chapter_errors += 1
                             continue
                     
+                    # Create the batch's explanations concurrently (the LLM gateway enforces the rate limit)
+                    explanations = shloka_service.generate_and_store_explanations(
+                        created_shlokas, max_workers=max_concurrent_explanations
+                    )
+                    for shloka in created_shlokas:
+                        if shloka.id in explanations:
+                            chapter_created_explanations += 1
+                            logger.info(f"[Task {task_id}] Created explanation for Chapter {shloka.chapter_number}, Verse {shloka.verse_number}")
+                            
+                            # Queue quality check task
+                            quality_task = check_shloka_quality.delay(str(shloka.id))
+                            chapter_quality_task_ids.append(quality_task.id)
+                            chapter_quality_checked += 1
+                        else:
+                            logger.warning(f"[Task {task_id}] Failed to create explanation for Chapter {shloka.chapter_number}, Verse {shloka.verse_number}")
+                            chapter_errors += 1
+                    
                     # Delay between batches
                     if batch_end < len(missing_shlokas):
                         logger.info(f"[Task {task_id}] Waiting 5 seconds before next batch...")
@@ -1246,3 +1226,138 @@ def create_missing_shlokas_with_explanations(
                 'message': f'Task failed after {retry_count} retries: {str(exc)}'
             }
 
+
+
+@shared_task(
+    name='sanatan_app.generate_chat_response',
+    bind=True,
+    max_retries=2,
+    default_retry_delay=5,
+    soft_time_limit=120,
+    time_limit=150,
+)
+def generate_chat_response(self, conversation_id: str, user_message: str) -> Dict:
+    """
+    Celery task to generate the assistant reply for a queued chat turn.
+    
+    ChatMessageView only saves a new conversation; this task generates the
+    reply with ChatbotService and persists the whole turn (user and assistant
+    messages) in one transaction, so web workers never block on LLM latency.
+    
+    Args:
+        conversation_id: UUID of the ChatConversation
+        user_message: The user's message text
+        
+    Returns:
+        Dictionary with task results:
+        - success: bool
+        - conversation_id: str
+        - user_id: str (owner of the conversation, used for access checks)
+        - user_message_id: str (the saved user message)
+        - message_id: str (the saved assistant message)
+        - response: str
+    """
+    task_id = self.request.id
+    logger.info(f"[Chat Task {task_id}] Generating response for conversation {conversation_id}")
+    
+    from apps.sanatan_app.models import ChatConversation
+    from apps.sanatan_app.services.chatbot_service import ChatbotService
+    
+    try:
+        conversation = ChatConversation.objects.select_related('user').get(id=conversation_id)
+    except ChatConversation.DoesNotExist:
+        error_msg = f"Conversation with id {conversation_id} not found"
+        logger.error(f"[Chat Task {task_id}] {error_msg}")
+        return {
+            'success': False,
+            'conversation_id': conversation_id,
+            'error': error_msg,
+            'message': error_msg
+        }
+    
+    chatbot_service = ChatbotService()
+    history = chatbot_service.get_history(conversation)
+    
+    try:
+        ai_response = chatbot_service.generate_response(
+            user_message,
+            history,
+            conversation.user,
+            conversation.summary
+        )
+    except Exception as exc:
+        if self.request.retries < self.max_retries:
+            logger.warning(
+                f"[Chat Task {task_id}] Retrying (attempt {self.request.retries + 1}/{self.max_retries}): {str(exc)}"
+            )
+            raise self.retry(exc=exc, countdown=self.default_retry_delay * (2 ** self.request.retries))
+        logger.error(f"[Chat Task {task_id}] Failed to generate response: {str(exc)}")
+        return {
+            'success': False,
+            'conversation_id': conversation_id,
+            'user_id': str(conversation.user_id),
+            'error': str(exc),
+            'message': f'Failed to generate response: {str(exc)}'
+        }
+    
+    user_msg, assistant_message = chatbot_service.save_turn(conversation, user_message, ai_response)
+    chatbot_service.schedule_summary_refresh(conversation)
+    
+    logger.info(f"[Chat Task {task_id}] Saved assistant message {assistant_message.id}")
+    return {
+        'success': True,
+        'conversation_id': conversation_id,
+        'user_id': str(conversation.user_id),
+        'user_message_id': str(user_msg.id),
+        'message_id': str(assistant_message.id),
+        'response': ai_response
+    }
+
+
+@shared_task(
+    name='sanatan_app.summarize_chat_conversation',
+    bind=True,
+    max_retries=2,
+    default_retry_delay=30,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+)
+def summarize_chat_conversation(self, conversation_id: str) -> Dict:
+    """
+    Celery task to refresh the rolling summary of a chat conversation.
+    
+    Folds messages that have scrolled out of the prompt history window into
+    ChatConversation.summary so prompt size stays constant for long chats.
+    
+    Args:
+        conversation_id: UUID of the ChatConversation
+        
+    Returns:
+        Dictionary with task results:
+        - success: bool
+        - conversation_id: str
+        - updated: bool
+        - summary_message_count: int
+    """
+    from apps.sanatan_app.models import ChatConversation
+    from apps.sanatan_app.services.chatbot_service import ChatbotService
+    
+    try:
+        conversation = ChatConversation.objects.get(id=conversation_id)
+    except ChatConversation.DoesNotExist:
+        error_msg = f"Conversation with id {conversation_id} not found"
+        logger.error(f"[Summary Task {self.request.id}] {error_msg}")
+        return {
+            'success': False,
+            'conversation_id': conversation_id,
+            'error': error_msg,
+            'message': error_msg
+        }
+    
+    updated = ChatbotService().summarize_conversation(conversation)
+    return {
+        'success': True,
+        'conversation_id': conversation_id,
+        'updated': updated,
+        'summary_message_count': conversation.summary_message_count
+    }
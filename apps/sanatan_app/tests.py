@@ -1,7 +1,11 @@
 """
 Comprehensive test suite for Sanatan App.
 """
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import AsyncClient, TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -9,13 +13,50 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from .models import (
     User, Shloka, ShlokaExplanation, ReadingLog, ReadingType,
     Favorite, Achievement, UserAchievement, ChatConversation, ChatMessage,
-    UserStreak, ShlokaReadStatus
+    UserStreak, ShlokaReadStatus, LLMResponseCacheEntry
 )
 from .services.stats_service import StatsService
 from .services.achievement_service import AchievementService
 from .services.chatbot_service import ChatbotService
+from .services.shloka_search_index import ShlokaSearchIndex, get_shloka_search_index
+from .services.tfidf_retrieval import TfidfShlokaRetriever
+from .services.book_context_service import (
+    BookContextService, ChapterTextCache, get_book_context_service
+)
+from .services.book_text_store import BookTextStore, find_verse_offsets, map_pages_file
+from .services.marker_scanner import first_chapter_mentioned, scan_markers
+from .services.shloka_service import CleanedPageLines, ShlokaService
+from .management.commands.benchmark_book_text import (
+    Command as BenchmarkBookTextCommand, add_pdf_noise, legacy_clean_pdf_text
+)
+from .services.response_cache import response_cache
+from .services.llm_response_cache import llm_response_cache
+from .services.improvement_service import ImprovementService
+from .services.quality_checker import QualityCheckerService
+from .services.llm_limiter import LLMConcurrencyLimitExceeded, llm_limiter
+from .services.llm_gateway import LLMGateway, LLMRateLimitExceeded, llm_gateway
+from .services.retrieval_cards import CHARS_PER_TOKEN, build_retrieval_card
+from .services.token_budget import (
+    allocate_budget, estimate_messages_tokens, estimate_tokens, trim_history
+)
+from .groq_service import GroqService
+from django.core.cache import cache
+from django.core.management import call_command
 from django.utils import timezone
+from django.test import override_settings
 from datetime import timedelta
+from io import StringIO
+import asyncio
+from pathlib import Path
+import groq
+import httpx
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 import uuid
 
 
@@ -411,21 +452,72 @@ class ChatbotTests(BaseTestCase):
         self.assertEqual(len(response.data['data']), 1)
         self.assertEqual(response.data['data'][0]['id'], str(conversation.id))
     
+    def test_list_conversations_is_paginated_and_annotated(self):
+        """Test the lightweight list: counts, last-message preview, no nested messages, constant queries."""
+        for i in range(3):
+            conversation = ChatConversation.objects.create(user=self.user, title=f"Conversation {i}")
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"Question {i}")
+            ChatMessage.objects.create(conversation=conversation, role='assistant', content="A" * 300)
+        
+        url = reverse('chat-conversations')
+        with self.assertNumQueries(3):  # auth user lookup, count, page
+            response = self.client.get(url, {'page_size': 2})
+        data = response.data['data']
+        self.assertEqual(len(data['conversations']), 2)
+        self.assertEqual(data['pagination'], {'page': 1, 'page_size': 2, 'count': 3, 'has_next': True})
+        
+        item = data['conversations'][0]
+        self.assertNotIn('messages', item)
+        self.assertEqual(item['message_count'], 2)
+        self.assertEqual(item['last_message_role'], 'assistant')
+        self.assertEqual(len(item['last_message_preview']), ChatbotService.LAST_MESSAGE_PREVIEW_LENGTH)
+        
+        response = self.client.get(url, {'page_size': 2, 'page': 2})
+        self.assertEqual(len(response.data['data']['conversations']), 1)
+        self.assertFalse(response.data['data']['pagination']['has_next'])
+    
+    def test_list_conversation_messages(self):
+        """Test paginated per-conversation messages, most recent page first."""
+        conversation = ChatConversation.objects.create(user=self.user)
+        for i in range(5):
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"message {i}")
+        
+        url = reverse('chat-conversation-messages', kwargs={'conversation_id': conversation.id})
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['content'] for m in response.data['data']['messages']], ["message 3", "message 4"])
+        self.assertEqual(response.data['data']['pagination']['count'], 5)
+        
+        other_user = User.objects.create(name="Other", email="other@example.com")
+        other_conversation = ChatConversation.objects.create(user=other_user)
+        url = reverse('chat-conversation-messages', kwargs={'conversation_id': other_conversation.id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+    
+    def setUp(self):
+        super().setUp()
+        # Answer every chat completion locally so no test reaches Groq
+        completion = mock.Mock()
+        completion.choices = [mock.Mock(message=mock.Mock(content="Do your duty without attachment."))]
+        patcher = mock.patch.object(llm_gateway, 'chat_completion', return_value=completion)
+        self.mock_completion = patcher.start()
+        self.addCleanup(patcher.stop)
+        async_patcher = mock.patch.object(llm_gateway, 'achat_completion', new_callable=mock.AsyncMock, return_value=completion)
+        async_patcher.start()
+        self.addCleanup(async_patcher.stop)
+    
     def test_create_conversation_via_message(self):
         """Test creating conversation by sending a message."""
         url = reverse('chat-message')
         data = {
             'message': 'What is the Bhagavad Gita?'
         }
-        # Mock the chatbot service to avoid actual API calls in tests
-        # In real tests, you'd use mocking
         response = self.client.post(url, data, format='json')
-        # This might fail if GROQ_API_KEY is not set, but structure should be correct
-        # In production, you'd mock the ChatbotService
-        self.assertIn(response.status_code, [
-            status.HTTP_200_OK,
-            status.HTTP_500_INTERNAL_SERVER_ERROR  # If API key missing
-        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['response'], "Do your duty without attachment.")
+        conversation = ChatConversation.objects.get(user=self.user)
+        self.assertEqual(response.data['data']['conversation']['id'], str(conversation.id))
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(self.mock_completion.call_count, 1)
     
     def test_send_message_to_existing_conversation(self):
         """Test sending message to existing conversation."""
@@ -437,11 +529,1648 @@ class ChatbotTests(BaseTestCase):
             'conversation_id': str(conversation.id)
         }
         response = self.client.post(url, data, format='json')
-        # Similar to above - might fail without API key
-        self.assertIn(response.status_code, [
-            status.HTTP_200_OK,
-            status.HTTP_500_INTERNAL_SERVER_ERROR
-        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [m['content'] for m in response.data['data']['conversation']['messages']],
+            ['Tell me more', "Do your duty without attachment."]
+        )
+        self.assertEqual(conversation.messages.count(), 2)
+
+
+class ChatStreamingTests(BaseTestCase):
+    """Test server-sent event streaming of chat responses."""
+    
+    def _parse_events(self, response):
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for block in body.strip().split('\n\n'):
+            event_line, data_line = block.split('\n')
+            events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+        return events
+    
+    @mock.patch.object(ChatbotService, 'stream_response', return_value=iter(["Dear friend, ", "do your duty."]))
+    def test_stream_message(self, mock_stream):
+        """Test that tokens are streamed and the assistant message is saved at the end."""
+        url = reverse('chat-message')
+        response = self.client.post(url, {'message': 'How do I handle stress?', 'stream': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        events = self._parse_events(response)
+        self.assertEqual([name for name, _ in events], ['conversation', 'token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['response'], "Dear friend, do your duty.")
+        self.assertEqual(len(events[-1][1]['conversation']['messages']), 2)
+        
+        conversation = ChatConversation.objects.get(id=events[0][1]['conversation_id'])
+        self.assertEqual(
+            list(conversation.messages.values_list('role', 'content')),
+            [('user', 'How do I handle stress?'), ('assistant', "Dear friend, do your duty.")]
+        )
+    
+    @mock.patch.object(ChatbotService, 'stream_response', side_effect=Exception("LLM unavailable"))
+    def test_stream_message_error(self, mock_stream):
+        """Test that a failed stream ends with an error event and no assistant message."""
+        url = reverse('chat-message')
+        response = self.client.post(url, {'message': 'Hello', 'stream': True}, format='json')
+        events = self._parse_events(response)
+        self.assertEqual(events[-1][0], 'error')
+        self.assertFalse(ChatMessage.objects.filter(role='assistant').exists())
+        # The conversation ID sent in the first event stays valid
+        conversation = ChatConversation.objects.get(id=events[0][1]['conversation_id'], user=self.user)
+        self.assertEqual(conversation.title, 'Hello')
+
+
+class ChatASGIStreamingTests(BaseTestCase):
+    """Test that streamed chat responses are sent incrementally by the ASGI handler."""
+    
+    def setUp(self):
+        super().setUp()
+        # Like the test client: keep the test transaction's connection open across requests
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+    
+    async def _post(self, path, payload, send):
+        body = json.dumps(payload).encode('utf-8')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode('utf-8'),
+            'query_string': b'', 'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('ascii')),
+                (b'authorization', f'Bearer {self.access_token}'.encode('ascii')),
+            ],
+        }
+        requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        
+        async def receive():
+            if requests:
+                return requests.pop(0)
+            return await asyncio.Future()  # No disconnect while the response is sent
+        
+        await ASGIHandler()(scope, receive, send)
+    
+    async def test_tokens_are_sent_before_generation_finishes(self):
+        """Test that the first token event is sent before the second chunk is generated."""
+        sent = []
+        tokens_sent_before_second_chunk = []
+        
+        async def send(message):
+            sent.append(message)
+        
+        async def fake_stream(*args, **kwargs):
+            yield "Dear friend, "
+            tokens_sent_before_second_chunk.append(
+                sum(b'event: token' in message.get('body', b'') for message in sent)
+            )
+            yield "do your duty."
+        
+        with mock.patch.object(ChatbotService, 'astream_response', side_effect=fake_stream):
+            await self._post(reverse('chat-message'), {'message': 'How do I handle stress?', 'stream': True}, send)
+        
+        self.assertEqual(sent[0]['status'], status.HTTP_200_OK)
+        self.assertEqual(tokens_sent_before_second_chunk, [1])
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode('utf-8')
+        self.assertIn('event: done', body)
+        self.assertTrue(await ChatMessage.objects.filter(role='assistant', content="Dear friend, do your duty.").aexists())
+
+
+class AsyncChatMessageTests(BaseTestCase):
+    """Test the async (ASGI) chat message endpoint."""
+    
+    def setUp(self):
+        super().setUp()
+        self.async_client = AsyncClient()
+        self.auth_headers = {'Authorization': f'Bearer {self.access_token}'}
+        self.url = reverse('chat-message-async')
+    
+    @mock.patch.object(ChatbotService, 'agenerate_response', new_callable=mock.AsyncMock, return_value="Dear friend, rest.")
+    async def test_async_send_message(self, mock_generate):
+        """Test that a turn is generated and persisted through the async path."""
+        response = await self.async_client.post(
+            self.url, {'message': 'I feel anxious'}, content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(data['response'], "Dear friend, rest.")
+        self.assertEqual([m['role'] for m in data['conversation']['messages']], ['user', 'assistant'])
+        mock_generate.assert_awaited_once()
+        
+        response = await self.async_client.post(
+            f"{self.url}?turn_only=true", {'message': 'Still anxious', 'conversation_id': data['conversation']['id']},
+            content_type='application/json', headers=self.auth_headers
+        )
+        data = response.json()['data']
+        self.assertEqual([m['content'] for m in data['messages']], ['Still anxious', "Dear friend, rest."])
+        self.assertNotIn('messages', data['conversation'])
+    
+    async def test_async_requires_auth(self):
+        """Test that the async endpoint rejects missing credentials."""
+        response = await self.async_client.post(self.url, {'message': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    async def test_async_validation_and_not_found(self):
+        """Test validation errors and unknown conversations."""
+        response = await self.async_client.post(
+            self.url, {}, content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = await self.async_client.post(
+            self.url, {'message': 'Hi', 'conversation_id': str(uuid.uuid4())},
+            content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChatTurnPersistenceTests(BaseTestCase):
+    """Test atomic persistence of chat turns."""
+    
+    def setUp(self):
+        super().setUp()
+        self.chatbot_service = ChatbotService()
+    
+    def test_save_turn_on_existing_conversation(self):
+        """Test one conversation update and one bulk insert per turn."""
+        conversation = ChatConversation.objects.create(user=self.user)
+        updated_at = conversation.updated_at
+        
+        with self.assertNumQueries(4):  # savepoint, conversation UPDATE, messages INSERT, release
+            user_msg, assistant_msg = self.chatbot_service.save_turn(
+                conversation, "How do I stay calm\nbefore exams?", "Breathe, dear friend."
+            )
+        
+        conversation.refresh_from_db()
+        self.assertGreater(conversation.updated_at, updated_at)
+        self.assertEqual(conversation.title, "How do I stay calm")
+        self.assertEqual(
+            list(conversation.messages.values_list('role', 'content')),
+            [('user', "How do I stay calm\nbefore exams?"), ('assistant', "Breathe, dear friend.")]
+        )
+        
+        # An existing title is kept
+        self.chatbot_service.save_turn(conversation, "Another question", "Another answer")
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.title, "How do I stay calm")
+    
+    @mock.patch.object(ChatbotService, 'generate_response', return_value="Do your duty.")
+    def test_new_conversation_is_saved_with_first_turn(self, mock_generate):
+        """Test that a new conversation and its first turn are created together."""
+        long_message = "Why " + "very " * 30 + "long question?"
+        response = self.client.post(reverse('chat-message'), {'message': long_message}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        conversation = ChatConversation.objects.get(user=self.user)
+        self.assertEqual(len(conversation.title), ChatbotService.TITLE_MAX_LENGTH)
+        self.assertEqual(list(conversation.messages.values_list('role', flat=True)), ['user', 'assistant'])
+        self.assertEqual(mock_generate.call_args[0][1], [])
+    
+    @mock.patch.object(ChatbotService, 'generate_response', return_value="Keep practising.")
+    def test_response_keeps_the_legacy_shape(self, mock_generate):
+        """Test that by default the reply carries the whole conversation with its messages."""
+        conversation = ChatConversation.objects.create(user=self.user, title="Exams")
+        for i in range(6):
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"old message {i}")
+        
+        response = self.client.post(
+            reverse('chat-message'), {'message': 'And now?', 'conversation_id': str(conversation.id)}, format='json'
+        )
+        data = response.data['data']
+        self.assertEqual(set(data), {'conversation', 'response'})
+        self.assertEqual(set(data['conversation']), {'id', 'title', 'created_at', 'updated_at', 'messages'})
+        self.assertEqual(
+            [m['content'] for m in data['conversation']['messages']],
+            [f"old message {i}" for i in range(6)] + ['And now?', "Keep practising."]
+        )
+        self.assertEqual(data['response'], "Keep practising.")
+    
+    @mock.patch.object(ChatbotService, 'generate_response', return_value="Keep practising.")
+    def test_response_carries_only_the_new_turn(self, mock_generate):
+        """Test that with turn_only the reply returns conversation metadata and the turn's messages."""
+        conversation = ChatConversation.objects.create(user=self.user, title="Exams")
+        for i in range(6):
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"old message {i}")
+        
+        response = self.client.post(
+            f"{reverse('chat-message')}?turn_only=true",
+            {'message': 'And now?', 'conversation_id': str(conversation.id)}, format='json'
+        )
+        data = response.data['data']
+        self.assertEqual(set(data['conversation']), {'id', 'title', 'created_at', 'updated_at'})
+        self.assertEqual(
+            [(m['role'], m['content']) for m in data['messages']],
+            [('user', 'And now?'), ('assistant', "Keep practising.")]
+        )
+    
+    @mock.patch.object(ChatbotService, 'generate_response', side_effect=Exception("LLM unavailable"))
+    def test_failed_turn_leaves_nothing_behind(self, mock_generate):
+        """Test that a failed generation creates neither a conversation nor messages."""
+        response = self.client.post(reverse('chat-message'), {'message': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(ChatConversation.objects.filter(user=self.user).exists())
+        self.assertFalse(ChatMessage.objects.exists())
+
+
+@override_settings(CHAT_GENERATION_MODE='celery')
+class ChatJobTests(BaseTestCase):
+    """Test Celery-backed chat generation jobs."""
+    
+    @mock.patch('apps.sanatan_app.views.generate_chat_response.apply_async')
+    def test_message_is_queued(self, mock_apply_async):
+        """Test that the view saves only the new conversation and returns a job ID without generating."""
+        response = self.client.post(reverse('chat-message'), {'message': 'Guide me'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['data']['job_id']
+        self.assertEqual(ChatbotService.get_job_owner(job_id), str(self.user.id))
+        
+        conversation = ChatConversation.objects.get(id=response.data['data']['conversation_id'])
+        self.assertFalse(conversation.messages.exists())
+        mock_apply_async.assert_called_once_with(args=[str(conversation.id), 'Guide me'], task_id=job_id)
+    
+    @mock.patch.object(ChatbotService, 'generate_response', return_value="Act without attachment.")
+    def test_task_persists_response(self, mock_generate):
+        """Test that the task generates the reply and saves the whole turn."""
+        from .tasks import generate_chat_response
+        conversation = ChatConversation.objects.create(user=self.user)
+        
+        result = generate_chat_response.apply(args=[str(conversation.id), 'Guide me']).get()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['user_id'], str(self.user.id))
+        self.assertEqual(
+            list(conversation.messages.values_list('role', 'content')),
+            [('user', 'Guide me'), ('assistant', "Act without attachment.")]
+        )
+        self.assertEqual(str(conversation.messages.last().id), result['message_id'])
+        self.assertEqual(mock_generate.call_args[0][1], [])
+    
+    def _mock_job(self, ready=True, result=None):
+        job = mock.Mock()
+        job.ready.return_value = ready
+        job.successful.return_value = ready
+        job.result = result
+        return job
+    
+    @mock.patch('apps.sanatan_app.views.AsyncResult')
+    def test_poll_job(self, mock_async_result):
+        """Test pending, completed and foreign job responses."""
+        conversation = ChatConversation.objects.create(user=self.user)
+        job_id = uuid.uuid4()
+        ChatbotService.remember_job_owner(job_id, self.user.id)
+        url = reverse('chat-job', kwargs={'job_id': job_id})
+        
+        mock_async_result.return_value = self._mock_job(ready=False)
+        response = self.client.get(url)
+        self.assertEqual(response.data['data']['status'], 'pending')
+        
+        user_msg, assistant_msg = ChatbotService().save_turn(conversation, 'Guide me', 'Rest, I will take care.')
+        mock_async_result.return_value = self._mock_job(result={
+            'success': True, 'conversation_id': str(conversation.id), 'user_id': str(self.user.id),
+            'user_message_id': str(user_msg.id), 'message_id': str(assistant_msg.id),
+            'response': 'Rest, I will take care.'
+        })
+        response = self.client.get(url)
+        self.assertEqual(response.data['data']['status'], 'completed')
+        self.assertEqual(response.data['data']['response'], 'Rest, I will take care.')
+        self.assertEqual(
+            [m['id'] for m in response.data['data']['conversation']['messages']], [str(user_msg.id), str(assistant_msg.id)]
+        )
+        
+        response = self.client.get(url, {'turn_only': 'true'})
+        self.assertEqual([m['id'] for m in response.data['data']['messages']], [str(user_msg.id), str(assistant_msg.id)])
+        self.assertNotIn('messages', response.data['data']['conversation'])
+        
+        mock_async_result.return_value = self._mock_job(result={
+            'success': True, 'conversation_id': str(conversation.id),
+            'user_id': str(uuid.uuid4()), 'response': 'Not yours'
+        })
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @mock.patch('apps.sanatan_app.views.AsyncResult')
+    def test_failed_job_is_hidden_from_other_users(self, mock_async_result):
+        """Test that ownership is checked before a failed job's outcome, which carries no exception text."""
+        mock_async_result.return_value = self._mock_job(result=Exception("secret database error"))
+        mock_async_result.return_value.successful.return_value = False
+        job_id = uuid.uuid4()
+        url = reverse('chat-job', kwargs={'job_id': job_id})
+        
+        other_user = User.objects.create(name="Other", email="other@example.com")
+        ChatbotService.remember_job_owner(job_id, other_user.id)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        mock_async_result.assert_not_called()
+        
+        ChatbotService.remember_job_owner(job_id, self.user.id)
+        response = self.client.get(url)
+        self.assertEqual(response.data['data']['status'], 'failed')
+        self.assertNotIn("secret database error", json.dumps(response.data))
+
+
+class ChatHistoryWindowTests(BaseTestCase):
+    """Test bounded history reads and rolling conversation summaries."""
+    
+    def setUp(self):
+        super().setUp()
+        self.chatbot_service = ChatbotService()
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        for i in range(25):
+            ChatMessage.objects.create(
+                conversation=self.conversation,
+                role='user' if i % 2 == 0 else 'assistant',
+                content=f"message {i}"
+            )
+    
+    def test_history_window_is_bounded_and_ordered(self):
+        """Test that only the most recent messages are read, oldest first, in one query."""
+        with self.assertNumQueries(1):
+            history = self.chatbot_service.get_conversation_messages(self.conversation, limit=3)
+        self.assertEqual([m['content'] for m in history], ["message 22", "message 23", "message 24"])
+        self.assertEqual(len(self.chatbot_service.get_conversation_messages(self.conversation)), 25)
+    
+    def test_summarize_conversation_covers_messages_outside_window(self):
+        """Test that the summary folds in messages older than the history window."""
+        self.assertTrue(self.chatbot_service.needs_summary_refresh(self.conversation))
+        updated_at = self.conversation.updated_at
+        
+        completion = mock.Mock()
+        completion.choices = [mock.Mock(message=mock.Mock(content=" The devotee is anxious about exams. "))]
+        with mock.patch.object(llm_gateway.client.chat.completions, 'create', return_value=completion) as mock_create:
+            self.assertTrue(self.chatbot_service.summarize_conversation(self.conversation))
+        
+        prompt = mock_create.call_args.kwargs['messages'][1]['content']
+        self.assertIn("message 0", prompt)
+        self.assertIn("message 14", prompt)
+        self.assertNotIn("message 15", prompt)
+        
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "The devotee is anxious about exams.")
+        self.assertEqual(self.conversation.summary_message_count, 15)
+        self.assertEqual(self.conversation.updated_at, updated_at)
+        self.assertFalse(self.chatbot_service.needs_summary_refresh(self.conversation))
+        self.assertFalse(self.chatbot_service.summarize_conversation(self.conversation))
+    
+    def test_unsummarized_messages_outside_window_reach_the_prompt(self):
+        """Test that messages past the window but not yet summarized are still sent to the LLM."""
+        # 25 messages, 15 of them summarized: the window covers 15-24, none is lost
+        self.conversation.summary_message_count = 15
+        self.assertEqual(self.chatbot_service.get_history(self.conversation)[0]['content'], "message 15")
+        
+        # Nothing summarized yet: messages 0-4 have left the window without a refresh being due
+        conversation = ChatConversation.objects.create(user=self.user)
+        for i in range(15):
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"turn {i}")
+        self.assertFalse(self.chatbot_service.needs_summary_refresh(conversation))
+        
+        completion = mock.Mock()
+        completion.choices = [mock.Mock(message=mock.Mock(content="Go on."))]
+        with mock.patch.object(llm_gateway, 'chat_completion', return_value=completion) as mock_completion:
+            response = self.client.post(
+                reverse('chat-message'), {'message': 'Next?', 'conversation_id': str(conversation.id)}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sent = [m['content'] for m in mock_completion.call_args.kwargs['messages'][1:-1]]
+        self.assertEqual(sent, [f"turn {i}" for i in range(15)])
+        
+        # The number of messages sent verbatim stays bounded while a refresh is pending
+        for i in range(15, 40):
+            ChatMessage.objects.create(conversation=conversation, role='user', content=f"turn {i}")
+        self.assertEqual(len(self.chatbot_service.get_history(conversation)), ChatbotService.MAX_HISTORY_MESSAGES)
+    
+    def test_summary_is_included_in_prompt(self):
+        """Test that the rolling summary is added to the system message."""
+        messages = self.chatbot_service.build_messages(
+            "What next?", [], self.user, conversation_summary="Earlier we spoke about exams."
+        )
+        self.assertIn("Earlier we spoke about exams.", messages[0]['content'])
+
+
+class ChatReadingContextTests(BaseTestCase):
+    """Test the cached per-user reading context used in chatbot prompts."""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.chatbot_service = ChatbotService()
+        for verse in range(2, 8):
+            shloka = Shloka.objects.create(
+                book_name="Bhagavad Gita",
+                chapter_number=2,
+                verse_number=verse,
+                sanskrit_text=f"श्लोक {verse}"
+            )
+            ReadingLog.objects.create(user=self.user, shloka=shloka, reading_type=ReadingType.SUMMARY)
+    
+    def test_context_is_built_with_one_query_then_cached(self):
+        """Test that the context costs a single joined query, then none while cached."""
+        with self.assertNumQueries(1):
+            context = self.chatbot_service.get_conversation_context(self.user)
+        self.assertEqual(context.count("- Read Bhagavad Gita"), 5)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(self.chatbot_service.get_conversation_context(self.user), context)
+    
+    def test_new_reading_invalidates_context(self):
+        """Test that logging a reading refreshes the cached context."""
+        self.chatbot_service.get_conversation_context(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            ReadingLog.objects.create(user=self.user, shloka=self.shloka, reading_type=ReadingType.DETAILED)
+        
+        context = self.chatbot_service.get_conversation_context(self.user)
+        self.assertIn("Chapter 1, Verse 1 (detailed)", context)
+
+
+@override_settings(LLM_MAX_CONCURRENT_PER_USER=1, LLM_MAX_CONCURRENT_GLOBAL=2, LLM_RETRY_AFTER_SECONDS=7)
+class LLMConcurrencyLimiterTests(BaseTestCase):
+    """Test per-user and global caps on in-flight LLM calls."""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+    
+    def test_per_user_and_global_limits(self):
+        """Test that slots are capped per user and globally and freed on release."""
+        slot = llm_limiter.acquire(self.user.id)
+        with self.assertRaises(LLMConcurrencyLimitExceeded) as ctx:
+            llm_limiter.acquire(self.user.id)
+        self.assertEqual(ctx.exception.scope, 'user')
+        self.assertEqual(ctx.exception.retry_after, 7)
+        
+        other_slot = llm_limiter.acquire(uuid.uuid4())
+        with self.assertRaises(LLMConcurrencyLimitExceeded) as ctx:
+            llm_limiter.acquire(uuid.uuid4())
+        self.assertEqual(ctx.exception.scope, 'global')
+        
+        slot.release()
+        slot.release()  # Releasing twice is a no-op
+        other_slot.release()
+        self.assertEqual(llm_limiter.in_flight(), 0)
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 0)
+        llm_limiter.acquire(self.user.id).release()
+    
+    @override_settings(LLM_SLOT_TIMEOUT=1)
+    def test_leaked_slot_expires_under_steady_traffic(self):
+        """Test that other acquires never extend a leaked slot's lease."""
+        llm_limiter.acquire(self.user.id)  # Never released, like a killed worker
+        deadline = time.monotonic() + 1.2
+        while time.monotonic() < deadline:
+            llm_limiter.acquire(uuid.uuid4()).release()
+            time.sleep(0.1)
+        self.assertEqual(llm_limiter.in_flight(), 0)
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 0)
+        llm_limiter.acquire(self.user.id).release()
+    
+    def test_chat_over_limit_returns_429_without_saving(self):
+        """Test that an over-limit chat request is rejected before touching the conversation."""
+        with llm_limiter.acquire(self.user.id):
+            response = self.client.post(reverse('chat-message'), {'message': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(response.data['errors']['retry_after'], 7)
+        self.assertFalse(ChatConversation.objects.filter(user=self.user).exists())
+    
+    @mock.patch.object(ChatbotService, 'generate_response', return_value="Do your duty.")
+    def test_chat_releases_slot(self, mock_generate):
+        """Test that the slot is released after a normal and a streamed response."""
+        response = self.client.post(reverse('chat-message'), {'message': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 0)
+        
+        with mock.patch.object(ChatbotService, 'stream_response', return_value=iter(["Hi"])):
+            response = self.client.post(reverse('chat-message'), {'message': 'Hello', 'stream': True}, format='json')
+            self.assertEqual(llm_limiter.in_flight(self.user.id), 1)
+            b''.join(response.streaming_content)
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 0)
+        self.assertEqual(llm_limiter.in_flight(), 0)
+    
+    @mock.patch.object(ChatbotService, 'stream_response', return_value=iter(["Hi"]))
+    def test_abandoned_stream_releases_slot(self, mock_stream):
+        """Test that closing a stream whose body was never iterated releases its slot."""
+        response = self.client.post(reverse('chat-message'), {'message': 'Hello', 'stream': True}, format='json')
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 1)
+        response.close()
+        self.assertEqual(llm_limiter.in_flight(self.user.id), 0)
+        self.assertEqual(llm_limiter.in_flight(), 0)
+        mock_stream.assert_not_called()
+    
+    def test_on_demand_verse_generation_is_limited(self):
+        """Test that generating a missing verse is subject to the limiter."""
+        url = reverse('shloka-by-chapter-verse')
+        with llm_limiter.acquire(self.user.id):
+            response = self.client.get(url, {'book_name': 'Bhagavad Gita', 'chapter': 18, 'verse': 66})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        # Verses already in the database are served without a slot
+        with llm_limiter.acquire(self.user.id):
+            response = self.client.get(url, {'book_name': 'Bhagavad Gita', 'chapter': 1, 'verse': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LLMGatewayTests(BaseTestCase):
+    """Test the shared Groq client, the cross-process quota and retries."""
+
+    MESSAGES = [{"role": "user", "content": "What is dharma?"}]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.completion = mock.Mock()
+        self.completion.choices = [mock.Mock(message=mock.Mock(content="Righteous duty."))]
+        self.completion.usage.total_tokens = 50
+        patcher = mock.patch.object(llm_gateway.client.chat.completions, 'create', return_value=self.completion)
+        self.mock_create = patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep_patcher = mock.patch('apps.sanatan_app.services.llm_gateway.time.sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    @staticmethod
+    def _api_error(error_class, status_code, headers=None):
+        request = httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions')
+        response = httpx.Response(status_code, headers=headers, request=request)
+        return error_class("error", response=response, body=None)
+
+    def test_services_share_one_client(self):
+        """Test that every service goes through the same process-wide client."""
+        self.assertIs(llm_gateway.client, llm_gateway.client)
+        ChatbotService().generate_response("How to deal with stress?", [{"role": "user", "content": "Hi"}], self.user)
+        self.assertEqual(self.mock_create.call_count, 1)
+
+    def test_quota_is_charged_and_settled_to_usage(self):
+        """Test that a call takes one request and its tokens, settled to the reported usage."""
+        response = llm_gateway.chat_completion(messages=self.MESSAGES, model="m", max_tokens=100)
+        self.assertIs(response, self.completion)
+        self.assertEqual(llm_gateway.requests_used(), 1)
+        self.assertEqual(llm_gateway.tokens_used(), 50)
+
+        llm_gateway.chat_completion(messages=self.MESSAGES, model="m", max_tokens=100, stream=True)
+        # Streams report no usage, so the completion allowance stays charged
+        self.assertEqual(llm_gateway.tokens_used(), 50 + llm_gateway.estimate_cost(self.MESSAGES, {}) + 100)
+
+    @override_settings(LLM_RATE_LIMIT_RPM=1, LLM_RATE_LIMIT_MAX_WAIT=0)
+    def test_exhausted_quota_raises(self):
+        """Test that a call over the per-minute quota fails instead of reaching Groq."""
+        llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        with self.assertRaises(LLMRateLimitExceeded) as ctx:
+            llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertGreater(ctx.exception.retry_after, 0)
+        self.assertEqual(self.mock_create.call_count, 1)
+        self.assertEqual(llm_gateway.requests_used(), 1)
+
+    def test_rate_limited_call_honours_retry_after(self):
+        """Test that a 429 is retried after its retry-after delay and pauses other workers."""
+        self.mock_create.side_effect = [
+            self._api_error(groq.RateLimitError, 429, {'retry-after': '2'}),
+            self.completion,
+        ]
+        response = llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertIs(response, self.completion)
+        self.mock_sleep.assert_any_call(2.0)
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.assertGreater(cache.get(LLMGateway.COOLDOWN_KEY), 0)
+
+    @override_settings(LLM_MAX_RETRIES=1)
+    def test_retries_are_bounded(self):
+        """Test that server errors back off and give up after LLM_MAX_RETRIES retries."""
+        self.mock_create.side_effect = self._api_error(groq.InternalServerError, 503)
+        with self.assertRaises(groq.InternalServerError):
+            llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.assertEqual(self.mock_sleep.call_count, 1)
+
+        self.mock_create.side_effect = self._api_error(groq.BadRequestError, 400)
+        with self.assertRaises(groq.BadRequestError):
+            llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertEqual(self.mock_create.call_count, 3)
+
+    @override_settings(LLM_RATE_LIMIT_RPM=1, LLM_RATE_LIMIT_MAX_WAIT=60)
+    def test_wait_limit_caps_the_quota_wait(self):
+        """Test that calls inside wait_limit fail fast instead of waiting out the quota or a 429."""
+        llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        with llm_gateway.wait_limit(0):
+            self.assertEqual(llm_gateway.max_wait(), 0)
+            with self.assertRaises(LLMRateLimitExceeded):
+                llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertEqual(llm_gateway.max_wait(), 60)
+        self.mock_sleep.assert_not_called()
+
+        cache.clear()
+        self.mock_create.side_effect = self._api_error(groq.RateLimitError, 429, {'retry-after': '20'})
+        with llm_gateway.wait_limit(5):
+            with self.assertRaises(LLMRateLimitExceeded) as ctx:
+                llm_gateway.chat_completion(messages=self.MESSAGES, model="m")
+        self.assertEqual(ctx.exception.retry_after, 20)
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.mock_sleep.assert_not_called()
+
+    @override_settings(LLM_RATE_LIMIT_REQUEST_MAX_WAIT=0)
+    def test_chat_out_of_quota_returns_429(self):
+        """Test that a chat turn that gets no quota is answered with a 429 and saves nothing."""
+        with mock.patch.object(LLMGateway, '_try_reserve', return_value=(None, 30.0)):
+            response = self.client.post(reverse('chat-message'), {'message': 'Hello'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(response.data['errors']['retry_after'], 30)
+
+            response = self.client.post(reverse('chat-message'), {'message': 'Hello', 'stream': True}, format='json')
+            events = b''.join(response.streaming_content).decode()
+        self.assertIn('event: error', events)
+        self.assertIn('"retry_after": 30', events)
+        self.assertFalse(ChatMessage.objects.filter(conversation__user=self.user).exists())
+        self.mock_sleep.assert_not_called()
+        self.mock_create.assert_not_called()
+
+    def test_async_calls_share_the_quota(self):
+        """Test that async calls use the event loop's client and the same quota."""
+        async_client = mock.Mock()
+        async_client.chat.completions.create = mock.AsyncMock(return_value=self.completion)
+        with mock.patch.object(LLMGateway, 'async_client', new_callable=mock.PropertyMock, return_value=async_client):
+            response = async_to_sync(llm_gateway.achat_completion)(messages=self.MESSAGES, model="m")
+        self.assertIs(response, self.completion)
+        self.assertEqual(llm_gateway.requests_used(), 1)
+        self.assertEqual(llm_gateway.tokens_used(), 50)
+
+
+class LLMResponseCacheTests(BaseTestCase):
+    """Test the persistent content-addressed cache of pipeline LLM responses."""
+
+    EVALUATION = (
+        "CLARITY_SCORE: 80\nCLARITY_FEEDBACK: Clear.\n"
+        "ACCURACY_SCORE: 90\nACCURACY_FEEDBACK: Faithful.\n"
+        "RELEVANCE_SCORE: 70\nRELEVANCE_FEEDBACK: Practical."
+    )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.completion = mock.Mock()
+        self.completion.choices = [mock.Mock(message=mock.Mock(content=self.EVALUATION))]
+        patcher = mock.patch.object(llm_gateway.client.chat.completions, 'create', return_value=self.completion)
+        self.mock_create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_key_covers_request_parameters(self):
+        """Test that the key changes with the model, messages, temperature and max_tokens."""
+        messages = [{"role": "user", "content": "Explain 2.47"}]
+        key = llm_response_cache.make_key("m", messages, 0.2, 100)
+        self.assertEqual(key, llm_response_cache.make_key("m", [dict(messages[0])], 0.2, 100))
+        self.assertEqual(len({
+            key,
+            llm_response_cache.make_key("other", messages, 0.2, 100),
+            llm_response_cache.make_key("m", [{"role": "user", "content": "Explain 2.48"}], 0.2, 100),
+            llm_response_cache.make_key("m", messages, 0.5, 100),
+            llm_response_cache.make_key("m", messages, 0.2, 200),
+        }), 5)
+
+    def test_quality_check_rerun_is_served_from_cache(self):
+        """Test that re-checking an unchanged explanation does not call the LLM again."""
+        checker = QualityCheckerService()
+        first = checker._check_with_llm(self.explanation)
+        second = checker._check_with_llm(self.explanation)
+        self.assertEqual(first, second)
+        self.assertEqual(first['accuracy_feedback'], "Faithful.")
+        self.assertEqual(self.mock_create.call_count, 1)
+        self.assertEqual(llm_response_cache.stats()['hits'], 1)
+        self.assertEqual(llm_response_cache.stats()['misses'], 1)
+        self.assertEqual(LLMResponseCacheEntry.objects.get().hit_count, 1)
+
+        with llm_response_cache.bypass():
+            checker._check_with_llm(self.explanation)
+        self.assertEqual(self.mock_create.call_count, 2)
+
+    def test_unparseable_responses_are_not_cached(self):
+        """Test that a malformed completion is not replayed on the next run."""
+        self.completion.choices[0].message.content = "I cannot evaluate this."
+        checker = QualityCheckerService()
+        checker._check_with_llm(self.explanation)
+        checker._check_with_llm(self.explanation)
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.assertFalse(LLMResponseCacheEntry.objects.exists())
+
+    def test_improvement_and_generation_use_the_cache(self):
+        """Test that section improvements and structured explanations are cached."""
+        self.completion.choices[0].message.content = "A clearer summary of Dhritarashtra's question."
+        quality_result = {'feedback': {'clarity': "Too vague."}}
+        service = ImprovementService()
+        self.assertEqual(service._improve_sections(self.explanation, ['summary'], quality_result), ['summary'])
+        self.explanation.summary = "This is a summary explanation"
+        self.assertEqual(service._improve_sections(self.explanation, ['summary'], quality_result), ['summary'])
+        self.assertEqual(self.mock_create.call_count, 1)
+
+        self.completion.choices[0].message.content = json.dumps({"summary": "Dhritarashtra asks Sanjaya."})
+        shloka = {'book_name': "Bhagavad Gita", 'chapter_number': 1, 'verse_number': 1, 'sanskrit_text': "धृतराष्ट्र उवाच"}
+        groq_service = GroqService()
+        first = groq_service.generate_structured_explanation(shloka)
+        second = groq_service.generate_structured_explanation(shloka)
+        self.assertEqual(first, second)
+        self.assertEqual(first['summary'], "Dhritarashtra asks Sanjaya.")
+        self.assertEqual(self.mock_create.call_count, 2)
+
+    @override_settings(LLM_RESPONSE_CACHE_MAX_BYTES=130)
+    def test_size_bound_evicts_least_recently_used(self):
+        """Test that the oldest unused responses are evicted once the cache is over its size bound."""
+        for i in range(3):
+            llm_response_cache.set(f"key{i}", "m", str(i) * 40)
+        llm_response_cache.get("key0")  # Recently used, so kept
+        llm_response_cache.set("key3", "m", "3" * 40)
+        self.assertEqual(set(LLMResponseCacheEntry.objects.values_list('key', flat=True)), {"key0", "key3"})
+        self.assertLessEqual(llm_response_cache.total_bytes(), 130)
+
+    @override_settings(LLM_RESPONSE_CACHE_MAX_BYTES=130)
+    def test_writes_under_the_bound_do_not_sum_the_table(self):
+        """Test that the table is only summed to seed the running total and once it crosses the bound."""
+        with mock.patch.object(llm_response_cache, 'total_bytes', wraps=llm_response_cache.total_bytes) as mock_total:
+            for i in range(3):
+                llm_response_cache.set(f"key{i}", "m", str(i) * 40)
+            self.assertEqual(mock_total.call_count, 1)
+            llm_response_cache.set("key3", "m", "3" * 40)
+            self.assertEqual(mock_total.call_count, 2)
+        self.assertEqual(cache.get(llm_response_cache.BYTES_KEY), llm_response_cache.total_bytes())
+
+    def test_disabled_cache_is_bypassed(self):
+        """Test that LLM_RESPONSE_CACHE_ENABLED=False neither reads nor writes."""
+        with override_settings(LLM_RESPONSE_CACHE_ENABLED=False):
+            llm_response_cache.set("key", "m", "response")
+            self.assertFalse(LLMResponseCacheEntry.objects.exists())
+        llm_response_cache.set("key", "m", "response")
+        with override_settings(LLM_RESPONSE_CACHE_ENABLED=False):
+            self.assertIsNone(llm_response_cache.get("key"))
+        self.assertEqual(llm_response_cache.get("key"), "response")
+
+        out = StringIO()
+        call_command('llm_response_cache', '--purge', stdout=out)
+        self.assertIn("Entries: 1", out.getvalue())
+        self.assertFalse(LLMResponseCacheEntry.objects.exists())
+
+
+class ExplanationGenerationTests(BaseTestCase):
+    """Test bounded-concurrency explanation generation with bulk writes."""
+
+    def setUp(self):
+        super().setUp()
+        self.shlokas = [self.shloka] + [
+            Shloka.objects.create(
+                book_name="Bhagavad Gita", chapter_number=2, verse_number=verse, sanskrit_text="कर्मण्येवाधिकारस्ते"
+            )
+            for verse in range(1, 6)
+        ]
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        patcher = mock.patch.object(BookContextService, 'get_context_for_shloka', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _generate(self, shloka_dict, book_context=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            self.in_flight -= 1
+        if shloka_dict['verse_number'] == 5:
+            raise Exception("Groq unavailable")
+        return {
+            'summary': f"Summary of {shloka_dict['chapter_number']}.{shloka_dict['verse_number']}",
+            'detailed_meaning': "Meaning",
+            'themes': ["duty"],
+            'generation_prompt': "prompt",
+        }
+
+    def test_generations_run_concurrently_and_are_written_in_bulk(self):
+        """Test that up to max_workers generations are in flight and results are bulk written."""
+        service = ShlokaService()
+        with mock.patch.object(GroqService, 'generate_structured_explanation', side_effect=self._generate):
+            with self.assertNumQueries(5):  # Existing explanations, savepoint, insert, update, release
+                explanations = service.generate_and_store_explanations(self.shlokas, max_workers=3)
+
+        self.assertEqual(self.max_in_flight, 3)
+        self.assertEqual(len(explanations), 5)
+        self.assertNotIn(self.shlokas[5].id, explanations)
+        self.assertFalse(ShlokaExplanation.objects.filter(shloka=self.shlokas[5]).exists())
+
+        self.explanation.refresh_from_db()
+        self.assertEqual(explanations[self.shloka.id].pk, self.explanation.pk)
+        self.assertEqual(self.explanation.summary, "Summary of 1.1")
+        self.assertEqual(self.explanation.detailed_meaning, "Meaning")
+        created = ShlokaExplanation.objects.get(shloka=self.shlokas[1])
+        self.assertEqual(created.summary, "Summary of 2.1")
+        self.assertEqual(created.themes, ["duty"])
+        self.assertEqual(created.ai_model_used, service.groq_service.model)
+        self.assertIn("Summary of 2.1", created.retrieval_card)
+
+    def test_single_generation_matches_bulk_fields(self):
+        """Test that generate_and_store_explanation stores the same fields as the bulk path."""
+        service = ShlokaService()
+        with mock.patch.object(GroqService, 'generate_structured_explanation', side_effect=self._generate):
+            explanation = service.generate_and_store_explanation(self.shlokas[1])
+            self.assertIsNone(service.generate_and_store_explanation(self.shlokas[5]))
+        explanation.refresh_from_db()
+        self.assertEqual(explanation.summary, "Summary of 2.1")
+        self.assertEqual(explanation.quality_score, 0)
+        self.assertIn("Summary of 2.1", explanation.retrieval_card)
+
+
+class ChatResponseCacheTests(BaseTestCase):
+    """Test caching of first-turn chatbot answers."""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(get_shloka_search_index().clear)
+        self.chatbot_service = ChatbotService()
+        completion = mock.Mock()
+        completion.choices = [mock.Mock(message=mock.Mock(content="Do your duty, dear friend."))]
+        patcher = mock.patch.object(llm_gateway.client.chat.completions, 'create', return_value=completion)
+        self.mock_create = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_repeated_first_turn_question_is_cached(self):
+        """Test that near-identical first-turn questions hit the cache."""
+        first = self.chatbot_service.generate_response("How to deal with stress?", [], self.user)
+        second = self.chatbot_service.generate_response("how to deal with STRESS", [], self.user)
+        self.assertEqual(first, second)
+        self.assertEqual(self.mock_create.call_count, 1)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertEqual(response_cache.stats()['misses'], 1)
+    
+    def test_negations_and_word_order_are_not_merged(self):
+        """Test that normalization keeps negations and word order."""
+        self.assertEqual(
+            response_cache.normalize_question("  Should I quit my JOB?! "),
+            response_cache.normalize_question("should i quit my job")
+        )
+        self.chatbot_service.generate_response("Should I quit my job?", [], self.user)
+        self.chatbot_service.generate_response("Should I not quit my job?", [], self.user)
+        self.chatbot_service.generate_response("My job should I quit?", [], self.user)
+        self.assertEqual(self.mock_create.call_count, 3)
+    
+    def test_answers_are_not_shared_across_reading_contexts(self):
+        """Test that a first-turn answer built on one user's reading context is not served to another."""
+        ReadingLog.objects.create(user=self.user, shloka=self.shloka, reading_type=ReadingType.SUMMARY)
+        other_user = User.objects.create(name="Other", email="other@example.com")
+        
+        self.chatbot_service.generate_response("How to deal with stress?", [], self.user)
+        self.chatbot_service.generate_response("How to deal with stress?", [], other_user)
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.assertIn("Read Bhagavad Gita", self.mock_create.call_args_list[0].kwargs['messages'][0]['content'])
+    
+    def test_turns_with_history_are_not_cached(self):
+        """Test that follow-up turns always call the LLM."""
+        history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+        self.chatbot_service.generate_response("How to deal with stress?", history, self.user)
+        self.chatbot_service.generate_response("How to deal with stress?", history, self.user)
+        self.chatbot_service.generate_response("How to deal with stress?", [], self.user, "Earlier summary")
+        self.assertEqual(self.mock_create.call_count, 3)
+    
+    def test_purge_and_disable(self):
+        """Test that purging invalidates answers and disabling bypasses the cache."""
+        self.chatbot_service.generate_response("How to be successful?", [], self.user)
+        response_cache.purge()
+        self.chatbot_service.generate_response("How to be successful?", [], self.user)
+        self.assertEqual(self.mock_create.call_count, 2)
+        self.assertEqual(response_cache.stats()['hits'], 0)
+        
+        with override_settings(CHAT_RESPONSE_CACHE_ENABLED=False):
+            self.chatbot_service.generate_response("How to be successful?", [], self.user)
+        self.assertEqual(self.mock_create.call_count, 3)
+
+
+class TokenBudgetTests(BaseTestCase):
+    """Test token estimation and prompt budget allocation."""
+    
+    def test_estimate_and_allocate(self):
+        """Test that sections are kept, truncated or dropped in priority order."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd" * 10), 10)
+        self.assertGreater(estimate_tokens("कर्मण्येवाधिकारस्ते"), estimate_tokens("karmanye vadhikaraste"))
+        
+        high, middle, low = "word " * 40, "text " * 40, "more " * 40
+        allocated = allocate_budget([high, middle, low], estimate_tokens(high) + 20)
+        self.assertEqual(allocated[0], high)
+        self.assertTrue(allocated[1].endswith("..."))
+        self.assertLessEqual(estimate_tokens(allocated[1]), 20)
+        self.assertEqual(allocated[2], "")
+    
+    def test_trim_history_keeps_most_recent(self):
+        """Test that history is trimmed from the oldest message."""
+        history = [{"role": "user", "content": f"message {i} " * 20} for i in range(5)]
+        kept = trim_history(history, 100)
+        self.assertTrue(kept)
+        self.assertLess(len(kept), 5)
+        self.assertEqual(kept[-1], history[-1])
+    
+    @override_settings(CHAT_PROMPT_TOKEN_BUDGET=2500)
+    def test_chat_prompt_fits_budget(self):
+        """Test that chat messages are trimmed to the configured budget."""
+        history = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"Long turn {i}. " * 60}
+            for i in range(10)
+        ]
+        shlokas = [
+            {"chapter": 2, "verse": 47, "card": "Teaching: Do your duty."},
+            {"chapter": 6, "verse": 35, "explanation": "Long commentary. " * 40},
+        ]
+        messages = ChatbotService().build_messages("How to deal with stress?", history, self.user, relevant_shlokas=shlokas)
+        self.assertLessEqual(estimate_messages_tokens(messages), 2500)
+        self.assertIn("Teaching: Do your duty.", messages[0]['content'])
+        self.assertEqual(messages[-1]['content'], "How to deal with stress?")
+        self.assertEqual(messages[-2]['content'], history[-1]['content'])
+        self.assertLess(len(messages), len(history) + 2)
+    
+    @override_settings(GENERATION_PROMPT_TOKEN_BUDGET=1200)
+    def test_structured_prompt_trims_book_context(self):
+        """Test that book context is trimmed, Hindi before English, instead of dropped on retry."""
+        groq_service = GroqService()
+        shloka = {
+            'book_name': 'Bhagavad Gita', 'chapter_number': 2, 'verse_number': 47,
+            'sanskrit_text': 'कर्मण्येवाधिकारस्ते', 'transliteration': 'karmanye vadhikaraste',
+        }
+        book_context = {'english_context': "English context. " * 200, 'hindi_context': "हिंदी संदर्भ " * 200}
+        prompt = groq_service._build_structured_prompt(shloka, book_context)
+        messages = [
+            {"role": "system", "content": groq_service._get_structured_system_message()},
+            {"role": "user", "content": prompt},
+        ]
+        self.assertLessEqual(estimate_messages_tokens(messages), 1200)
+        self.assertIn("Reference Context (English Translation):", prompt)
+        self.assertNotIn("Reference Context (Hindi Translation):", prompt)
+        self.assertTrue(prompt.endswith("Do not include any text before or after the JSON."))
+
+
+class RetrievalTestCase(BaseTestCase):
+    """Base test case with a small explained shloka catalog for retrieval tests."""
+    
+    def setUp(self):
+        super().setUp()
+        self.karma_shloka = Shloka.objects.create(
+            book_name="Bhagavad Gita",
+            chapter_number=2,
+            verse_number=47,
+            sanskrit_text="कर्मण्येवाधिकारस्ते",
+            transliteration="karmanye vadhikaraste"
+        )
+        ShlokaExplanation.objects.create(
+            shloka=self.karma_shloka,
+            summary="Perform your duty without attachment to the fruits of action",
+            detailed_meaning="Action is your right, never its results",
+            themes=["karma yoga", "duty", "detachment"]
+        )
+        self.mind_shloka = Shloka.objects.create(
+            book_name="Bhagavad Gita",
+            chapter_number=6,
+            verse_number=35,
+            sanskrit_text="असंशयं महाबाहो",
+            transliteration="asamsayam mahabaho"
+        )
+        ShlokaExplanation.objects.create(
+            shloka=self.mind_shloka,
+            summary="The restless mind is controlled by practice and detachment",
+            detailed_meaning="Through steady practice the mind becomes calm, ending stress and worry",
+            themes=["mind", "meditation", "practice"]
+        )
+
+
+class ShlokaSearchIndexTests(RetrievalTestCase):
+    """Test the in-memory BM25 shloka index and chatbot retrieval."""
+    
+    def setUp(self):
+        super().setUp()
+        self.index = get_shloka_search_index()
+        self.index.build()
+    
+    def tearDown(self):
+        self.index.clear()
+        super().tearDown()
+    
+    def test_search_ranks_matching_shloka_first(self):
+        """Test that the best matching shloka is ranked first with a score."""
+        results = self.index.search("How do I calm my restless mind and stress?", limit=3)
+        self.assertTrue(results)
+        self.assertEqual((results[0]['chapter'], results[0]['verse']), (6, 35))
+        self.assertGreater(results[0]['score'], 0)
+    
+    def test_search_without_matches_returns_empty(self):
+        """Test that queries with no indexed terms return no hits."""
+        self.assertEqual(self.index.search("zzzz qqqq"), [])
+        self.assertEqual(self.index.search("what is the"), [])
+    
+    def test_book_filter_ranks_with_that_books_statistics(self):
+        """Test that a search limited to one book scores it as if the book were indexed alone."""
+        for verse in range(1, 6):
+            shloka = Shloka.objects.create(
+                book_name="Isha Upanishad",
+                chapter_number=1,
+                verse_number=verse,
+                sanskrit_text="ईशा वास्यमिदं सर्वं"
+            )
+            ShlokaExplanation.objects.create(
+                shloka=shloka,
+                summary="Renounce and enjoy through detachment, detachment and more detachment",
+                themes=["detachment", "renunciation"]
+            )
+        self.index.build()
+        gita_only = ShlokaSearchIndex()
+        gita_only.build(Shloka.objects.filter(book_name="Bhagavad Gita").prefetch_related('explanations'))
+        
+        query = "detachment from duty and restless mind"
+        filtered = self.index.search(query, limit=3, book_name="Bhagavad Gita")
+        self.assertEqual(
+            [(r['chapter'], r['verse'], r['score']) for r in filtered],
+            [(r['chapter'], r['verse'], r['score']) for r in gita_only.search(query, limit=3)]
+        )
+        self.assertEqual(len(filtered), 2)
+        
+        for verse in range(1, 6):
+            self.index.remove(Shloka.objects.get(book_name="Isha Upanishad", verse_number=verse).id)
+        self.assertEqual(self.index.search("renounce enjoy", book_name="Isha Upanishad"), [])
+    
+    def test_upsert_and_remove(self):
+        """Test incremental updates of a single document."""
+        explanation = self.karma_shloka.explanations.first()
+        explanation.summary = "Surrender and devotion to the divine"
+        self.index.upsert(self.karma_shloka, explanation)
+        self.assertEqual(self.index.search("surrender devotion")[0]['verse'], 47)
+        
+        self.index.remove(self.karma_shloka.id)
+        self.assertEqual(self.index.search("surrender devotion"), [])
+        self.assertIsNone(self.index.get("Bhagavad Gita", 2, 47))
+        self.assertEqual(len(self.index), 2)
+    
+    def test_find_relevant_shlokas_uses_index_without_queries(self):
+        """Test that chatbot retrieval is served from the built index."""
+        chatbot_service = ChatbotService()
+        with self.assertNumQueries(0):
+            results = chatbot_service.find_relevant_shlokas("I want success at work", limit=2)
+        self.assertEqual((results[0]['chapter'], results[0]['verse']), (2, 47))
+    
+    def test_rebuilds_after_write_from_another_process(self):
+        """Test that a catalog change without local signals is picked up on the next sync check."""
+        # A queryset update sends no signals, like a write made by a Celery worker
+        ShlokaExplanation.objects.filter(shloka=self.karma_shloka).update(
+            summary="Surrender and devotion to the divine",
+            updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.index.ensure_built()
+        self.assertEqual(self.index.search("surrender devotion"), [])
+        
+        with override_settings(SHLOKA_INDEX_SYNC_INTERVAL=0):
+            self.index.ensure_built()
+        self.assertEqual(self.index.search("surrender devotion")[0]['verse'], 47)
+    
+    def test_build_from_iterable(self):
+        """Test building a standalone index from given shlokas."""
+        index = ShlokaSearchIndex()
+        index.build(Shloka.objects.prefetch_related('explanations'))
+        self.assertTrue(index.is_built)
+        self.assertEqual(len(index), 3)
+
+
+class RetrievalCardTests(RetrievalTestCase):
+    """Test precomputed retrieval cards and their use in chatbot prompts."""
+    
+    def test_card_is_stored_and_refreshed_on_save(self):
+        """Test that saving an explanation keeps its card in sync."""
+        explanation = ShlokaExplanation.objects.get(shloka=self.karma_shloka)
+        self.assertIn("Teaching: Perform your duty", explanation.retrieval_card)
+        self.assertIn("Themes: karma yoga, duty, detachment", explanation.retrieval_card)
+        
+        explanation.summary = "Act selflessly"
+        explanation.save(update_fields=['summary'])
+        explanation.refresh_from_db()
+        self.assertIn("Teaching: Act selflessly", explanation.retrieval_card)
+    
+    def test_card_respects_token_budget(self):
+        """Test that long explanations are trimmed to whole sentences within the budget."""
+        explanation = ShlokaExplanation(
+            shloka=self.karma_shloka,
+            summary="Do your duty. " * 20,
+            detailed_meaning="The mind must be steady in action. " * 50,
+            why_this_matters="It frees you from anxiety. " * 50,
+            themes=["duty"],
+        )
+        card = build_retrieval_card(explanation, max_tokens=60)
+        self.assertLessEqual(len(card), 60 * CHARS_PER_TOKEN)
+        self.assertTrue(card.startswith("Teaching: Do your duty."))
+        self.assertTrue(all(line.endswith('.') for line in card.splitlines()))
+    
+    def test_prompt_uses_cards_instead_of_full_explanation(self):
+        """Test that the system prompt carries the card, not the full fields."""
+        explanation = ShlokaExplanation.objects.get(shloka=self.mind_shloka)
+        explanation.detailed_explanation = "A very long commentary. " * 100
+        explanation.save()
+        
+        index = get_shloka_search_index()
+        index.build()
+        self.addCleanup(index.clear)
+        
+        chatbot_service = ChatbotService()
+        relevant = chatbot_service.find_relevant_shlokas("restless mind stress", limit=1)
+        messages = chatbot_service.build_messages("restless mind stress", [], self.user, relevant_shlokas=relevant)
+        system_message = messages[0]['content']
+        self.assertIn("Chapter 6, Verse 35", system_message)
+        self.assertIn("Teaching: The restless mind", system_message)
+        self.assertNotIn("A very long commentary", system_message)
+        self.assertNotIn("Transliteration:", system_message)
+
+
+@unittest.skipUnless(TfidfShlokaRetriever.is_available(), "numpy/scipy not installed")
+class TfidfShlokaRetrieverTests(RetrievalTestCase):
+    """Test the TF-IDF matrix retrieval engine."""
+    
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmp_dir.name) / 'shloka_tfidf.npz'
+        self.retriever = TfidfShlokaRetriever(self.index_path)
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+    
+    def test_tfidf_search_ranks_matching_shloka_first(self):
+        """Test cosine ranking and top-k selection."""
+        self.retriever.ensure_ready()
+        results = self.retriever.search("calm the restless mind", limit=1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual((results[0]['chapter'], results[0]['verse']), (6, 35))
+        self.assertGreater(results[0]['score'], 0)
+        self.assertEqual(self.retriever.search("unknownword"), [])
+    
+    def test_tfidf_persists_and_reloads(self):
+        """Test that the matrix round-trips through disk without a rebuild."""
+        self.retriever.ensure_ready()
+        self.assertTrue(self.index_path.exists())
+        
+        reloaded = TfidfShlokaRetriever(self.index_path)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(len(reloaded), 3)
+        self.assertEqual(
+            reloaded.search("duty detachment", limit=2),
+            self.retriever.search("duty detachment", limit=2)
+        )
+        self.assertEqual(reloaded.get("Bhagavad Gita", 2, 47)['verse'], 47)
+    
+    def test_tfidf_rebuilds_when_catalog_changes(self):
+        """Test that an invalidated matrix picks up new explanations."""
+        self.retriever.ensure_ready()
+        shloka = Shloka.objects.create(
+            book_name="Bhagavad Gita", chapter_number=4, verse_number=7,
+            sanskrit_text="यदा यदा हि धर्मस्य"
+        )
+        ShlokaExplanation.objects.create(shloka=shloka, summary="Whenever righteousness declines")
+        self.retriever.invalidate()
+        self.retriever.ensure_ready()
+        self.assertEqual(self.retriever.search("righteousness")[0]['verse'], 7)
+    
+    def test_tfidf_rebuilds_after_write_from_another_process(self):
+        """Test that a catalog change without local invalidation is picked up on the next sync check."""
+        self.retriever.ensure_ready()
+        ShlokaExplanation.objects.filter(shloka=self.karma_shloka).update(
+            summary="Surrender and devotion to the divine",
+            updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.retriever.ensure_ready()
+        self.assertEqual(self.retriever.search("surrender devotion"), [])
+        
+        with override_settings(SHLOKA_INDEX_SYNC_INTERVAL=0):
+            self.retriever.ensure_ready()
+        self.assertEqual(self.retriever.search("surrender devotion")[0]['verse'], 47)
+    
+    def test_tfidf_search_is_not_mixed_with_a_concurrent_rebuild(self):
+        """Test that a search scores and maps rows with the build it started on."""
+        self.retriever.ensure_ready()
+        retriever = self.retriever
+        karma_shloka = self.karma_shloka
+        
+        class RebuildingMatrix:
+            """Swaps a smaller build in while the query is being scored."""
+            def __init__(self, matrix):
+                self.matrix = matrix
+                self.shape = matrix.shape
+            
+            def dot(self, vector):
+                retriever.build(shlokas=[karma_shloka])
+                return self.matrix.dot(vector)
+        
+        retriever._matrix = RebuildingMatrix(retriever._matrix)
+        results = retriever.search("calm the restless mind", limit=1)
+        self.assertEqual((results[0]['chapter'], results[0]['verse']), (6, 35))
+        self.assertEqual(len(retriever), 1)
+    
+    def test_tfidf_save_uses_a_private_temp_file(self):
+        """Test that saves leave only the index behind, even when a write fails."""
+        self.retriever.ensure_ready()
+        self.retriever.save()
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['shloka_tfidf.npz'])
+        
+        with mock.patch('apps.sanatan_app.services.tfidf_retrieval.np.savez', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.retriever.save()
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['shloka_tfidf.npz'])
+        self.assertTrue(TfidfShlokaRetriever(self.index_path).load())
+    
+    def test_find_relevant_shlokas_with_tfidf_backend(self):
+        """Test chatbot retrieval through the TF-IDF backend."""
+        with override_settings(CHATBOT_RETRIEVAL_BACKEND='tfidf', SHLOKA_TFIDF_INDEX_PATH=self.index_path):
+            from .services import tfidf_retrieval
+            tfidf_retrieval._tfidf_retriever = None
+            try:
+                results = ChatbotService().find_relevant_shlokas("restless mind and stress", limit=1)
+            finally:
+                tfidf_retrieval._tfidf_retriever = None
+        self.assertEqual((results[0]['chapter'], results[0]['verse']), (6, 35))
+
+
+class BookTextStoreTests(TestCase):
+    """Test the persistent PDF page text store."""
+    
+    PAGES = [
+        "Contents\nChapter 1 Observing the Armies\nChapter 2 Transcendental Knowledge\nChapter 3 Karma-yoga",
+        "",
+        "Chapter 1\nVerse 1\n" + "Dhritarashtra said: on the field of dharma. " * 10,
+        "Verse 2\n" + "Sanjaya said: seeing the army arrayed. " * 10 + "\nIn Chapter 2 Krishna replies.",
+        "CHAPTER 2\nVerse 1\n" + "Seeing Arjuna overwhelmed with compassion. " * 10,
+    ]
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        tmp = Path(self.tmp_dir.name)
+        self.store_dir = tmp / 'book_text'
+        self.pdf_path = tmp / 'book.pdf'
+        self.pdf_path.write_bytes(b'%PDF-1.4 test book')
+        settings_override = override_settings(BOOK_TEXT_STORE_DIR=self.store_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+    
+    def _fake_reader(self):
+        pages = [mock.Mock(**{'extract_text.return_value': text}) for text in self.PAGES]
+        return mock.Mock(pages=pages)
+    
+    def test_store_round_trip(self):
+        """Test that pages are written once and read back by page and range."""
+        store = BookTextStore(self.pdf_path)
+        self.assertFalse(store.exists())
+        self.assertEqual(store.build(self.PAGES), 5)
+        
+        reloaded = BookTextStore(self.pdf_path)
+        self.assertTrue(reloaded.exists())
+        self.assertEqual(reloaded.page_count, 5)
+        self.assertEqual(reloaded.page_text(2), self.PAGES[2])
+        self.assertEqual(reloaded.page_text(9), '')
+        self.assertEqual(reloaded.pages(1, 3), self.PAGES[1:3])
+        # Same shape as pypdf extraction: empty pages skipped, blank-line separated
+        self.assertEqual(reloaded.pages_text(0, 10), "\n\n".join(page for page in self.PAGES if page))
+    
+    def test_chapter_index(self):
+        """Test that chapter starts skip the table of contents and inline references."""
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        reloaded = BookTextStore(self.pdf_path)
+        self.assertEqual(reloaded.chapter_index(), {1: (2, 4), 2: (4, 5)})
+        self.assertEqual(reloaded.chapter_range(2), (4, 5))
+        self.assertIsNone(reloaded.chapter_range(3))
+    
+    def test_verse_index_slices_between_markers(self):
+        """Test that a verse passage runs from its marker to the next one."""
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        store = BookTextStore(self.pdf_path)
+        
+        first = store.verse_passage(1, 1)
+        self.assertTrue(first.startswith('Verse 1'))
+        self.assertIn('Dhritarashtra said', first)
+        self.assertNotIn('Sanjaya said', first)
+        
+        second = store.verse_passage(1, 2)
+        self.assertIn('Sanjaya said', second)
+        self.assertNotIn('Seeing Arjuna', second)
+        self.assertEqual(store.verse_passage(1, 3), '')
+        
+        # Persisted next to the pages and reused by the next reader
+        self.assertTrue((store.path / BookTextStore.VERSES_FILE).exists())
+        self.assertEqual(BookTextStore(self.pdf_path).verse_index(), store.verse_index())
+    
+    def test_find_verse_offsets(self):
+        """Test marker forms, combined verses and ignored back-references."""
+        text = (
+            "TEXT 1\nfirst\n"
+            "TEXTS 2-3\nsecond and third\n"
+            "Verse 1\nas explained in verse one\n"
+            "Verse 5.4\nanother chapter\n"
+            "Text 2.4\nfourth\n"
+        )
+        offsets = find_verse_offsets(text, 2)
+        self.assertEqual(sorted(offsets), [1, 2, 3, 4])
+        self.assertEqual(offsets[2], offsets[3])
+        self.assertEqual(offsets[4], text.index('Text 2.4'))
+    
+    def test_stores_share_one_memory_map(self):
+        """Test that readers share a map and a rebuilt store is remapped."""
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        first, second = BookTextStore(self.pdf_path), BookTextStore(self.pdf_path)
+        self.assertEqual(first.page_text(2), second.page_text(2))
+        pages_file = first.path / BookTextStore.PAGES_FILE
+        shared_map = map_pages_file(pages_file)
+        self.assertIs(map_pages_file(pages_file), shared_map)
+        self.assertEqual(len(shared_map.offsets), len(self.PAGES) + 1)
+        
+        BookTextStore(self.pdf_path).build(["Chapter 1\nVerse 1\nrebuilt"])
+        self.assertIsNot(map_pages_file(pages_file), shared_map)
+        # Existing readers pick up the rebuilt pages and offset table together
+        self.assertEqual(first.page_count, 1)
+        self.assertEqual(first.page_text(0), "Chapter 1\nVerse 1\nrebuilt")
+        
+        BookTextStore(self.pdf_path).build(['', ''])
+        self.assertEqual(BookTextStore(self.pdf_path).pages(), ['', ''])
+    
+    def test_store_is_keyed_by_content(self):
+        """Test that a changed PDF does not reuse the old page text."""
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        self.pdf_path.write_bytes(b'%PDF-1.4 revised edition')
+        self.assertFalse(BookTextStore(self.pdf_path).exists())
+    
+    def test_service_does_not_extract_pdf_on_request(self):
+        """Test that a book without a page text store yields empty context without parsing the PDF."""
+        service = BookContextService()
+        service.english_book_path = self.pdf_path
+        with mock.patch.object(BookContextService, '_load_pdf', return_value=self._fake_reader()) as load_pdf:
+            with self.assertLogs('apps.sanatan_app.services.book_context_service', level='WARNING'):
+                context = service.get_context_for_shloka("Bhagavad Gita", 1, 2, include_hindi=False)
+        
+        load_pdf.assert_not_called()
+        self.assertEqual(context, {'english_context': '', 'hindi_context': ''})
+        self.assertFalse(BookTextStore(self.pdf_path).exists())
+    
+    def test_service_extracts_pdf_only_once(self):
+        """Test that the PDF is parsed once on build and later reads come from the store."""
+        service = BookContextService()
+        service.english_book_path = self.pdf_path
+        with mock.patch.object(BookContextService, '_load_pdf', return_value=self._fake_reader()) as load_pdf:
+            self.assertIsNotNone(service.get_store(self.pdf_path, build=True))
+            context = service.get_context_for_shloka("Bhagavad Gita", 1, 2, include_hindi=False)
+            self.assertEqual(load_pdf.call_count, 1)
+            
+            fresh_service = BookContextService()
+            fresh_service.english_book_path = self.pdf_path
+            chapter_text = fresh_service.get_full_chapter_context(1)
+            self.assertEqual(load_pdf.call_count, 1)
+        
+        self.assertIn('Sanjaya said', context['english_context'])
+        self.assertEqual(context['hindi_context'], '')
+        self.assertIn('Dhritarashtra said', chapter_text)
+        self.assertNotIn('Seeing Arjuna', chapter_text)
+    
+    @override_settings(BOOK_CONTEXT_CACHE_MAX_BYTES=1024 * 1024)
+    def test_service_caches_chapter_text_across_verses(self):
+        """Test that verses of one chapter share a cache entry and both books are looked up."""
+        hindi_path = Path(self.tmp_dir.name) / 'hindi.pdf'
+        hindi_path.write_bytes(b'%PDF-1.4 hindi book')
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        BookTextStore(hindi_path).build(["अध्याय १\nश्लोक १\nधृतराष्ट्र उवाच धर्मक्षेत्रे कुरुक्षेत्रे"])
+        
+        service = BookContextService()
+        service.english_book_path = self.pdf_path
+        service.hindi_book_path = hindi_path
+        first = service.get_context_for_shloka("Bhagavad Gita", 1, 1)
+        service.get_context_for_shloka("Bhagavad Gita", 1, 2, include_hindi=False)
+        
+        self.assertIn('Dhritarashtra said', first['english_context'])
+        self.assertIn('धृतराष्ट्र उवाच', first['hindi_context'])
+        stats = service.chapter_cache.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (2, 1))
+        self.assertEqual(stats['entries'], 2)
+    
+    @override_settings(BOOK_CONTEXT_CACHE_MAX_BYTES=0)
+    def test_service_without_chapter_cache_reads_the_store(self):
+        """Test that a disabled chapter cache keeps nothing and context still comes from the store."""
+        BookTextStore(self.pdf_path).build(self.PAGES)
+        service = BookContextService()
+        service.english_book_path = self.pdf_path
+        
+        context = service.get_context_for_shloka("Bhagavad Gita", 1, 1, include_hindi=False)
+        
+        self.assertIn('Dhritarashtra said', context['english_context'])
+        self.assertEqual(service.chapter_cache.stats()['entries'], 0)
+    
+    def test_chapter_cache_evicts_least_recently_used(self):
+        """Test the byte bound and LRU order of the chapter text cache."""
+        text = 'x' * 1000
+        chapter_cache = ChapterTextCache(max_bytes=2 * len(text) + 200)
+        chapter_cache.set(1, text)
+        chapter_cache.set(2, text)
+        self.assertEqual(chapter_cache.get(1), text)
+        chapter_cache.set(3, text)
+        
+        self.assertIsNone(chapter_cache.get(2))
+        self.assertEqual(chapter_cache.get(3), text)
+        self.assertLessEqual(chapter_cache.stats()['bytes'], chapter_cache.max_bytes)
+        # Entries larger than the whole cache are not stored
+        chapter_cache.set(4, text * 3)
+        self.assertIsNone(chapter_cache.get(4))
+        self.assertIs(get_book_context_service(), get_book_context_service())
+    
+    def test_cleaned_page_lines_read_one_page_at_a_time(self):
+        """Test that chapter lines are read and cleaned lazily, page by page."""
+        store = BookTextStore(self.pdf_path)
+        store.build(self.PAGES)
+        pages_read = []
+        iter_pages = store.iter_pages
+        
+        def counting_iter_pages(start_page, end_page):
+            for page in iter_pages(start_page, end_page):
+                pages_read.append(page)
+                yield page
+        
+        with mock.patch.object(store, 'iter_pages', side_effect=counting_iter_pages):
+            chapter_lines = CleanedPageLines(store, 1, 5)
+            self.assertTrue(chapter_lines.has_text())
+            # The empty page and the first page with text
+            self.assertEqual(len(pages_read), 2)
+            pages_read.clear()
+            self.assertEqual(next(iter(chapter_lines)), "Chapter 1")
+            self.assertEqual(len(pages_read), 2)
+        
+        self.assertEqual(chapter_lines.text(), ShlokaService._clean_pdf_text(store.pages_text(1, 5)))
+    
+    def test_service_without_pdf_returns_empty_context(self):
+        """Test that a missing book yields empty context instead of an error."""
+        service = BookContextService()
+        service.english_book_path = Path(self.tmp_dir.name) / 'missing.pdf'
+        service.hindi_book_path = Path(self.tmp_dir.name) / 'missing-hindi.pdf'
+        self.assertIsNone(service.get_store(service.english_book_path))
+        self.assertEqual(
+            service.get_context_for_shloka("Bhagavad Gita", 1, 1),
+            {'english_context': '', 'hindi_context': ''}
+        )
+
+
+def write_test_pdf(path, page_texts):
+    """Write a minimal text-only PDF with one page per entry of ``page_texts``."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        lines = ''.join(f"({line}) Tj T* " for line in text.split('\n'))
+        stream = f"BT /F1 12 Tf 14 TL 72 720 Td {lines}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref_offset = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    data += ''.join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('latin-1')
+    Path(path).write_bytes(data)
+
+
+class MarkerScannerTests(TestCase):
+    """Test the single-pass chapter/verse marker scanner and its callers."""
+
+    def test_scan_markers_finds_each_kind_in_order(self):
+        text = (
+            "Chapter 2\n"
+            "TEXTS 16-18\n"
+            "12. Numbered line\n"
+            "As said in chapter 3 and verse 4, see also 2.47.\n"
+            "अध्याय ३\n"
+        )
+        markers = list(scan_markers(text))
+        self.assertEqual(
+            [(m.kind, m.chapter, m.verse, m.verse_end) for m in markers],
+            [
+                ('chapter_heading', 2, None, None),
+                ('verse_heading', None, 16, 18),
+                ('numbered_line', None, 12, None),
+                ('chapter_mention', 3, None, None),
+                ('verse_mention', None, 4, None),
+                ('reference', 2, 47, None),
+                ('chapter_heading', 3, None, None),
+            ]
+        )
+        self.assertEqual(text[markers[1].start:markers[1].end], 'TEXTS 16-18')
+        self.assertEqual(text[markers[5].start:markers[5].end], '2.47')
+
+    def test_chapter_numbers_must_match_exactly(self):
+        markers = list(scan_markers("In Chapter 13 (a subchapter 4 of the book), page 1234.5"))
+        self.assertEqual([m.chapter for m in markers if m.is_chapter], [13])
+        self.assertFalse(any(m.kind == 'reference' for m in markers))
+        self.assertEqual(first_chapter_mentioned(markers), 13)
+        self.assertIsNone(first_chapter_mentioned(scan_markers("No markers here")))
+
+    def test_split_into_verse_sections(self):
+        text = "Intro\nVERSE 1\nFirst verse\n2.2 Second verse\nmore\n3. Third verse"
+        service = ShlokaService.__new__(ShlokaService)
+        sections = service._split_into_verse_sections(text, 2)
+        self.assertEqual([s['verse_number'] for s in sections], [1, 2, 3])
+        self.assertEqual(sections[1]['text'], "2.2 Second verse\nmore")
+        self.assertEqual(sections[0]['context_before'], "Intro")
+        self.assertEqual(sections[2]['context_after'], "")
+
+    def test_iter_verse_sections_stops_after_target(self):
+        lines_read = []
+        
+        def chapter_lines():
+            for number in range(1, 21):
+                for line in (f"VERSE {number}", f"Sanskrit line {number}"):
+                    lines_read.append(line)
+                    yield line
+        
+        service = ShlokaService.__new__(ShlokaService)
+        section = next(
+            s for s in service._iter_verse_sections(chapter_lines(), 2) if s['verse_number'] == 3
+        )
+        self.assertEqual(section['text'], "VERSE 3\nSanskrit line 3")
+        self.assertEqual(section['context_before'], "VERSE 1\nSanskrit line 1\nVERSE 2\nSanskrit line 2")
+        self.assertEqual(
+            section['context_after'], "VERSE 4\nSanskrit line 4\nVERSE 5\nSanskrit line 5\nVERSE 6"
+        )
+        # The verse, then only the five lines of context after it
+        self.assertEqual(len(lines_read), 11)
+    
+    def test_search_falls_back_to_reference(self):
+        text = "Commentary " * 80 + "\nas in 2.47 the Lord says" + " and more" * 50
+        context = BookContextService()._search_for_chapter_verse(text, 2, 47)
+        self.assertIn("2.47 the Lord says", context)
+        self.assertEqual(BookContextService()._search_for_chapter_verse(text, 2, 48), "")
+
+
+class PdfTextCleaningTests(TestCase):
+    """Test the table-driven PDF text cleaning against the legacy per-character loop."""
+
+    def test_golden_output(self):
+        raw = (
+            "  CHAPTER\t 2\x00\n\n\n\nधर्मक्षेत्रे\ue001 कुरुक्षेत्रे\u200b\n"
+            "Kṛṣṇa\u2003said: the self-\n  realized  soul is a well - known  teacher.\x85\U0001f600 \n"
+        )
+        self.assertEqual(
+            ShlokaService._clean_pdf_text(raw),
+            "CHAPTER 2\nधर्मक्षेत्रे कुरुक्षेत्रे\nKṛṣṇasaid: the selfrealized soul is a well-known teacher."
+        )
+
+    def test_matches_legacy_cleaner_on_chapter_text(self):
+        raw = add_pdf_noise(BenchmarkBookTextCommand._synthetic_chapter(2))
+        self.assertEqual(ShlokaService._clean_pdf_text(raw), legacy_clean_pdf_text(raw))
+
+    def test_matches_legacy_cleaner_on_every_code_point(self):
+        text = ' '.join(chr(code) for code in range(0x110000))
+        self.assertEqual(ShlokaService._clean_pdf_text(text), legacy_clean_pdf_text(text))
+
+
+class PreprocessBooksCommandTests(TestCase):
+    """Test parallel pre-extraction of the source PDFs."""
+    
+    PAGES = [
+        "Contents\nChapter 1 Observing the Armies\nChapter 2 Contents of the Gita",
+        "Chapter 1\nVerse 1\nDhritarashtra   said on the field of dharma",
+        "Verse 2\nSanjaya said seeing the army",
+        "Chapter 2\nVerse 1\nSeeing Arjuna overwhelmed",
+    ]
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        tmp = Path(self.tmp_dir.name)
+        self.english_path = tmp / 'english.pdf'
+        write_test_pdf(self.english_path, self.PAGES)
+        settings_override = override_settings(BOOK_TEXT_STORE_DIR=tmp / 'book_text')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Absolute paths replace the app-relative book locations
+        for name, path in (('ENGLISH_BOOK', self.english_path), ('HINDI_BOOK', tmp / 'missing-hindi.pdf')):
+            patcher = mock.patch.object(BookContextService, name, str(path))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def _run(self, **options):
+        out = StringIO()
+        call_command('preprocess_books', stdout=out, **options)
+        return out.getvalue()
+    
+    def test_parallel_extraction_matches_serial(self):
+        """Test that pool workers write the same cleaned pages, in order, as a serial run."""
+        output = self._run(workers=2, chunk_size=1)
+        self.assertIn('pages/sec', output)
+        self.assertIn('PDF not found', output)
+        
+        store = BookTextStore(self.english_path)
+        parallel_pages = store.pages()
+        self.assertEqual(len(parallel_pages), 4)
+        self.assertEqual(parallel_pages[1], "Chapter 1\nVerse 1\nDhritarashtra said on the field of dharma")
+        self.assertEqual(store.chapter_index(), {1: (1, 3), 2: (3, 4)})
+        
+        self.assertIn('already extracted', self._run(workers=2))
+        self._run(workers=1, force=True)
+        self.assertEqual(BookTextStore(self.english_path).pages(), parallel_pages)
 
 
 class StatsServiceTests(TestCase):
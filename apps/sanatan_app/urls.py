@@ -17,7 +17,10 @@ from .views import (
     FavoriteView,
     MarkShlokaReadView,
     ChatConversationListView,
+    ChatConversationMessagesView,
     ChatMessageView,
+    AsyncChatMessageView,
+    ChatJobView,
     UserProfileView,
     ChangePasswordView,
     DeleteAccountView,
@@ -50,6 +53,9 @@ urlpatterns = [
     path('api/favorites', FavoriteView.as_view(), name='favorites'),
     # Chatbot endpoints
     path('api/chat/conversations', ChatConversationListView.as_view(), name='chat-conversations'),
+    path('api/chat/conversations/<uuid:conversation_id>/messages', ChatConversationMessagesView.as_view(), name='chat-conversation-messages'),
     path('api/chat/message', ChatMessageView.as_view(), name='chat-message'),
+    path('api/chat/message/async', AsyncChatMessageView.as_view(), name='chat-message-async'),
+    path('api/chat/jobs/<uuid:job_id>', ChatJobView.as_view(), name='chat-job'),
 ]
 
@@ -19,6 +19,8 @@ from .serializers import (
     ReadingLogCreateSerializer,
     FavoriteSerializer,
     ChatConversationSerializer,
+    ChatConversationListSerializer,
+    ChatConversationMetadataSerializer,
     ChatMessageSerializer,
     ChatMessageCreateSerializer,
     UserStreakSerializer,
@@ -30,8 +32,22 @@ from core.services.authentication import UUIDJWTAuthentication
 from .services.shloka_service import ShlokaService
 from .services.stats_service import StatsService
 from .services.chatbot_service import ChatbotService
+from .services.llm_gateway import LLMRateLimitExceeded, llm_gateway
+from .services.llm_limiter import LLMConcurrencyLimitExceeded, llm_limiter
+from .tasks import generate_chat_response
+from celery.result import AsyncResult
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import EmptyPage, Paginator
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
 from datetime import timedelta
+from typing import Union
 import logging
 import uuid
 import json
@@ -75,6 +91,22 @@ def _format_shloka_response(result: dict, success_message: str = "Shloka retriev
     }
 
 
+def _llm_busy_data(exc: Union[LLMConcurrencyLimitExceeded, LLMRateLimitExceeded]) -> dict:
+    """Payload of a rejected LLM call: over the concurrency limit or out of quota."""
+    return {
+        'message': 'Too many requests',
+        'data': None,
+        'errors': {'detail': str(exc), 'retry_after': exc.retry_after}
+    }
+
+
+def _llm_busy_response(exc: Union[LLMConcurrencyLimitExceeded, LLMRateLimitExceeded], response_class=Response):
+    """Build a 429 response with a ``Retry-After`` hint for a rejected LLM call."""
+    response = response_class(_llm_busy_data(exc), status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
 class RandomShlokaView(APIView):
     """
     Get a random shloka with explanation.
@@ -340,17 +372,22 @@ class ShlokaByChapterVerseView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             shloka_service = ShlokaService()
-            result = shloka_service.get_shloka_by_chapter_verse(
-                book_name=book_name,
-                chapter_number=chapter_number,
-                verse_number=verse_number
-            )
+            # A verse missing from the database is generated while the user waits
+            with llm_gateway.wait_limit(settings.LLM_RATE_LIMIT_REQUEST_MAX_WAIT):
+                result = shloka_service.get_shloka_by_chapter_verse(
+                    book_name=book_name,
+                    chapter_number=chapter_number,
+                    verse_number=verse_number,
+                    user_id=request.user.id
+                )
             
             # Use helper function to ensure consistent format
             response_data = _format_shloka_response(result, 'Shloka retrieved successfully')
             
             return Response(response_data, status=status.HTTP_200_OK)
             
+        except (LLMConcurrencyLimitExceeded, LLMRateLimitExceeded) as e:
+            return _llm_busy_response(e)
         except Exception as e:
             error_message = str(e)
             logger.error(f"Error in get_shloka_by_chapter_verse: {error_message}")
@@ -1521,17 +1558,39 @@ class AchievementsView(APIView):
 
 
 class ChatConversationListView(APIView):
-    """List user's chat conversations."""
+    """
+    List user's chat conversations.
+    
+    API Path: GET /api/chat/conversations?page=<n>&page_size=<n>
+    
+    Without ``page``/``page_size`` the original response is returned: a list
+    of every conversation with its nested messages. With either parameter
+    ``data`` holds ``conversations`` (without messages, but with the message
+    count and a preview of the last message) and ``pagination``; use
+    ``GET /api/chat/conversations/<id>/messages`` for the messages.
+    """
     authentication_classes = [UUIDJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
         try:
-            conversations = ChatConversation.objects.filter(user=request.user).order_by('-updated_at')
-            serializer = ChatConversationSerializer(conversations, many=True)
+            if 'page' not in request.query_params and 'page_size' not in request.query_params:
+                conversations = (
+                    ChatConversation.objects.filter(user=request.user)
+                    .prefetch_related('messages')
+                    .order_by('-updated_at')
+                )
+                data = ChatConversationSerializer(conversations, many=True).data
+            else:
+                conversations = ChatbotService.get_conversation_list_queryset(request.user)
+                items, pagination = _paginate(request, conversations)
+                data = {
+                    'conversations': ChatConversationListSerializer(items, many=True).data,
+                    'pagination': pagination
+                }
             return Response({
                 'message': 'Conversations retrieved successfully',
-                'data': serializer.data,
+                'data': data,
                 'errors': None
             }, status=status.HTTP_200_OK)
         except Exception as e:
@@ -1543,12 +1602,197 @@ class ChatConversationListView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class ChatConversationMessagesView(APIView):
+    """
+    List messages of one conversation (paginated).
+    
+    API Path: GET /api/chat/conversations/<conversation_id>/messages?page=<n>&page_size=<n>
+    
+    Page 1 holds the most recent messages; messages within a page are
+    ordered oldest first.
+    """
+    authentication_classes = [UUIDJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, conversation_id):
+        try:
+            if not ChatConversation.objects.filter(id=conversation_id, user=request.user).exists():
+                return Response({
+                    'message': 'Conversation not found',
+                    'data': None,
+                    'errors': {'detail': 'Conversation not found'}
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            messages = ChatMessage.objects.filter(conversation_id=conversation_id).order_by('-created_at')
+            items, pagination = _paginate(request, messages, default_page_size=50)
+            serializer = ChatMessageSerializer(reversed(items), many=True)
+            return Response({
+                'message': 'Messages retrieved successfully',
+                'data': {
+                    'conversation_id': str(conversation_id),
+                    'messages': serializer.data,
+                    'pagination': pagination
+                },
+                'errors': None
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error getting conversation messages: {str(e)}")
+            return Response({
+                'message': 'Failed to retrieve messages',
+                'data': None,
+                'errors': {'detail': str(e)}
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _paginate(request, queryset, default_page_size: int = 20, max_page_size: int = 100):
+    """
+    Paginate a queryset from ``page`` and ``page_size`` query params.
+    
+    Returns:
+        Tuple of (page items, pagination metadata dict)
+    """
+    try:
+        page_size = int(request.query_params.get('page_size', default_page_size))
+    except ValueError:
+        page_size = default_page_size
+    page_size = max(1, min(page_size, max_page_size))
+    
+    try:
+        page_number = max(1, int(request.query_params.get('page', 1)))
+    except ValueError:
+        page_number = 1
+    
+    paginator = Paginator(queryset, page_size)
+    try:
+        page = paginator.page(page_number)
+        items = list(page.object_list)
+        has_next = page.has_next()
+    except EmptyPage:
+        items = []
+        has_next = False
+    
+    return items, {
+        'page': page_number,
+        'page_size': page_size,
+        'count': paginator.count,
+        'has_next': has_next,
+    }
+
+
+def _sse_event(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _turn_only(query_params) -> bool:
+    """Whether the client opted into the lean turn payload with ``?turn_only=true``."""
+    return str(query_params.get('turn_only', '')).lower() in ('1', 'true', 'yes')
+
+
+def _turn_data(conversation, turn_messages, ai_response: str, turn_only: bool = False) -> dict:
+    """
+    Payload of a completed chat turn.
+    
+    By default the conversation is returned with all of its messages, as it
+    always has been. With ``turn_only`` it carries the conversation metadata
+    and the turn's own messages instead; earlier messages are then read from
+    the paginated messages endpoint.
+    """
+    if not turn_only:
+        return {
+            'conversation': ChatConversationSerializer(conversation).data,
+            'response': ai_response
+        }
+    return {
+        'conversation': ChatConversationMetadataSerializer(conversation).data,
+        'messages': ChatMessageSerializer(turn_messages, many=True).data,
+        'response': ai_response
+    }
+
+
+class _LLMEventStreamResponse(StreamingHttpResponse):
+    """
+    ``text/event-stream`` response holding an LLM slot.
+    
+    The stream releases the slot when it finishes; ``close()`` releases it
+    too, so a response the client abandons before its body is iterated does
+    not hold the slot until its lease expires.
+    """
+    
+    def __init__(self, events, slot):
+        super().__init__(events, content_type='text/event-stream')
+        self['Cache-Control'] = 'no-cache'
+        self['X-Accel-Buffering'] = 'no'  # Disable nginx proxy buffering
+        self._slot = slot
+    
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._slot.release()
+
+
+async def _astream_events(chatbot_service, conversation, user_message, history, user, slot, turn_only=False):
+    """Async counterpart of ``ChatMessageView._stream_events``, consumed on the event loop under ASGI."""
+    yield _sse_event('conversation', {'conversation_id': str(conversation.id)})
+    
+    chunks = []
+    try:
+        async for chunk in chatbot_service.astream_response(user_message, history, user, conversation.summary):
+            chunks.append(chunk)
+            yield _sse_event('token', {'content': chunk})
+        
+        ai_response = ''.join(chunks).strip()
+        turn = await chatbot_service.asave_turn(conversation, user_message, ai_response)
+        await sync_to_async(chatbot_service.schedule_summary_refresh)(conversation)
+        
+        yield _sse_event('done', await sync_to_async(_turn_data)(conversation, turn, ai_response, turn_only))
+    except LLMRateLimitExceeded as e:
+        yield _sse_event('error', _llm_busy_data(e))
+    except Exception as e:
+        logger.error(f"Error streaming async chat message: {str(e)}")
+        yield _sse_event('error', {
+            'message': 'Failed to process message',
+            'errors': {'detail': str(e)}
+        })
+    finally:
+        await sync_to_async(slot.release)()
+
+
 class ChatMessageView(APIView):
-    """Send a message and get AI response."""
+    """
+    Send a message and get AI response.
+    
+    API Path: POST /api/chat/message
+    
+    The user and assistant messages of a turn are saved together once the
+    reply is complete, so a failed generation leaves no partial turn. The
+    response carries the conversation with all of its messages. With
+    ``?turn_only=true`` it carries the conversation metadata and the turn's
+    two messages instead; earlier messages are then read from
+    ``GET /api/chat/conversations/<conversation_id>/messages``.
+    
+    With ``"stream": true`` the response is a ``text/event-stream`` of
+    ``conversation``, ``token`` and ``done`` (or ``error``) events, and the
+    turn is saved once the stream completes. A new conversation is saved
+    before the first event, so the ID it carries is valid even if the
+    generation fails. Under ASGI the events are
+    produced on the event loop by the async Groq client, so each token is
+    sent as soon as it arrives.
+    
+    A turn that gets no LLM quota within LLM_RATE_LIMIT_REQUEST_MAX_WAIT
+    seconds is answered with a 429 and ``Retry-After`` (an ``error`` event
+    carrying ``retry_after`` once a stream has started).
+    
+    With ``CHAT_GENERATION_MODE = 'celery'`` non-streaming turns are queued
+    as a Celery job and a 202 with the ``job_id`` is returned immediately;
+    poll ``GET /api/chat/jobs/<job_id>`` for the reply.
+    """
     authentication_classes = [UUIDJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
+        slot = None
         try:
             serializer = ChatMessageCreateSerializer(data=request.data)
             if not serializer.is_valid():
@@ -1560,8 +1804,16 @@ class ChatMessageView(APIView):
             
             user_message = serializer.validated_data['message']
             conversation_id = serializer.validated_data.get('conversation_id')
+            stream = serializer.validated_data.get('stream')
+            queued = settings.CHAT_GENERATION_MODE == 'celery' and not stream
+            turn_only = _turn_only(request.query_params)
+            
+            # Claim an LLM slot before touching the conversation so an over-limit
+            # request is rejected immediately (queued jobs are bounded by the workers)
+            if not queued:
+                slot = llm_limiter.acquire(request.user.id)
             
-            chatbot_service = ChatbotService()
+            chatbot_service = ChatbotService(llm_max_wait=settings.LLM_RATE_LIMIT_REQUEST_MAX_WAIT)
             
             # Get or create conversation
             if conversation_id:
@@ -1574,44 +1826,303 @@ class ChatMessageView(APIView):
                         'errors': {'detail': 'Conversation not found'}
                     }, status=status.HTTP_404_NOT_FOUND)
             else:
-                # Create new conversation
-                conversation = chatbot_service.create_conversation(request.user)
-            
-            # Add user message
-            chatbot_service.add_message(conversation, 'user', user_message)
-            
-            # Get conversation history
-            history = chatbot_service.get_conversation_messages(conversation)
+                # New conversation; saved together with the first turn
+                conversation = ChatConversation(user=request.user)
+            
+            if queued:
+                # The job persists the whole turn; only a new conversation is saved up front
+                if conversation._state.adding:
+                    conversation.save()
+                # Record the owner before the job exists, so no poll can precede the ownership check
+                job_id = str(uuid.uuid4())
+                ChatbotService.remember_job_owner(job_id, request.user.id)
+                generate_chat_response.apply_async(args=[str(conversation.id), user_message], task_id=job_id)
+                return Response({
+                    'message': 'Message queued',
+                    'data': {
+                        'job_id': job_id,
+                        'conversation_id': str(conversation.id),
+                        'status': 'queued'
+                    },
+                    'errors': None
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            # Get the messages the conversation summary does not cover yet
+            history = chatbot_service.get_history(conversation)
+            
+            if stream:
+                # The first event hands the client the conversation ID, so it must exist
+                # even if generation fails
+                if conversation._state.adding:
+                    conversation.title = ChatbotService.make_title(user_message)
+                    conversation.save()
+                if isinstance(request._request, ASGIRequest):
+                    # Django drains a sync iterator into a list before sending it over ASGI,
+                    # so stream from the event loop with the async client instead
+                    events = _astream_events(
+                        chatbot_service, conversation, user_message, history, request.user, slot, turn_only
+                    )
+                else:
+                    events = self._stream_events(
+                        chatbot_service, conversation, user_message, history, request.user, slot, turn_only
+                    )
+                response = _LLMEventStreamResponse(events, slot)
+                slot = None  # Released by the stream or the response once it finishes
+                return response
             
             # Generate AI response
             ai_response = chatbot_service.generate_response(
                 user_message,
-                history[:-1],  # Exclude the current message
-                request.user
+                history,
+                request.user,
+                conversation.summary
             )
             
-            # Add AI response
-            chatbot_service.add_message(conversation, 'assistant', ai_response)
+            # Persist both messages of the turn
+            turn = chatbot_service.save_turn(conversation, user_message, ai_response)
+            chatbot_service.schedule_summary_refresh(conversation)
             
-            # Get updated conversation
-            conversation_serializer = ChatConversationSerializer(conversation)
+            return Response({
+                'message': 'Message sent successfully',
+                'data': _turn_data(conversation, turn, ai_response, turn_only),
+                'errors': None
+            }, status=status.HTTP_200_OK)
             
+        except (LLMConcurrencyLimitExceeded, LLMRateLimitExceeded) as e:
+            return _llm_busy_response(e)
+        except Exception as e:
+            logger.error(f"Error in chat message: {str(e)}")
+            return Response({
+                'message': 'Failed to process message',
+                'data': None,
+                'errors': {'detail': str(e)}
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            if slot:
+                slot.release()
+    
+    def _stream_events(self, chatbot_service, conversation, user_message, history, user, slot, turn_only=False):
+        """Yield SSE events for a streamed response and persist it when complete."""
+        yield _sse_event('conversation', {'conversation_id': str(conversation.id)})
+        
+        chunks = []
+        try:
+            for chunk in chatbot_service.stream_response(user_message, history, user, conversation.summary):
+                chunks.append(chunk)
+                yield _sse_event('token', {'content': chunk})
+            
+            ai_response = ''.join(chunks).strip()
+            turn = chatbot_service.save_turn(conversation, user_message, ai_response)
+            chatbot_service.schedule_summary_refresh(conversation)
+            
+            yield _sse_event('done', _turn_data(conversation, turn, ai_response, turn_only))
+        except LLMRateLimitExceeded as e:
+            yield _sse_event('error', _llm_busy_data(e))
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield _sse_event('error', {
+                'message': 'Failed to process message',
+                'errors': {'detail': str(e)}
+            })
+        finally:
+            slot.release()
+
+
+class ChatJobView(APIView):
+    """
+    Get the result of a queued chat generation job.
+    
+    API Path: GET /api/chat/jobs/<job_id>
+    
+    Returns immediately; clients poll again while the status is ``pending``.
+    Only the user who queued the job can read it. A completed job has the
+    same payload as ``ChatMessageView``, including ``?turn_only=true``.
+    """
+    authentication_classes = [UUIDJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, job_id):
+        try:
+            if ChatbotService.get_job_owner(job_id) != str(request.user.id):
+                return Response({
+                    'message': 'Job not found',
+                    'data': None,
+                    'errors': {'detail': 'Job not found'}
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            job = AsyncResult(str(job_id))
+            if not job.ready():
+                return Response({
+                    'message': 'Response is being generated',
+                    'data': {'job_id': str(job_id), 'status': 'pending'},
+                    'errors': None
+                }, status=status.HTTP_200_OK)
+            
+            if not job.successful() or not isinstance(job.result, dict):
+                logger.error(f"Chat job {job_id} failed: {job.result}")
+                return Response({
+                    'message': 'Failed to generate response',
+                    'data': {'job_id': str(job_id), 'status': 'failed'},
+                    'errors': {'detail': 'Failed to generate response'}
+                }, status=status.HTTP_200_OK)
+            
+            result = job.result
+            if result.get('user_id') != str(request.user.id):
+                return Response({
+                    'message': 'Job not found',
+                    'data': None,
+                    'errors': {'detail': 'Job not found'}
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            if not result.get('success'):
+                return Response({
+                    'message': 'Failed to generate response',
+                    'data': {'job_id': str(job_id), 'status': 'failed', 'conversation_id': result['conversation_id']},
+                    'errors': {'detail': 'Failed to generate response'}
+                }, status=status.HTTP_200_OK)
+            
+            conversation = ChatConversation.objects.get(id=result['conversation_id'], user=request.user)
+            turn = sorted(
+                ChatMessage.objects.filter(
+                    conversation=conversation, id__in=[result.get('user_message_id'), result['message_id']]
+                ),
+                key=lambda message: message.role != 'user'
+            )
             return Response({
                 'message': 'Message sent successfully',
                 'data': {
-                    'conversation': conversation_serializer.data,
-                    'response': ai_response
+                    'job_id': str(job_id),
+                    'status': 'completed',
+                    **_turn_data(conversation, turn, result['response'], _turn_only(request.query_params))
                 },
                 'errors': None
             }, status=status.HTTP_200_OK)
             
+        except ChatConversation.DoesNotExist:
+            return Response({
+                'message': 'Job not found',
+                'data': None,
+                'errors': {'detail': 'Job not found'}
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            logger.error(f"Error in chat message: {str(e)}")
+            logger.error(f"Error getting chat job: {str(e)}")
             return Response({
+                'message': 'Failed to retrieve job',
+                'data': None,
+                'errors': {'detail': str(e)}
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatMessageView(View):
+    """
+    Send a message and get AI response without holding a worker thread.
+    
+    API Path: POST /api/chat/message/async
+    
+    Same request and response contract as ``ChatMessageView`` (including
+    ``"stream": true``), but implemented as a native async Django view with
+    async ORM calls and the async Groq client. Under an ASGI server the
+    LLM wait is multiplexed on the event loop instead of pinning a worker.
+    """
+    
+    async def post(self, request):
+        try:
+            user = await self._authenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({
+                'message': 'Authentication failed',
+                'data': None,
+                'errors': {'detail': str(e.detail)}
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        if user is None:
+            return JsonResponse({
+                'message': 'Authentication credentials were not provided.',
+                'data': None,
+                'errors': {'detail': 'Authentication credentials were not provided.'}
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        slot = None
+        try:
+            try:
+                payload = json.loads(request.body or b'{}')
+            except ValueError:
+                payload = None
+            serializer = ChatMessageCreateSerializer(data=payload)
+            if not serializer.is_valid():
+                return JsonResponse({
+                    'message': 'Validation error',
+                    'data': None,
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            user_message = serializer.validated_data['message']
+            conversation_id = serializer.validated_data.get('conversation_id')
+            turn_only = _turn_only(request.GET)
+            
+            slot = await sync_to_async(llm_limiter.acquire)(user.id)
+            
+            chatbot_service = ChatbotService(llm_max_wait=settings.LLM_RATE_LIMIT_REQUEST_MAX_WAIT)
+            
+            # Get or create conversation
+            if conversation_id:
+                try:
+                    conversation = await ChatConversation.objects.aget(id=conversation_id, user=user)
+                except ChatConversation.DoesNotExist:
+                    return JsonResponse({
+                        'message': 'Conversation not found',
+                        'data': None,
+                        'errors': {'detail': 'Conversation not found'}
+                    }, status=status.HTTP_404_NOT_FOUND)
+            else:
+                # New conversation; saved together with the first turn
+                conversation = ChatConversation(user=user)
+            
+            history = await chatbot_service.aget_history(conversation)
+            
+            if serializer.validated_data.get('stream'):
+                # The first event hands the client the conversation ID, so it must exist
+                # even if generation fails
+                if conversation._state.adding:
+                    conversation.title = ChatbotService.make_title(user_message)
+                    await conversation.asave()
+                response = _LLMEventStreamResponse(
+                    _astream_events(chatbot_service, conversation, user_message, history, user, slot, turn_only),
+                    slot
+                )
+                slot = None  # Released by the stream or the response once it finishes
+                return response
+            
+            ai_response = await chatbot_service.agenerate_response(
+                user_message, history, user, conversation.summary
+            )
+            turn = await chatbot_service.asave_turn(conversation, user_message, ai_response)
+            await sync_to_async(chatbot_service.schedule_summary_refresh)(conversation)
+            
+            return JsonResponse({
+                'message': 'Message sent successfully',
+                'data': await sync_to_async(_turn_data)(conversation, turn, ai_response, turn_only),
+                'errors': None
+            }, status=status.HTTP_200_OK)
+            
+        except (LLMConcurrencyLimitExceeded, LLMRateLimitExceeded) as e:
+            return _llm_busy_response(e, JsonResponse)
+        except Exception as e:
+            logger.error(f"Error in async chat message: {str(e)}")
+            return JsonResponse({
                 'message': 'Failed to process message',
                 'data': None,
                 'errors': {'detail': str(e)}
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            if slot:
+                await sync_to_async(slot.release)()
+    
+    @staticmethod
+    async def _authenticate(request):
+        """Authenticate the bearer token with the same JWT backend as the DRF views."""
+        result = await sync_to_async(UUIDJWTAuthentication().authenticate)(request)
+        return result[0] if result else None
 
 
 class UserProfileView(APIView):
@@ -12,8 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlsplit, urlunsplit
 
 # Load environment variables
 load_dotenv()
@@ -260,6 +261,87 @@ CORS_ALLOW_CREDENTIALS = not CORS_ALLOW_ALL_ORIGINS
 # Groq API Key
 GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
 
+# Local on-disk data (precomputed indexes etc.), not committed to the repo
+LOCAL_DATA_DIR = Path(os.getenv('LOCAL_DATA_DIR', str(BASE_DIR.parent / 'var')))
+
+# Chatbot shloka retrieval: 'bm25' (in-memory inverted index) or 'tfidf' (NumPy/SciPy matrix)
+CHATBOT_RETRIEVAL_BACKEND = os.getenv('CHATBOT_RETRIEVAL_BACKEND', 'bm25')
+SHLOKA_TFIDF_INDEX_PATH = LOCAL_DATA_DIR / 'shloka_tfidf.npz'
+# Seconds between checks of the catalog fingerprint by each process's in-memory retrieval index,
+# so explanations written by other processes (Celery workers) are picked up without a restart
+SHLOKA_INDEX_SYNC_INTERVAL = int(os.getenv('SHLOKA_INDEX_SYNC_INTERVAL', '30'))
+
+# Pre-extracted page text of the source PDFs, one directory per PDF content hash
+BOOK_TEXT_STORE_DIR = LOCAL_DATA_DIR / 'book_text'
+# Size bound of the per-process LRU of chapter texts used for book context. Off (0) by default:
+# chapters are then decoded from the shared memory-mapped page store on each lookup, which costs
+# a little CPU per lookup but no resident memory. A bound is multiplied by every web and Celery
+# worker process (a few MB per process caches most chapters of both books), so only raise it
+# where lookups are hot and memory is plentiful
+BOOK_CONTEXT_CACHE_MAX_BYTES = int(os.getenv('BOOK_CONTEXT_CACHE_MAX_BYTES', '0'))
+
+# Cache: shared Redis, so LLM concurrency limits and quotas, cached chat answers and reading-context
+# invalidation hold across every web and Celery process. Defaults to database 1 of the Celery broker's
+# Redis; tests use per-process memory
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL') or urlunsplit(
+    urlsplit(os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'))._replace(path='/1')
+)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+
+# Cache answers to first-turn chatbot questions (keyed by normalized question + hash of the system prompt)
+CHAT_RESPONSE_CACHE_ENABLED = os.getenv('CHAT_RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+CHAT_RESPONSE_CACHE_TTL = int(os.getenv('CHAT_RESPONSE_CACHE_TTL', str(6 * 60 * 60)))  # 6 hours
+
+# Prompt token budgets; lower-priority context is trimmed to fit before the LLM call
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv('CHAT_PROMPT_TOKEN_BUDGET', '6000'))
+GENERATION_PROMPT_TOKEN_BUDGET = int(os.getenv('GENERATION_PROMPT_TOKEN_BUDGET', '6000'))
+
+# Caps on in-flight LLM calls for chat and on-demand verse generation
+LLM_MAX_CONCURRENT_PER_USER = int(os.getenv('LLM_MAX_CONCURRENT_PER_USER', '2'))
+LLM_MAX_CONCURRENT_GLOBAL = int(os.getenv('LLM_MAX_CONCURRENT_GLOBAL', '8'))
+LLM_SLOT_TIMEOUT = 180  # Seconds before a leaked slot expires
+LLM_RETRY_AFTER_SECONDS = int(os.getenv('LLM_RETRY_AFTER_SECONDS', '5'))
+
+# Groq quota shared by every worker (requests and tokens per minute). 0 disables a limit
+LLM_RATE_LIMIT_RPM = int(os.getenv('LLM_RATE_LIMIT_RPM', '30'))
+LLM_RATE_LIMIT_TPM = int(os.getenv('LLM_RATE_LIMIT_TPM', '60000'))
+LLM_RATE_LIMIT_MAX_WAIT = int(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '60'))  # Seconds to wait for quota before failing
+# Shorter wait for calls made while a user waits on the response (chat, on-demand verses); they get a 429
+LLM_RATE_LIMIT_REQUEST_MAX_WAIT = int(os.getenv('LLM_RATE_LIMIT_REQUEST_MAX_WAIT', '5'))
+# Retries of rate limited, overloaded or unreachable Groq calls (exponential backoff, honouring retry-after)
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '1.0'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '30.0'))
+# Connection pool of the per-process Groq HTTP client
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '20'))
+LLM_HTTP_TIMEOUT = float(os.getenv('LLM_HTTP_TIMEOUT', '60'))
+
+# Persistent cache of deterministic LLM calls (explanation generation, quality checks, improvements),
+# keyed by a hash of model + messages + sampling parameters. Least recently used entries are evicted
+# once the cached responses exceed LLM_RESPONSE_CACHE_MAX_BYTES
+LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+LLM_RESPONSE_CACHE_MAX_BYTES = int(os.getenv('LLM_RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Explanations generated at once by the bulk pipelines (task and save_shlokas_from_books)
+EXPLANATION_GENERATION_CONCURRENCY = int(os.getenv('EXPLANATION_GENERATION_CONCURRENCY', '4'))
+
+# Chat generation: 'sync' generates in the request, 'celery' enqueues a job and returns its ID
+CHAT_GENERATION_MODE = os.getenv('CHAT_GENERATION_MODE', 'sync')
+CHAT_JOB_OWNER_TTL = 24 * 60 * 60  # Seconds a queued job stays readable by its owner (Celery's result expiry)
+
 # JWT Settings
 from datetime import timedelta
 